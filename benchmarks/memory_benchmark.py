@@ -0,0 +1,115 @@
+import argparse
+import contextlib
+import gc
+import io
+import time
+import tracemalloc
+
+import run_benchmark
+import mock_services
+
+#offline memory benchmark of the in-memory catalog: builds the tableau table index and merges it with the dbt models of a synthetic catalog
+#(benchmarks/mock_services.py), once with the api nodes held and merged as dictionaries and once with the compact catalog records, and reports
+#the memory retained by the merged catalog, the peak memory and time spent in garbage collection while building it, and the time of a full
+#garbage collection with it alive
+#e.g. python benchmarks/memory_benchmark.py --jobs 20 --models 1000 --columns 30
+
+#yields the (database server, table node) pairs of the synthetic catalog, as returned by the Metadata API
+def iter_table_nodes(catalog):
+    database_server = {'id': 'server-1', 'name': mock_services.DATABASE_NAME, 'hostName': mock_services.DATABASE_HOST}
+    for k in range(catalog.tables):
+        yield database_server, catalog.get_table(k)
+
+#yields the dbt model nodes of a job of the synthetic catalog, as returned by the dbt Metadata API
+def iter_model_nodes(catalog, j):
+    for i in range(catalog.models):
+        yield catalog.get_model(j, i)
+
+#merges the catalog as dictionaries: the api nodes are kept and every merged table is a copy of the tableau table node updated with the whole dbt model node
+def merge_as_dicts(dbt_tabcatalog, catalog, dbt_project_accounts):
+    tableau_database_tables = list(iter_table_nodes(catalog))
+    model_nodes_by_job = {catalog.job_id(j): list(iter_model_nodes(catalog, j)) for j in range(catalog.jobs)}
+    tables = {}
+    for database_server, table_node in tableau_database_tables:
+        database_name = table_node['database']['name'] if table_node.get('database') else database_server['name']
+        key = (dbt_tabcatalog.normalize_name(database_server['hostName']), dbt_tabcatalog.normalize_name(database_name), dbt_tabcatalog.normalize_name(table_node['schema']), dbt_tabcatalog.normalize_name(table_node['name']))
+        tables[key] = table_node
+    hosts = {key[0] for key in tables}
+    merged_tables_by_job = []
+    for job_id, model_nodes in model_nodes_by_job.items():
+        merged_tables = []
+        for model_node in model_nodes:
+            account = dbt_tabcatalog.normalize_name(dbt_project_accounts.get(model_node['projectId']))
+            for host_name in hosts:
+                table_node = tables.get((host_name, dbt_tabcatalog.normalize_name(model_node['database']), dbt_tabcatalog.normalize_name(model_node['schema']), dbt_tabcatalog.normalize_name(model_node['name'])))
+                if host_name.startswith(account) and table_node is not None:
+                    merged_table = dict(table_node)
+                    merged_table.update(model_node)
+                    merged_tables.append(merged_table)
+        merged_tables_by_job.append((job_id, merged_tables))
+    return merged_tables_by_job, model_nodes_by_job
+
+#merges the catalog as compact records, as the sync does: the api nodes are converted as they are received and then dropped
+def merge_as_records(dbt_tabcatalog, catalog, dbt_project_accounts):
+    tableau_table_index = dbt_tabcatalog.build_tableau_table_index(iter_table_nodes(catalog))
+    dbt_models_by_job = {catalog.job_id(j): [dbt_tabcatalog.DbtModel.from_node(model_node) for model_node in iter_model_nodes(catalog, j)] for j in range(catalog.jobs)}
+    merged_tables_by_job = [(job_id, dbt_tabcatalog.merge_dbt_tableau_tables(tableau_table_index, dbt_models, dbt_project_accounts)[0]) for job_id, dbt_models in dbt_models_by_job.items()]
+    return merged_tables_by_job, dbt_models_by_job
+
+#records the time spent in garbage collections
+class gc_timer:
+    def __init__(self):
+        self.seconds = 0.0
+        self.started = None
+
+    def __call__(self, phase, info):
+        if phase == 'start':
+            self.started = time.perf_counter()
+        elif self.started is not None:
+            self.seconds += time.perf_counter() - self.started
+
+#returns the retained and peak memory (MB), build time, garbage collection time during the build and full garbage collection time of merging a freshly generated catalog
+def measure(dbt_tabcatalog, catalog, merge):
+    with contextlib.redirect_stdout(io.StringIO()):
+        dbt_project_accounts = dbt_tabcatalog.get_dbt_project_accounts(catalog.get_projects())
+    gc.collect()
+    timer = gc_timer()
+    gc.callbacks.append(timer)
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = merge(dbt_tabcatalog, catalog, dbt_project_accounts)
+    finally:
+        gc.callbacks.remove(timer)
+    build_time = time.perf_counter() - start
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    gc.collect()
+    gc_time = time.perf_counter() - start
+    merged_table_count = sum(len(merged_tables) for job_id, merged_tables in result[0])
+    del result
+    return {'merged_tables': merged_table_count, 'retained_mb': round(retained / 1024 / 1024, 1), 'peak_mb': round(peak / 1024 / 1024, 1), 'build_s': round(build_time, 3), 'build_gc_s': round(timer.seconds, 3), 'full_gc_s': round(gc_time, 3)}
+
+def main():
+    parser = argparse.ArgumentParser(description='memory benchmark of the merged catalog: api dictionaries against compact catalog records')
+    parser.add_argument('--jobs', type=int, default=10, help='number of dbt jobs (one dbt project per job)')
+    parser.add_argument('--models', type=int, default=1000, help='number of dbt models per job')
+    parser.add_argument('--columns', type=int, default=20, help='number of columns per model/table')
+    args = parser.parse_args()
+
+    dbt_tabcatalog = run_benchmark.import_dbt_tabcatalog()
+    print('merging ' + str(args.jobs * args.models) + ' dbt models and tableau tables with ' + str(args.columns) + ' columns each')
+    print('  ' + 'catalog'.ljust(10) + 'merged'.rjust(8) + 'retained (MB)'.rjust(15) + 'peak (MB)'.rjust(11) + 'build (s)'.rjust(11) + 'build gc (s)'.rjust(14) + 'full gc (s)'.rjust(13))
+    reports = {}
+    for name, merge in (('dicts', merge_as_dicts), ('records', merge_as_records)):
+        catalog = mock_services.mock_catalog(args.jobs, args.models, None, args.columns, 0)
+        report = reports[name] = measure(dbt_tabcatalog, catalog, merge)
+        print('  ' + name.ljust(10) + str(report['merged_tables']).rjust(8) + str(report['retained_mb']).rjust(15) + str(report['peak_mb']).rjust(11) + str(report['build_s']).rjust(11) + str(report['build_gc_s']).rjust(14) + str(report['full_gc_s']).rjust(13))
+    print('retained memory reduced by ' + str(round(100 - 100 * reports['records']['retained_mb'] / max(reports['dicts']['retained_mb'], 0.1))) + '%')
+    return reports
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,571 @@
+import base64
+import hashlib
+import html
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from xml.etree import ElementTree
+
+#local mock of the dbt Cloud v2/v3 API, dbt Metadata API, tableau REST/Metadata API and github contents and git data API used by the offline benchmark
+#every service is served from one http server under its own path prefix:
+#  /dbt/api/v2/accounts/, /dbt/api/v3/accounts/, /dbt/graphql, /tableau/api/..., /github/...
+
+DBT_ACCOUNT_ID = 1
+DATABASE_ACCOUNT = 'mockaccount'
+DATABASE_NAME = 'ANALYTICS'
+DATABASE_HOST = DATABASE_ACCOUNT + '.eu-west-1.snowflakecomputing.com'
+#the mock's tableau luids and ids are uuid shaped like the real ones, with the kind of item in the first group and its number in the last
+UUID_PATTERN = r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+ID_KINDS = {'site': 1, 'user': 2, 'server': 3, 'table': 4, 'column': 5, 'workbook': 6, 'dq_warning': 7, 'table_id': 8, 'workbook_id': 9, 'owner': 10}
+
+#returns the uuid shaped id of item number n of a kind
+def make_uuid(kind, n):
+    return '%08x-0000-4000-8000-%012x' % (ID_KINDS[kind], n)
+
+#returns the item number of a uuid shaped id of a kind, or None when the id is of another kind
+def parse_uuid(value, kind):
+    if not re.fullmatch(UUID_PATTERN, value or '') or int(value[:8], 16) != ID_KINDS[kind]:
+        return None
+    return int(value[-12:], 16)
+
+TABLEAU_SITE_ID = make_uuid('site', 1)
+DATABASE_SERVER_ID = make_uuid('server', 1)
+LATEST_RUN_ID_OFFSET = 5000
+
+#synthetic dbt/tableau catalog generated from the fixture sizes. dbt model i of job j is published to tableau table j * models + i,
+#tableau tables beyond jobs * models have no matching dbt model and every workbook depends on 3 matched tables
+class mock_catalog:
+    def __init__(self, jobs=4, models=100, tables=None, columns=10, workbooks=50):
+        self.jobs = jobs
+        self.models = models
+        self.tables = jobs * models if tables is None else tables
+        self.columns = columns
+        self.workbooks = workbooks
+        self.lock = threading.Lock()
+        self.reset_state()
+
+    #clears every write made to the mock tableau site and github repos
+    def reset_state(self):
+        with self.lock:
+            self.table_state = {}
+            self.column_state = {}
+            self.dq_warnings = {}
+            self.github_repos = {}
+            self.dq_warning_count = 0
+
+    #returns the git objects of a mock github repository (created with an empty initial commit on main)
+    def get_github_repo(self, repository_name):
+        repo = self.github_repos.get(repository_name)
+        if repo is None:
+            tree_sha = get_git_sha('tree', repository_name + ':')
+            commit_sha = get_git_sha('commit', repository_name + ':initial')
+            repo = self.github_repos[repository_name] = {'branch': 'main', 'trees': {tree_sha: {}}, 'commits': {commit_sha: {'tree': tree_sha, 'parents': []}}, 'refs': {'main': commit_sha}}
+        return repo
+
+    def project_id(self, j):
+        return 100 + j
+
+    def job_id(self, j):
+        return 1000 + j
+
+    def environment_id(self, j):
+        return 200 + j
+
+    def table_luid(self, k):
+        return make_uuid('table', k)
+
+    def column_luid(self, k, c):
+        return make_uuid('column', k * self.columns + c)
+
+    def workbook_luid(self, w):
+        return make_uuid('workbook', w)
+
+    def matched_table_count(self):
+        return min(self.tables, self.jobs * self.models)
+
+    def get_projects(self):
+        return [{'id': self.project_id(j), 'name': 'project_' + str(j), 'connection': {'details': {'account': DATABASE_ACCOUNT}}} for j in range(self.jobs)]
+
+    def get_jobs(self):
+        return [{'id': self.job_id(j), 'project_id': self.project_id(j), 'name': 'job_' + str(j), 'updated_at': '2024-01-01T00:00:00Z'} for j in range(self.jobs)]
+
+    def get_model(self, j, i):
+        return {
+            'uniqueId': 'model.project_' + str(j) + '.model_' + str(i),
+            'packageName': 'project_' + str(j),
+            'runId': LATEST_RUN_ID_OFFSET + j,
+            'accountId': DBT_ACCOUNT_ID,
+            'projectId': self.project_id(j),
+            'environmentId': self.environment_id(j),
+            'jobId': self.job_id(j),
+            'status': 'error' if i % 10 == 9 else 'success',
+            'executeCompletedAt': '2024-01-01T00:00:00Z',
+            'database': DATABASE_NAME,
+            'schema': 'JOB_' + str(j),
+            'name': 'MODEL_' + str(i),
+            'description': 'synthetic model ' + str(i) + ' of job ' + str(j),
+            'meta': {'TableauCertified': i % 2 == 0},
+            'stats': [{'id': 'has_stats', 'value': True}, {'id': 'row_count', 'value': 1000 + i}, {'id': 'last_modified', 'value': '2024-01-01 00:00UTC'}],
+            'columns': [{'name': 'COL_' + str(c), 'description': 'synthetic column ' + str(c)} for c in range(self.columns)]
+        }
+
+    #returns the dbt models for a job id, or an empty list for an unknown job
+    def get_models(self, job_id):
+        j = job_id - self.job_id(0)
+        if j < 0 or j >= self.jobs:
+            return []
+        return [self.get_model(j, i) for i in range(self.models)]
+
+    #returns a tableau table node as selected by the table queries (the table description is selected with the alias tableauDescription)
+    def get_table(self, k):
+        if k < self.jobs * self.models:
+            schema, name = 'JOB_' + str(k // self.models), 'MODEL_' + str(k % self.models)
+        else:
+            schema, name = 'UNMATCHED', 'TABLE_' + str(k)
+        with self.lock:
+            state = self.table_state.get(self.table_luid(k), {})
+        return {'id': make_uuid('table_id', k), 'luid': self.table_luid(k), 'name': name, 'schema': schema, 'database': {'name': DATABASE_NAME},
+                'tableauDescription': state.get('description', ''), 'isCertified': state.get('isCertified', False), 'certificationNote': state.get('certificationNote'),
+                'tableauTags': [{'name': tag} for tag in sorted(state.get('tags', []))]}
+
+    def get_table_index(self, luid):
+        k = parse_uuid(luid, 'table')
+        return k if k is not None and k < self.tables else None
+
+    def get_columns(self, k):
+        columns = []
+        with self.lock:
+            for c in range(self.columns):
+                luid = self.column_luid(k, c)
+                state = self.column_state.get(luid, {})
+                columns.append({'luid': luid, 'name': 'COL_' + str(c), 'description': state.get('description', ''), 'tags': [{'name': tag} for tag in sorted(state.get('tags', []))]})
+        return columns
+
+    def get_workbook_table_indexes(self, w):
+        matched_table_count = self.matched_table_count()
+        return sorted({(w * 7 + t) % matched_table_count for t in range(3)}) if matched_table_count > 0 else []
+
+    def get_workbook(self, w):
+        return {
+            'id': make_uuid('workbook_id', w),
+            'luid': self.workbook_luid(w),
+            'name': 'Workbook ' + str(w),
+            'description': 'synthetic workbook ' + str(w),
+            'projectName': 'Default',
+            'vizportalUrlId': str(w),
+            'tags': [],
+            'owner': {'id': make_uuid('owner', 1), 'name': 'Mock Owner', 'username': 'owner@example.com'},
+            'upstreamTables': [{'id': make_uuid('table_id', k), 'luid': self.table_luid(k), 'name': self.get_table(k)['name']} for k in self.get_workbook_table_indexes(w)]
+        }
+
+    #returns a dictionary of table index to list of downstream workbook numbers
+    def get_downstream_workbook_index(self):
+        if not hasattr(self, 'downstream_workbook_index'):
+            self.downstream_workbook_index = {}
+            for w in range(self.workbooks):
+                for k in self.get_workbook_table_indexes(w):
+                    self.downstream_workbook_index.setdefault(k, []).append(w)
+        return self.downstream_workbook_index
+
+#returns a dictionary of field name to sub selection (or None) for the fields of a graphql selection set
+def parse_selection(text):
+    tokens = re.findall(r'[A-Za-z_][A-Za-z0-9_]*|[{}]', re.sub(r'\([^)]*\)', '', text)) #arguments are ignored
+    selection, stack, last = {}, [], None
+    current = selection
+    for token in tokens:
+        if token == '{':
+            current[last] = {}
+            stack.append(current)
+            current = current[last]
+        elif token == '}':
+            current = stack.pop()
+        else:
+            current[token] = None
+            last = token
+    return selection
+
+#returns a copy of a dict (or list of dicts) with only the fields of a selection
+def project_fields(value, selection):
+    if selection is None:
+        return value
+    if isinstance(value, list):
+        return [project_fields(item, selection) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {field: project_fields(value.get(field), sub_selection) for field, sub_selection in selection.items()}
+
+#returns the data quality warning fields (as selected from the metadata api) of a REST API data quality warning request
+def get_quality_warning_attributes(body):
+    warning = ElementTree.fromstring(body).find('dataQualityWarning')
+    return {'warningType': warning.get('type'), 'message': warning.get('message'), 'isActive': warning.get('isActive') == 'true', 'isSevere': warning.get('isSevere') == 'true'}
+
+#returns the sha of a git object (blob shas match git and github so clients can compare them with a local hash)
+def get_git_sha(object_type, content):
+    content_bytes = content.encode('utf-8')
+    return hashlib.sha1(object_type.encode('utf-8') + b' ' + str(len(content_bytes)).encode('utf-8') + b'\0' + content_bytes).hexdigest()
+
+#returns the number of nodes (objects) in a metadata api response, page info excluded
+def count_nodes(value):
+    if isinstance(value, list):
+        return sum(count_nodes(item) for item in value)
+    if isinstance(value, dict):
+        return 1 + sum(count_nodes(item) for key, item in value.items() if key != 'pageInfo')
+    return 0
+
+#returns a page of a metadata api connection over a list of nodes using numeric offset cursors
+def make_connection(nodes, first, after):
+    offset = int(after) if after else 0
+    page = nodes[offset:offset + first]
+    end = offset + len(page)
+    return {'nodes': page, 'totalCount': len(nodes), 'pageInfo': {'hasNextPage': end < len(nodes), 'endCursor': str(end)}}
+
+#returns the page size of a nested connection in a graphql query e.g. tablesConnection(first: 500)
+def get_nested_first(query, connection_name, default=100):
+    match = re.search(connection_name + r'\(first: (\d+)\)', query)
+    return int(match.group(1)) if match else default
+
+#returns the normalized endpoint name used to count requests (ids, luids and repository names are replaced by placeholders)
+def get_endpoint_name(method, path, body=None):
+    path = re.sub(r'/repos/[^/]+/[^/]+(/|$)', r'/repos/{repo}\1', path)
+    segments = ['{id}' if re.fullmatch(r'\d+|' + UUID_PATTERN + r'|[0-9a-f]{40}', segment) else segment for segment in path.split('/')]
+    endpoint = method + ' ' + '/'.join(segments)
+    if path.endswith('/graphql') and body:
+        match = re.search(r'query\s+(\w+)', body)
+        endpoint = endpoint + ' ' + (match.group(1) if match else 'anonymous')
+    return endpoint
+
+class mock_request_handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' #keep-alive connections, like the real services
+
+    def log_message(self, format, *args):
+        return
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+    def do_PATCH(self):
+        self.handle_request('PATCH')
+
+    def send(self, status, body='', content_type='application/json', headers=None):
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_request(self, method):
+        server = self.server
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length > 0 else ''
+
+        if url.path == '/__stats':
+            with server.stats_lock:
+                return self.send(200, {'requests': dict(server.request_counts), 'throttled': dict(server.throttled_counts)})
+        if url.path == '/__reset':
+            with server.stats_lock:
+                server.request_counts.clear()
+                server.throttled_counts.clear()
+            if parse_qs(url.query).get('state') == ['true']:
+                server.catalog.reset_state()
+            return self.send(200, {})
+
+        endpoint = get_endpoint_name(method, url.path, body)
+        if url.path.startswith('/tableau/') and server.is_throttled():
+            with server.stats_lock:
+                server.throttled_counts[endpoint] += 1
+            return self.send(429, {'error': {'summary': 'Too Many Requests'}}, headers={'Retry-After': str(server.retry_after)})
+        with server.stats_lock:
+            server.request_counts[endpoint] += 1
+        if server.latency > 0:
+            time.sleep(server.latency)
+
+        try:
+            if url.path.startswith('/dbt/'):
+                return self.handle_dbt(method, url, body)
+            if url.path.startswith('/tableau/'):
+                return self.handle_tableau(method, url, body)
+            if url.path.startswith('/github/'):
+                return self.handle_github(method, url, body)
+        except Exception as e:
+            return self.send(500, {'errors': [{'message': 'mock error ' + repr(e)}]})
+        return self.send(404, {'errors': [{'message': 'not found: ' + url.path}]})
+
+    def handle_dbt(self, method, url, body):
+        catalog = self.server.catalog
+        path = url.path
+        params = parse_qs(url.query)
+        if path == '/dbt/graphql':
+            request = json.loads(body)
+            selection = parse_selection(request['query'])
+            model_selection = selection.get('get_models', selection).get('models')
+            variables = request.get('variables', {})
+            models = catalog.get_models(int(variables.get('jobId', 0)))
+            for argument, field in (('database', 'database'), ('schema', 'schema'), ('identifier', 'name')): #models filtered by relation
+                if variables.get(argument):
+                    models = [model for model in models if model[field] == variables[argument]]
+            return self.send(200, {'data': {'models': project_fields(models, model_selection)}})
+        if path in ('/dbt/api/v2/accounts/', '/dbt/api/v2/accounts'):
+            return self.send(200, {'data': [{'id': DBT_ACCOUNT_ID, 'name': 'mock account'}]})
+
+        match = re.fullmatch(r'/dbt/api/v3/accounts/\d+/projects/(\d+)/?', path)
+        if match:
+            j = int(match.group(1)) - catalog.project_id(0)
+            return self.send(200, {'data': {'id': int(match.group(1)), 'repository': {'full_name': 'mock-org/project_' + str(j)}}})
+
+        match = re.fullmatch(r'/dbt/api/v2/accounts/\d+/jobs/(\d+)/?', path)
+        if match:
+            dbt_job = next((dbt_job for dbt_job in catalog.get_jobs() if dbt_job['id'] == int(match.group(1))), None)
+            if dbt_job is None:
+                return self.send(404, {'status': {'is_success': False, 'user_message': 'job not found'}, 'data': None})
+            return self.send(200, {'data': dbt_job})
+
+        match = re.fullmatch(r'/dbt/api/v2/accounts/\d+/(projects|jobs|runs)/?', path)
+        if match is None:
+            return self.send(404, {'errors': [{'message': 'not found: ' + path}]})
+        if match.group(1) == 'runs':
+            job_id = int(params.get('job_definition_id', [0])[0])
+            j = job_id - catalog.job_id(0)
+            runs = [{'id': LATEST_RUN_ID_OFFSET + j, 'job_definition_id': job_id, 'status': 10}] if 0 <= j < catalog.jobs else []
+            return self.send(200, {'data': runs})
+        items = catalog.get_projects() if match.group(1) == 'projects' else catalog.get_jobs()
+        order_by = params.get('order_by', [''])[0]
+        if order_by:
+            items = sorted(items, key=lambda item: item.get(order_by.lstrip('-')), reverse=order_by.startswith('-'))
+        offset = int(params.get('offset', [0])[0])
+        limit = int(params.get('limit', [100])[0])
+        return self.send(200, {'data': items[offset:offset + limit], 'extra': {'pagination': {'count': len(items[offset:offset + limit]), 'total_count': len(items)}}})
+
+    def handle_tableau(self, method, url, body):
+        catalog = self.server.catalog
+        path = url.path
+        if path.endswith('/auth/signin'):
+            return self.send(200, {'credentials': {'token': 'mock-token', 'site': {'id': TABLEAU_SITE_ID, 'contentUrl': 'mock'}, 'user': {'id': make_uuid('user', 1)}}})
+        if path == '/tableau/api/metadata/graphql':
+            request = json.loads(body)
+            response = self.handle_metadata_query(request['query'], request.get('variables') or {})
+            if self.server.metadata_node_limit > 0 and count_nodes(response.get('data')) > self.server.metadata_node_limit: #partial results with an error, like tableau
+                response['errors'] = [{'message': 'Showing partial results. The request exceeded the ' + str(self.server.metadata_node_limit) + ' node limit. Use pagination, additional filtering, or both in the query to adjust results.',
+                                       'extensions': {'severity': 'WARNING', 'code': 'NODE_LIMIT_EXCEEDED'}}]
+            return self.send(200, response)
+
+        match = re.fullmatch(r'/tableau/api/[\d.]+/sites/[^/]+/(.*)', path)
+        if match is None:
+            return self.send(404, {'error': {'summary': 'not found'}})
+        resource = match.group(1)
+        with catalog.lock:
+            match = re.fullmatch(r'tables/(' + UUID_PATTERN + ')', resource)
+            if match and method == 'PUT':
+                table = ElementTree.fromstring(body).find('table')
+                state = catalog.table_state.setdefault(match.group(1), {})
+                for key, value in table.attrib.items():
+                    state[key] = value == 'true' if key == 'isCertified' else value
+                return self.send(200, {'table': {'id': match.group(1)}})
+            match = re.fullmatch(r'(tables|columns)/(' + UUID_PATTERN + ')/tags', resource)
+            if match and method == 'PUT':
+                state = catalog.table_state if match.group(1) == 'tables' else catalog.column_state
+                state.setdefault(match.group(2), {}).setdefault('tags', set()).update(html.unescape(label) for label in re.findall(r'label="(.*?)"', body))
+                return self.send(200, {'tags': {}})
+            match = re.fullmatch(r'tags:(batchCreate|batchDelete)', resource)
+            if match and method == 'PUT':
+                tag_batch = ElementTree.fromstring(body).find('tagBatch')
+                labels = {tag.get('label') for tag in tag_batch.iter('tag')}
+                for content in tag_batch.iter('content'):
+                    state = catalog.table_state if content.get('contentType') == 'table' else catalog.column_state
+                    tags = state.setdefault(content.get('id'), {}).setdefault('tags', set())
+                    if match.group(1) == 'batchCreate':
+                        tags.update(labels)
+                    else:
+                        tags.difference_update(labels)
+                return self.send(200, {'tagBatch': {}})
+            match = re.fullmatch(r'tables/' + UUID_PATTERN + '/columns/(' + UUID_PATTERN + ')', resource)
+            if match and method == 'PUT':
+                description = re.search(r'description="(.*?)"', body, re.S)
+                catalog.column_state.setdefault(match.group(1), {})['description'] = html.unescape(description.group(1)) if description else ''
+                return self.send(200, {'column': {'id': match.group(1)}})
+            match = re.fullmatch(r'dataQualityWarnings/table/(' + UUID_PATTERN + ')', resource)
+            if match and method == 'GET':
+                warnings = catalog.dq_warnings.get(match.group(1), [])
+                return self.send(200, {'dataQualityWarningList': {'dataQualityWarning': [dict(warning, id=warning['luid']) for warning in warnings]} if warnings else {}})
+            if match and method == 'POST':
+                catalog.dq_warning_count += 1
+                warning = dict(get_quality_warning_attributes(body), luid=make_uuid('dq_warning', catalog.dq_warning_count))
+                catalog.dq_warnings.setdefault(match.group(1), []).append(warning)
+                return self.send(200, {'dataQualityWarning': warning})
+            match = re.fullmatch(r'dataQualityWarnings/(' + UUID_PATTERN + ')', resource)
+            if match:
+                for table_luid, warnings in catalog.dq_warnings.items():
+                    for warning in warnings:
+                        if warning['luid'] == match.group(1):
+                            if method == 'DELETE':
+                                warnings.remove(warning)
+                                return self.send(204, '')
+                            warning.update(get_quality_warning_attributes(body))
+                            return self.send(200, {'dataQualityWarning': warning})
+                return self.send(404, {'error': {'summary': 'data quality warning not found'}})
+        return self.send(404, {'error': {'summary': 'not found: ' + resource}})
+
+    def handle_metadata_query(self, query, variables):
+        catalog = self.server.catalog
+        first = int(variables.get('first') or 100)
+        after = variables.get('after')
+        operation = re.search(r'query\s+(\w+)', query)
+        operation = operation.group(1) if operation else ''
+
+        if operation == 'get_databaseServers':
+            server_node = {'name': DATABASE_NAME, 'id': DATABASE_SERVER_ID, 'hostName': DATABASE_HOST,
+                           'tablesConnection': make_connection([catalog.get_table(k) for k in range(catalog.tables)], get_nested_first(query, 'tablesConnection'), None)}
+            return {'data': {'databaseServersConnection': make_connection([server_node], first, after)}}
+        if operation == 'get_databaseServer_table_counts':
+            server_node = {'name': DATABASE_NAME, 'id': DATABASE_SERVER_ID, 'hostName': DATABASE_HOST, 'tablesConnection': {'totalCount': catalog.tables}}
+            return {'data': {'databaseServersConnection': make_connection([server_node], first, after)}}
+        if operation == 'get_databaseServer_tables':
+            tables = [catalog.get_table(k) for k in range(catalog.tables)]
+            return {'data': {'databaseServers': [{'tablesConnection': make_connection(tables, first, after)}]}}
+        if operation == 'get_database_tables_by_name':
+            names = set(json.loads(re.search(r'nameWithin: (\[.*?\])', query).group(1)))
+            database_server = {'name': DATABASE_NAME, 'id': DATABASE_SERVER_ID, 'hostName': DATABASE_HOST, 'connectionType': 'snowflake'}
+            tables = [dict(table, database=database_server) for table in (catalog.get_table(k) for k in range(catalog.tables)) if table['name'] in names]
+            return {'data': {'databaseTablesConnection': make_connection(tables, first, after)}}
+
+        luids = re.search(r'luidWithin: (\[.*?\])', query)
+        table_indexes = [k for k in (catalog.get_table_index(luid) for luid in json.loads(luids.group(1)))] if luids else []
+        table_indexes = [k for k in table_indexes if k is not None]
+        if operation == 'get_table_columns':
+            column_first = get_nested_first(query, 'columnsConnection')
+            nodes = [{'luid': catalog.table_luid(k), 'columnsConnection': make_connection(catalog.get_columns(k), column_first, None)} for k in table_indexes]
+            return {'data': {'databaseTablesConnection': make_connection(nodes, first, after)}}
+        if operation == 'get_more_table_columns':
+            luid = re.search(r'luid: "(.*?)"', query).group(1)
+            k = catalog.get_table_index(luid)
+            columns = catalog.get_columns(k) if k is not None else []
+            return {'data': {'databaseTables': [{'columnsConnection': make_connection(columns, first, after)}]}}
+        if operation == 'get_table_states':
+            state_keys = ('luid', 'tableauDescription', 'isCertified', 'certificationNote', 'tableauTags')
+            nodes = [{key: value for key, value in catalog.get_table(k).items() if key in state_keys} for k in table_indexes]
+            return {'data': {'databaseTablesConnection': make_connection(nodes, first, after)}}
+        if operation == 'get_table_quality_warnings':
+            with catalog.lock:
+                nodes = [{'luid': catalog.table_luid(k), 'dataQualityWarnings': [dict(warning) for warning in catalog.dq_warnings.get(catalog.table_luid(k), [])]} for k in table_indexes]
+            return {'data': {'databaseTablesConnection': make_connection(nodes, first, after)}}
+        if operation == 'get_downstream_workbooks':
+            downstream_workbook_index = catalog.get_downstream_workbook_index()
+            nodes = [{'luid': catalog.table_luid(k), 'downstreamWorkbooks': [catalog.get_workbook(w) for w in downstream_workbook_index.get(k, [])]} for k in table_indexes]
+            return {'data': {'databaseTablesConnection': make_connection(nodes, first, after)}}
+        return {'errors': [{'message': 'mock metadata api does not support query ' + operation}]}
+
+    def handle_github(self, method, url, body):
+        catalog = self.server.catalog
+        match = re.fullmatch(r'/github/repos/([^/]+/[^/]+)(/.*)?', url.path)
+        if match is None:
+            return self.send(404, {'message': 'Not Found'})
+        repository_name, resource = match.group(1), match.group(2) or ''
+        params = parse_qs(url.query)
+        with catalog.lock:
+            repo = catalog.get_github_repo(repository_name)
+            if resource == '' and method == 'GET':
+                return self.send(200, {'full_name': repository_name, 'default_branch': repo['branch']})
+            match = re.fullmatch(r'/git/refs?/heads/(.+)', resource)
+            if match and match.group(1) in repo['refs']:
+                if method == 'PATCH':
+                    commit_sha = json.loads(body)['sha']
+                    if repo['refs'][match.group(1)] not in repo['commits'].get(commit_sha, {}).get('parents', []):
+                        return self.send(422, {'message': 'Update is not a fast forward'})
+                    repo['refs'][match.group(1)] = commit_sha
+                return self.send(200, {'ref': 'refs/heads/' + match.group(1), 'object': {'type': 'commit', 'sha': repo['refs'][match.group(1)]}})
+            match = re.fullmatch(r'/git/commits/([0-9a-f]{40})', resource)
+            if match and method == 'GET' and match.group(1) in repo['commits']:
+                return self.send(200, {'sha': match.group(1), 'tree': {'sha': repo['commits'][match.group(1)]['tree']}})
+            if resource == '/git/trees' and method == 'POST':
+                request = json.loads(body)
+                files = dict(repo['trees'][request['base_tree']])
+                for entry in request['tree']:
+                    files[entry['path']] = entry['content']
+                tree_sha = get_git_sha('tree', json.dumps(files, sort_keys=True))
+                repo['trees'][tree_sha] = files
+                return self.send(201, {'sha': tree_sha})
+            if resource == '/git/commits' and method == 'POST':
+                request = json.loads(body)
+                commit_sha = get_git_sha('commit', json.dumps(request, sort_keys=True))
+                repo['commits'][commit_sha] = {'tree': request['tree'], 'parents': request['parents']}
+                return self.send(201, {'sha': commit_sha})
+            match = re.fullmatch(r'/contents/(.+)', resource)
+            if match and method == 'GET':
+                commit_sha = params.get('ref', [repo['refs'][repo['branch']]])[0]
+                files = repo['trees'][repo['commits'][commit_sha]['tree']]
+                if match.group(1) not in files:
+                    return self.send(404, {'message': 'Not Found'})
+                content = files[match.group(1)]
+                return self.send(200, {'path': match.group(1), 'sha': get_git_sha('blob', content), 'content': base64.b64encode(content.encode('utf-8')).decode('utf-8')})
+        return self.send(404, {'message': 'Not Found'})
+
+#http server holding the mock catalog, request counters, simulated latency, the tableau rate limit (requests per second, 0 for no limit) and the
+#metadata api node limit (nodes per response, 0 for no limit)
+class mock_server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, catalog, latency_ms=0, tableau_rate_limit=0, retry_after=1, metadata_node_limit=0):
+        super().__init__(address, mock_request_handler)
+        self.catalog = catalog
+        self.latency = latency_ms / 1000.0
+        self.tableau_rate_limit = tableau_rate_limit
+        self.retry_after = retry_after
+        self.metadata_node_limit = metadata_node_limit
+        self.stats_lock = threading.Lock()
+        self.request_counts = Counter()
+        self.throttled_counts = Counter()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+
+    #returns true when the tableau rate limit has been exceeded in the current one second window
+    def is_throttled(self):
+        if self.tableau_rate_limit <= 0:
+            return False
+        with self.stats_lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            return self.window_count > self.tableau_rate_limit
+
+#runs the mock services until the process is terminated (used as a multiprocessing target so the mock does not share the benchmark's GIL)
+def serve(port, catalog_settings, latency_ms=0, tableau_rate_limit=0, ready=None, metadata_node_limit=0):
+    server = mock_server(('127.0.0.1', port), mock_catalog(**catalog_settings), latency_ms, tableau_rate_limit, metadata_node_limit=metadata_node_limit)
+    if ready is not None:
+        ready.put(server.server_address[1])
+    server.serve_forever()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='serve the mock dbt Cloud, tableau and github APIs')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--jobs', type=int, default=4)
+    parser.add_argument('--models', type=int, default=100)
+    parser.add_argument('--tables', type=int, default=None)
+    parser.add_argument('--columns', type=int, default=10)
+    parser.add_argument('--workbooks', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--tableau-rate-limit', type=int, default=0)
+    parser.add_argument('--metadata-node-limit', type=int, default=0)
+    args = parser.parse_args()
+    print('serving mock services on http://127.0.0.1:' + str(args.port))
+    serve(args.port, {'jobs': args.jobs, 'models': args.models, 'tables': args.tables, 'columns': args.columns, 'workbooks': args.workbooks}, args.latency_ms, args.tableau_rate_limit, metadata_node_limit=args.metadata_node_limit)
@@ -0,0 +1,198 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+#offline benchmark: replays a full sync against the local mock services (benchmarks/mock_services.py) and reports the wall time,
+#requests per endpoint and peak RSS of each stage (fetch, merge, publish, exposures)
+#e.g. python benchmarks/run_benchmark.py --jobs 8 --models 500 --columns 20 --workbooks 200 --latency-ms 20 --tableau-rate-limit 100
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import mock_services
+
+STAGES = ['fetch', 'merge', 'publish', 'exposures']
+
+#imports the sync module of the dbt_tabcatalog package from the repo folder
+def import_dbt_tabcatalog():
+    from dbt_tabcatalog import sync
+    return sync
+
+#returns app_settings pointing every api at the mock services, with local state kept in the benchmark working folder
+def make_mock_settings(dbt_tabcatalog, base_url, workdir, args):
+    settings = dbt_tabcatalog.app_settings(os.path.join(REPO_DIR, dbt_tabcatalog.CONFIG))
+    settings.dbt_token = 'mock'
+    settings.dbt_cloud_api = base_url + '/dbt/api/v2/accounts/'
+    settings.dbt_metadata_api = base_url + '/dbt/graphql'
+    settings.dbt_meta_certification_flag = 'TableauCertified'
+    settings.dbt_project_filter = []
+    settings.dbt_generate_exposures = True
+    settings.dbt_model_cache_dir = os.path.join(workdir, '.dbt_model_cache')
+    settings.tableau_token_name = 'mock'
+    settings.tableau_token = 'mock'
+    settings.tableau_site = 'mock'
+    settings.tableau_server = base_url + '/tableau'
+    settings.tableau_max_workers = args.tableau_max_workers
+    settings.tableau_requests_per_second = args.tableau_requests_per_second
+    if args.metadata_node_limit > 0: #configured like TABLEAU_METADATA_NODE_LIMIT for a server with a lower node limit
+        settings.tableau_metadata_node_limit = args.metadata_node_limit
+    settings.database_type_filter = 'snowflake'
+    settings.database_name_filter = []
+    settings.database_account_filter = []
+    settings.github_token = 'mock'
+    settings.github_api = base_url + '/github'
+    settings.incremental_sync = args.incremental_sync
+    settings.sync_state_file = os.path.join(workdir, 'sync_state.json')
+    settings.sync_journal_file = os.path.join(workdir, 'sync_journal.jsonl')
+    settings.sync_checkpoint_file = os.path.join(workdir, 'sync_checkpoint.json')
+    settings.metrics_report_file = ''
+    settings.catalog_cache_file = os.path.join(workdir, '.catalog_cache.sqlite') if args.catalog_cache else ''
+    return settings
+
+#returns the current resident set size in bytes (falls back to the peak rss where /proc is not available)
+def get_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+#samples the resident set size in a background thread and records the peak since the last reset
+class rss_sampler:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = get_rss()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, get_rss())
+
+    def reset(self):
+        self.peak = get_rss()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, get_rss())
+
+def call_mock(base_url, path):
+    with urllib.request.urlopen(base_url + path) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+#runs a stage and returns its result and wall time, requests per endpoint, throttled requests and peak rss
+def run_stage(base_url, sampler, stage_function, verbose):
+    call_mock(base_url, '/__reset')
+    sampler.reset()
+    start = time.perf_counter()
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        result = stage_function()
+    wall_time = time.perf_counter() - start
+    stats = call_mock(base_url, '/__stats')
+    return result, {
+        'wall_time_s': round(wall_time, 3),
+        'requests': sum(stats['requests'].values()),
+        'throttled': sum(stats['throttled'].values()),
+        'peak_rss_mb': round(max(sampler.peak, get_rss()) / 1024 / 1024, 1),
+        'requests_by_endpoint': dict(sorted(stats['requests'].items()))
+    }
+
+#runs the fetch, merge, publish and exposures stages of one sync and returns the stage reports
+def run_sync_stages(dbt_tabcatalog, settings, base_url, verbose):
+    sampler = rss_sampler()
+    report = {}
+    dbt_client, tableau_client, github_client = dbt_tabcatalog.make_api_clients(settings)
+    try:
+        catalog, report['fetch'] = run_stage(base_url, sampler, lambda: dbt_tabcatalog.fetch_catalog(settings, dbt_client, tableau_client), verbose)
+        merged_tables_by_job, report['merge'] = run_stage(base_url, sampler, lambda: dbt_tabcatalog.merge_catalog(catalog), verbose)
+        result, report['publish'] = run_stage(base_url, sampler, lambda: dbt_tabcatalog.publish_catalog(settings, tableau_client, merged_tables_by_job), verbose)
+        result, report['exposures'] = run_stage(base_url, sampler, lambda: dbt_tabcatalog.publish_exposures(settings, dbt_client, github_client, tableau_client, catalog['dbt_account_id'], merged_tables_by_job), verbose)
+    finally:
+        sampler.stop()
+        for client in (dbt_client, tableau_client, github_client):
+            client.close()
+    report['total'] = {'wall_time_s': round(sum(report[stage]['wall_time_s'] for stage in STAGES), 3),
+                       'requests': sum(report[stage]['requests'] for stage in STAGES),
+                       'throttled': sum(report[stage]['throttled'] for stage in STAGES),
+                       'peak_rss_mb': max(report[stage]['peak_rss_mb'] for stage in STAGES)}
+    return report
+
+def print_report(run_name, report, show_endpoints):
+    print('\n' + run_name)
+    print('  ' + 'stage'.ljust(10) + 'wall time (s)'.rjust(14) + 'requests'.rjust(10) + 'throttled'.rjust(11) + 'peak rss (MB)'.rjust(15))
+    for stage in STAGES + ['total']:
+        row = report[stage]
+        print('  ' + stage.ljust(10) + str(row['wall_time_s']).rjust(14) + str(row['requests']).rjust(10) + str(row['throttled']).rjust(11) + str(row['peak_rss_mb']).rjust(15))
+    if show_endpoints:
+        for stage in STAGES:
+            for endpoint, count in report[stage]['requests_by_endpoint'].items():
+                print('    ' + stage.ljust(10) + str(count).rjust(7) + '  ' + endpoint)
+
+def main():
+    parser = argparse.ArgumentParser(description='offline benchmark of a full dbt to tableau catalog sync against mock services')
+    parser.add_argument('--jobs', type=int, default=4, help='number of dbt jobs (one dbt project per job)')
+    parser.add_argument('--models', type=int, default=100, help='number of dbt models per job')
+    parser.add_argument('--tables', type=int, default=None, help='number of tableau tables (defaults to one per dbt model, extra tables are unmatched)')
+    parser.add_argument('--columns', type=int, default=10, help='number of columns per model/table')
+    parser.add_argument('--workbooks', type=int, default=50, help='number of tableau workbooks (each depends on 3 tables)')
+    parser.add_argument('--latency-ms', type=float, default=10, help='simulated latency of every mock api request')
+    parser.add_argument('--tableau-rate-limit', type=int, default=0, help='tableau requests per second before the mock responds with 429 (0 for no limit)')
+    parser.add_argument('--metadata-node-limit', type=int, default=0, help='nodes per tableau metadata API response before the mock responds with a node limit error (0 for no limit)')
+    parser.add_argument('--tableau-requests-per-second', type=int, default=100, help='client side tableau rate limit')
+    parser.add_argument('--tableau-max-workers', type=int, default=8)
+    parser.add_argument('--runs', type=int, default=2, help='number of consecutive syncs (later runs use the sync state and dbt model cache)')
+    parser.add_argument('--no-incremental-sync', dest='incremental_sync', action='store_false')
+    parser.add_argument('--no-catalog-cache', dest='catalog_cache', action='store_false', help='download the whole catalog on every run')
+    parser.add_argument('--endpoints', action='store_true', help='print requests per endpoint for each stage')
+    parser.add_argument('--verbose', action='store_true', help='show the sync output')
+    parser.add_argument('--output', help='write the report to a json file')
+    parser.add_argument('--metrics-report', help='write the sync metrics of the last run to a json file (or a prometheus textfile when the name ends with .prom)')
+    args = parser.parse_args()
+
+    catalog_settings = {'jobs': args.jobs, 'models': args.models, 'tables': args.tables, 'columns': args.columns, 'workbooks': args.workbooks}
+    ready = multiprocessing.Queue()
+    mock_process = multiprocessing.Process(target=mock_services.serve, args=(0, catalog_settings, args.latency_ms, args.tableau_rate_limit, ready, args.metadata_node_limit), daemon=True)
+    mock_process.start()
+    base_url = 'http://127.0.0.1:' + str(ready.get(timeout=30))
+
+    dbt_tabcatalog = import_dbt_tabcatalog()
+    workdir = tempfile.mkdtemp(prefix='dbt_tabcatalog_benchmark_')
+    cwd = os.getcwd()
+    os.chdir(workdir) #exposures files are written to the working folder
+    reports = []
+    try:
+        settings = make_mock_settings(dbt_tabcatalog, base_url, workdir, args)
+        print('benchmarking ' + json.dumps(catalog_settings) + ' against ' + base_url + ' with ' + str(args.latency_ms) + 'ms latency')
+        for run in range(args.runs):
+            dbt_tabcatalog.metrics.reset()
+            report = run_sync_stages(dbt_tabcatalog, settings, base_url, args.verbose)
+            reports.append(report)
+            print_report('run ' + str(run + 1) + (' (cold)' if run == 0 else ' (warm)'), report, args.endpoints)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        mock_process.terminate()
+
+    if args.metrics_report:
+        dbt_tabcatalog.metrics.write_report(os.path.abspath(os.path.join(cwd, args.metrics_report)))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'settings': dict(vars(args)), 'runs': reports}, f, indent=2)
+    return reports
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2 @@
+#syncs dbt Cloud metadata to the Tableau Catalog and generates dbt exposures for the downstream Tableau workbooks
+#the sync is in dbt_tabcatalog.sync and the command line entry point (the dbt-tabcatalog console script) in dbt_tabcatalog.cli
@@ -0,0 +1,4 @@
+from .cli import main
+
+#MAIN PROGRAM: python -m dbt_tabcatalog
+main()
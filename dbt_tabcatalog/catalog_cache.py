@@ -0,0 +1,71 @@
+import json
+import os
+import sqlite3
+import time
+
+#default time to live of each cached entity type in minutes. within the TTL a snapshot is used as is (dbt_account, dbt_projects, dbt_project_repositories)
+#or refreshed with a delta (dbt_jobs, tableau_tables), after the TTL it is downloaded again in full
+CACHE_TTL_MINUTES = {'dbt_account': 1440, 'dbt_projects': 1440, 'dbt_jobs': 1440, 'dbt_project_repositories': 10080, 'tableau_tables': 720}
+
+#on-disk snapshot cache of catalog entities (dbt account, projects and jobs, tableau database servers and tables) in a sqlite database
+#a snapshot is the set of records of an entity type for a scope (e.g. a dbt account or a tableau site and database filter), with the time
+#it was downloaded in full and an optional watermark used for delta refreshes
+class catalog_cache:
+    def __init__(self, cache_file, ttl_minutes=None):
+        self.cache_file = cache_file
+        self.ttl_minutes = dict(CACHE_TTL_MINUTES, **(ttl_minutes or {}))
+        with self.connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS snapshots (entity TEXT, scope TEXT, fetched_at REAL, watermark TEXT, PRIMARY KEY (entity, scope))')
+            connection.execute('CREATE TABLE IF NOT EXISTS records (entity TEXT, scope TEXT, key TEXT, value TEXT, PRIMARY KEY (entity, scope, key))')
+
+    #returns a new connection (sqlite connections are not shared between threads)
+    def connect(self):
+        directory = os.path.dirname(self.cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return sqlite3.connect(self.cache_file, timeout=30)
+
+    #returns the snapshot of an entity as a dictionary with fetched_at, watermark and is_fresh (within the entity TTL), or None if there is no snapshot
+    def get_snapshot(self, entity, scope):
+        with self.connect() as connection:
+            row = connection.execute('SELECT fetched_at, watermark FROM snapshots WHERE entity = ? AND scope = ?', (entity, scope)).fetchone()
+        if row is None:
+            return None
+        return {'fetched_at': row[0], 'watermark': row[1], 'is_fresh': time.time() - row[0] < self.ttl_minutes.get(entity, 0) * 60}
+
+    #returns the records of an entity snapshot as a dictionary of key to value
+    def get_records(self, entity, scope):
+        with self.connect() as connection:
+            rows = connection.execute('SELECT key, value FROM records WHERE entity = ? AND scope = ? ORDER BY rowid', (entity, scope)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    #replaces the snapshot of an entity with a dictionary of key to record (a full download)
+    def put_snapshot(self, entity, scope, records, watermark=None):
+        with self.connect() as connection:
+            connection.execute('DELETE FROM records WHERE entity = ? AND scope = ?', (entity, scope))
+            connection.executemany('INSERT INTO records (entity, scope, key, value) VALUES (?, ?, ?, ?)', ((entity, scope, str(key), json.dumps(value)) for key, value in records.items()))
+            connection.execute('INSERT OR REPLACE INTO snapshots (entity, scope, fetched_at, watermark) VALUES (?, ?, ?, ?)', (entity, scope, time.time(), watermark))
+
+    #applies a delta to the snapshot of an entity: upserts the changed records, deletes the removed keys and moves the watermark
+    #(the time of the last full download is kept, so the snapshot is still downloaded in full once its TTL expires)
+    def update_snapshot(self, entity, scope, changed_records, removed_keys=(), watermark=None):
+        with self.connect() as connection:
+            connection.executemany('INSERT OR REPLACE INTO records (entity, scope, key, value) VALUES (?, ?, ?, ?)', ((entity, scope, str(key), json.dumps(value)) for key, value in changed_records.items()))
+            connection.executemany('DELETE FROM records WHERE entity = ? AND scope = ? AND key = ?', ((entity, scope, str(key)) for key in removed_keys))
+            if watermark is not None:
+                connection.execute('UPDATE snapshots SET watermark = ? WHERE entity = ? AND scope = ?', (watermark, entity, scope))
+
+    #returns the records of a snapshot which is used as is within its TTL, downloading them with fetch_records (a function returning a dictionary of key to record) otherwise
+    def get_or_fetch(self, entity, scope, fetch_records):
+        snapshot = self.get_snapshot(entity, scope)
+        if snapshot is not None and snapshot['is_fresh']:
+            return self.get_records(entity, scope)
+        records = fetch_records()
+        self.put_snapshot(entity, scope, records)
+        return records
+
+    #removes every snapshot (the next run downloads the whole catalog)
+    def clear(self):
+        with self.connect() as connection:
+            connection.execute('DELETE FROM records')
+            connection.execute('DELETE FROM snapshots')
@@ -0,0 +1,111 @@
+import sys
+
+#compact in-memory records of the catalog entities a sync works on: dbt models, tableau tables, their columns and the merged tables
+#every record keeps only the fields used by the sync stages (in __slots__, so there is no per record dictionary), shares one string object for
+#each repeated name (database, schema, package and column names, statuses) and has its normalized join key computed once
+
+#returns a name stripped and lowercased for use in join keys (interned, keys are compared and stored many times)
+def normalize_name(name):
+    return sys.intern((name or '').strip().lower())
+
+#returns a repeated name as a shared string object (None stays None)
+def intern_name(name):
+    return sys.intern(name) if isinstance(name, str) else name
+
+#returns the set of tag labels of a tableau item from its Metadata API tags ([{'name': ...}]) or REST API tags ({'tag': [{'label': ...}]})
+def get_tag_labels(tags):
+    if isinstance(tags, dict):
+        return frozenset(intern_name(tag['label']) for tag in tags.get('tag', []))
+    return frozenset(intern_name(tag['name']) for tag in tags or [])
+
+#dbt model statistics used in the tableau table description
+DBT_MODEL_STATS = ('has_stats', 'row_count', 'last_modified')
+
+#a dbt column, or a tableau column (with its luid as id and its tags)
+class ColumnRef:
+    __slots__ = ('name', 'key', 'description', 'id', 'tags')
+
+    def __init__(self, name, description=None, id=None, tags=frozenset()):
+        self.name = intern_name(name)
+        self.key = normalize_name(name)
+        self.description = description
+        self.id = id
+        self.tags = tags
+
+    #returns a tableau column from a Metadata API column node
+    @classmethod
+    def from_tableau_node(cls, column_node):
+        return cls(column_node['name'], column_node.get('description'), column_node['luid'], get_tag_labels(column_node.get('tags')))
+
+#a dbt model from the dbt Metadata API, keyed on its normalized (database, schema, name)
+class DbtModel:
+    __slots__ = ('unique_id', 'package_name', 'run_id', 'account_id', 'project_id', 'job_id', 'environment_id', 'status', 'execute_completed_at',
+                 'database', 'schema', 'name', 'description', 'stats', 'meta', 'columns', 'key')
+
+    #returns a dbt model from a Metadata API model node (or a node written by to_node). columns is None when columns were not requested
+    @classmethod
+    def from_node(cls, model_node):
+        model = cls()
+        model.unique_id = model_node['uniqueId']
+        model.package_name = intern_name(model_node['packageName'])
+        model.run_id = model_node['runId']
+        model.account_id = model_node['accountId']
+        model.project_id = model_node['projectId']
+        model.job_id = model_node['jobId']
+        model.environment_id = model_node.get('environmentId')
+        model.status = intern_name(model_node['status'])
+        model.execute_completed_at = intern_name(model_node['executeCompletedAt'])
+        model.database = intern_name(model_node['database'])
+        model.schema = intern_name(model_node['schema'])
+        model.name = intern_name(model_node['name'])
+        model.description = model_node.get('description')
+        model.stats = tuple((intern_name(stat['id']), stat['value']) for stat in model_node.get('stats') or [] if stat['id'] in DBT_MODEL_STATS)
+        model.meta = model_node.get('meta')
+        columns = model_node.get('columns')
+        model.columns = None if columns is None else tuple(ColumnRef(column['name'], column.get('description')) for column in columns)
+        model.key = (normalize_name(model.database), normalize_name(model.schema), normalize_name(model.name))
+        return model
+
+    #returns the model as a Metadata API model node (e.g. for the local model cache)
+    def to_node(self):
+        model_node = {'uniqueId': self.unique_id, 'packageName': self.package_name, 'runId': self.run_id, 'accountId': self.account_id, 'projectId': self.project_id,
+                      'jobId': self.job_id, 'environmentId': self.environment_id, 'status': self.status, 'executeCompletedAt': self.execute_completed_at,
+                      'database': self.database, 'schema': self.schema, 'name': self.name, 'description': self.description,
+                      'stats': [{'id': stat_id, 'value': value} for stat_id, value in self.stats], 'meta': self.meta}
+        if self.columns is not None:
+            model_node['columns'] = [{'name': column.name, 'description': column.description} for column in self.columns]
+        return model_node
+
+#a tableau database table from the Metadata API, keyed on its normalized (database host, database, schema, name)
+#description, is_certified, certification_note and tags are the current tableau values (description is None when they were not fetched)
+class TableauTable:
+    __slots__ = ('luid', 'name', 'schema', 'database', 'description', 'is_certified', 'certification_note', 'tags', 'key')
+
+    #returns a tableau table from a Metadata API table node and its database server (the database server name is used where the table has no parent database)
+    @classmethod
+    def from_node(cls, table_node, database_server):
+        table = cls()
+        table.luid = table_node['luid']
+        table.name = intern_name(table_node['name'])
+        table.schema = intern_name(table_node['schema'])
+        table.database = intern_name(table_node['database']['name'] if table_node.get('database') else database_server['name'])
+        table.set_state(table_node)
+        table.key = (normalize_name(database_server['hostName']), normalize_name(table.database), normalize_name(table.schema), normalize_name(table.name))
+        return table
+
+    #sets the current tableau description, certification and tags of the table from a Metadata API table node (description stays None when
+    #the node has no state fields e.g. a table from the catalog cache)
+    def set_state(self, table_node):
+        self.description = (table_node['tableauDescription'] or '') if 'tableauDescription' in table_node else None
+        self.is_certified = bool(table_node.get('isCertified'))
+        self.certification_note = table_node.get('certificationNote')
+        self.tags = get_tag_labels(table_node.get('tableauTags'))
+
+#a tableau table matched to the dbt model published to it (both are shared, not copied)
+class MergedTable:
+    __slots__ = ('table', 'model', 'luid')
+
+    def __init__(self, table, model):
+        self.table = table
+        self.model = model
+        self.luid = table.luid
@@ -0,0 +1,74 @@
+import argparse
+import cProfile
+import json
+from .sync import CONFIG, SYNC_PLAN_FILE, app_settings, get_catalog_cache, sync_daemon, run_multi_sync, run_sync
+
+#returns a (database, schema, table) tuple from a --table argument DB.SCHEMA.TABLE
+def parse_table_name(value):
+    table_name = tuple(value.split('.'))
+    if len(table_name) != 3 or not all(table_name):
+        raise argparse.ArgumentTypeError('expected DB.SCHEMA.TABLE, got ' + value)
+    return table_name
+
+#returns the command line arguments
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(prog='dbt-tabcatalog', description='syncs dbt Cloud metadata to the tableau catalog and generates dbt exposures for the downstream tableau workbooks')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--plan', nargs='?', const=SYNC_PLAN_FILE, metavar='FILE', help='dry run: write the change plan to FILE (default ' + SYNC_PLAN_FILE + ') without sending any write to tableau or github')
+    mode.add_argument('--apply', metavar='FILE', help='execute the change plan in FILE')
+    mode.add_argument('--resume', action='store_true', help='resume the last run recorded in SYNC_JOURNAL_FILE: send only its writes which did not complete, including failed writes')
+    mode.add_argument('--daemon', action='store_true', help='keep running: sync every DAEMON_SYNC_INTERVAL_MINUTES and sync single dbt jobs when triggered on the DAEMON_HTTP_PORT endpoint')
+    scope = parser.add_argument_group('scoped runs', 'sync only part of the catalog, fetching only the dbt and tableau metadata it needs. can be combined and repeated, e.g. --project finance --table ANALYTICS.FINANCE.ORDERS')
+    scope.add_argument('--job', dest='jobs', type=int, action='append', metavar='ID', help='sync the models of the dbt job ID')
+    scope.add_argument('--project', dest='projects', action='append', metavar='NAME', help='sync the models of the jobs of the dbt project NAME (instead of DBT_PROJECT_FILTER)')
+    scope.add_argument('--table', dest='tables', type=parse_table_name, action='append', metavar='DB.SCHEMA.TABLE', help='sync the dbt model building the table DB.SCHEMA.TABLE (as named in dbt)')
+    parser.add_argument('--config', default=CONFIG, metavar='FILE', help='settings file (default ' + CONFIG + ' in the working folder)')
+    parser.add_argument('--refresh-catalog', action='store_true', help='clear the catalog cache so that the dbt projects and jobs and tableau tables are downloaded in full')
+    parser.add_argument('--profile', metavar='FILE', help='write a cProfile dump of the run to FILE (view with python -m pstats FILE or snakeviz)')
+    parsed_args = parser.parse_args(args)
+    if make_sync_scope(parsed_args) is not None and (parsed_args.apply or parsed_args.resume or parsed_args.daemon):
+        parser.error('--job, --project and --table cannot be used with --apply, --resume or --daemon')
+    return parsed_args
+
+#returns the scope of a scoped run from the command line arguments, or None to sync everything
+def make_sync_scope(args):
+    if not (args.jobs or args.projects or args.tables):
+        return None
+    return {'jobs': args.jobs or [], 'projects': args.projects or [], 'tables': args.tables or []}
+
+#runs the sync mode selected on the command line
+def run(args):
+    settings = app_settings(args.config)
+    settings.sync_scope = make_sync_scope(args)
+    if settings.sync_scope is not None:
+        print('scoped run: ' + json.dumps({key: ['.'.join(value) if isinstance(value, tuple) else value for value in values] for key, values in settings.sync_scope.items() if values}))
+        if settings.dbt_generate_exposures and (settings.sync_scope['jobs'] or settings.sync_scope['tables']):
+            print('skipping dbt exposures: the exposures file of a dbt project covers all of its jobs and models, use --project or a full run to generate it')
+            settings.dbt_generate_exposures = False
+    if args.refresh_catalog:
+        cache = get_catalog_cache(settings)
+        if cache is not None:
+            cache.clear()
+            print('cleared catalog cache ' + settings.catalog_cache_file)
+    if args.daemon:
+        sync_daemon(settings).run()
+    elif (len(settings.tableau_sites) > 0 or len(settings.dbt_accounts) > 0) and not (args.plan or args.apply or args.resume):
+        run_multi_sync(settings)
+    else:
+        run_sync(settings, args.plan, args.apply, args.resume)
+    return
+
+#command line entry point (the dbt-tabcatalog console script)
+def main(args=None):
+    args = parse_args(args)
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            run(args)
+        finally:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print('wrote cProfile dump to ' + args.profile)
+    else:
+        run(args)
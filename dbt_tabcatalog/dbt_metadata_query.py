@@ -0,0 +1,74 @@
+import json
+try:
+    import ijson #optional: streams large dbt Metadata API responses instead of loading them into memory in one go
+except ImportError:
+    ijson = None
+
+#model fields used by every sync
+MODEL_FIELDS = ['uniqueId', 'packageName', 'runId', 'accountId', 'projectId', 'jobId', 'status', 'executeCompletedAt', 'database', 'schema', 'name', 'description']
+
+#arguments of the models query which filter the models of a job by the relation they build
+MODEL_FILTER_ARGUMENTS = ('database', 'schema', 'identifier')
+
+#returns a graphql selection set for a list of fields, where a field is either a field name or a (field name, list of sub fields) tuple
+def make_selection(fields, indent=4):
+    lines = []
+    for field in fields:
+        if isinstance(field, tuple):
+            lines.append(' ' * indent + field[0] + ' {\n' + make_selection(field[1], indent + 2) + '\n' + ' ' * indent + '}')
+        else:
+            lines.append(' ' * indent + field)
+    return '\n'.join(lines)
+
+#returns the model fields needed for the sync features enabled in app_settings
+#stats are only requested for the table description (only id/value are selected: make_table_description reads the has_stats, row_count and last_modified ids)
+#columns are only requested when column publishing is enabled, meta only when certification is driven by a dbt meta config and environmentId only for exposures
+def get_model_fields(publish_columns=True, dbt_meta_certification_flag='', generate_exposures=True):
+    fields = list(MODEL_FIELDS)
+    fields.append(('stats', ['id', 'value']))
+    if dbt_meta_certification_flag != '':
+        fields.append('meta')
+    if generate_exposures:
+        fields.append('environmentId')
+    if publish_columns:
+        fields.append(('columns', ['name', 'description']))
+    return fields
+
+#returns the dbt Metadata API request body for the models of a given job
+#model_filter optionally limits the models to a relation e.g. {'database': 'ANALYTICS', 'schema': 'FINANCE', 'identifier': 'ORDERS'}
+def build_models_query(job_id, fields, model_filter=None):
+    variables = {'jobId': int(job_id)}
+    variables.update((key, value) for key, value in (model_filter or {}).items() if key in MODEL_FILTER_ARGUMENTS and value)
+    declarations = ''.join(', $' + key + ': String' for key in MODEL_FILTER_ARGUMENTS if key in variables)
+    arguments = ''.join(', ' + key + ': $' + key for key in MODEL_FILTER_ARGUMENTS if key in variables)
+    query = 'query get_models($jobId: Int!' + declarations + ') {\n  models(jobId: $jobId' + arguments + ') {\n' + make_selection(fields) + '\n  }\n}'
+    return json.dumps({'query': query, 'variables': variables})
+
+#returns the list of models from a dbt Metadata API models response, each converted with make_model when given (e.g. to a compact record, so that
+#only one model node is held at a time when streaming). the response is decoded incrementally when ijson is installed (the request must then be
+#sent with stream=True), otherwise it is parsed in one go
+def decode_models_response(response, make_model=None):
+    if ijson is None:
+        response_json = json.loads(response.text)
+        if 'errors' in response_json.keys():
+            raise Exception(response_json['errors'][0]['message'])
+        model_nodes = response_json['data']['models']
+        return [make_model(model_node) for model_node in model_nodes] if make_model else model_nodes
+
+    response.raw.decode_content = True #let urllib3 decompress gzip responses
+    dbt_models = []
+    errors = []
+    builder = None
+    for prefix, event, value in ijson.parse(response.raw, use_float=True):
+        if prefix == 'errors.item.message':
+            errors.append(value)
+        elif prefix == 'data.models.item' and event == 'start_map':
+            builder = ijson.ObjectBuilder()
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == 'data.models.item' and event == 'end_map':
+                dbt_models.append(make_model(builder.value) if make_model else builder.value)
+                builder = None
+    if len(errors) > 0:
+        raise Exception(errors[0])
+    return dbt_models
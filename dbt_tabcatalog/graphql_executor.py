@@ -0,0 +1,275 @@
+import math
+import re
+import threading
+import time
+from .sync_metrics import metrics
+
+#node limit of a Metadata API query (the default on tableau cloud and server, set with metadata.query.limits.count on tableau server)
+NODE_LIMIT = 20000
+#share of the node limit a batch is sized to, leaving room for items with more nodes than estimated
+NODE_LIMIT_HEADROOM = 0.8
+#number of items expected in a list, or a connection page, whose size is not known when the node cost of a query is estimated
+DEFAULT_LIST_SIZE = 10
+#a batch is grown after a response faster than TARGET_SECONDS and shrunk after a slower one (the Metadata API times out queries after 20 seconds by default)
+TARGET_SECONDS = 5
+BATCH_SIZE = 100
+MAX_BATCH_SIZE = 1000
+BATCH_GROWTH = 1.5
+BATCH_SLOWDOWN = 0.75
+#errors after which a query is sent again with a smaller batch, instead of failing
+NODE_LIMIT_ERROR = re.compile(r'node.?limit', re.IGNORECASE)
+TIMEOUT_ERROR = re.compile(r'time[ds]?.?out', re.IGNORECASE)
+
+#returns the operation name of a graphql query e.g. get_table_columns
+def get_operation_name(query):
+    match = re.search(r'query\s+(\w+)', query)
+    return match.group(1) if match else 'anonymous'
+
+#returns the selection tree of a graphql query: a dictionary of field name to (arguments, sub selection), where sub selection is None for scalar fields
+#aliased fields are keyed on the field name and inline fragments on '... on Type'. the operation is the root field holding the query's selection
+def parse_selection(query):
+    root = {}
+    stack = [root]
+    field = None
+    fragment = False
+    i = 0
+    while i < len(query):
+        c = query[i]
+        if c == '"':
+            i = query.index('"', i + 1)
+            while query[i - 1] == '\\':
+                i = query.index('"', i + 1)
+        elif c == '(':
+            depth = 0
+            j = i
+            while True:
+                if query[j] == '"':
+                    j = query.index('"', j + 1)
+                elif query[j] == '(':
+                    depth += 1
+                elif query[j] == ')':
+                    depth -= 1
+                    if depth == 0:
+                        break
+                j += 1
+            if field is not None:
+                stack[-1][field] = (query[i + 1:j], None)
+            i = j
+        elif c == '{':
+            sub_selection = {}
+            stack[-1][field] = (stack[-1].get(field, ('', None))[0], sub_selection)
+            stack.append(sub_selection)
+            field = None
+            fragment = False
+        elif c == '}':
+            stack.pop()
+            field = None
+        elif c == '.' and query.startswith('...', i):
+            field = '...'
+            fragment = True
+            i += 2
+        elif c == ':' and field is not None: #alias: the field name follows
+            del stack[-1][field]
+            field = None
+        elif c.isalpha() or c == '_':
+            j = i
+            while j < len(query) and (query[j].isalnum() or query[j] == '_'):
+                j += 1
+            if fragment:
+                field = field + ' ' + query[i:j]
+            else:
+                field = query[i:j]
+                stack[-1][field] = ('', None)
+            i = j - 1
+        i += 1
+    return root
+
+#returns the estimated node cost of a selection: one node for the object itself plus the nodes of its object fields. connections count the nodes of
+#a full page (first: N, or list_size when the page size is a variable) and plural fields are counted as lists of list_size objects
+def estimate_node_cost(selection, list_size=DEFAULT_LIST_SIZE):
+    cost = 1
+    for field, (arguments, sub_selection) in selection.items():
+        if sub_selection is None or field == 'pageInfo':
+            continue
+        if field.startswith('...'): #inline fragment on the same object
+            cost += estimate_node_cost(sub_selection, list_size) - 1
+        elif 'nodes' in sub_selection:
+            first = re.search(r'\bfirst:\s*(\d+)', arguments)
+            page_size = int(first.group(1)) if first else list_size
+            cost += 1 + page_size * estimate_node_cost(sub_selection['nodes'][1], list_size)
+        elif field.endswith('s'):
+            cost += list_size * estimate_node_cost(sub_selection, list_size)
+        else:
+            cost += estimate_node_cost(sub_selection, list_size)
+    return cost
+
+#returns the estimated node cost of one node of the connection found at connection_path in a query's response (list indexes in the path are skipped)
+def estimate_item_cost(query, connection_path):
+    operations = [sub_selection for arguments, sub_selection in parse_selection(query).values() if sub_selection is not None]
+    selection = operations[-1] if operations else {}
+    for key in connection_path:
+        if isinstance(key, str):
+            selection = (selection.get(key) or ('', None))[1] or {}
+    return estimate_node_cost((selection.get('nodes') or ('', None))[1] or {})
+
+#returns the number of nodes (objects) in a response value, page info excluded
+def count_nodes(value):
+    if isinstance(value, list):
+        return sum(count_nodes(item) for item in value)
+    if isinstance(value, dict):
+        return 1 + sum(count_nodes(item) for key, item in value.items() if key != 'pageInfo')
+    return 0
+
+#returns the connection found at connection_path in the data of a response
+def get_connection(data, connection_path):
+    for key in connection_path:
+        data = data[key]
+    return data
+
+#returns the reason a query can be retried with a smaller batch ('node_limit' or 'timeout'), or None
+def get_retry_reason(message):
+    if NODE_LIMIT_ERROR.search(message):
+        return 'node_limit'
+    if TIMEOUT_ERROR.search(message):
+        return 'timeout'
+    return None
+
+#executes Metadata API queries in batches sized to stay under the node limit: luid or name filter lists are split into batches of items and
+#connections are paginated in pages of nodes. every query operation keeps its own batch size, which is
+#  capped by the node cost of an item: estimated from the query at first, then learned from the nodes in the responses
+#  halved when a query exceeds the node limit or times out (and the query sent again), and not grown back to the size which exceeded the node limit
+#  grown while responses are faster than target_seconds and shrunk when they are slower
+#the batch sizes are recorded in the run metrics
+class graphql_executor:
+    def __init__(self, query_function, node_limit=NODE_LIMIT, batch_size=BATCH_SIZE, max_batch_size=MAX_BATCH_SIZE, target_seconds=TARGET_SECONDS):
+        self.query_function = query_function
+        self.node_limit = node_limit
+        self.batch_size = batch_size
+        self.max_batch_size = max_batch_size
+        self.target_seconds = target_seconds
+        self.lock = threading.Lock()
+        self.operations = {}
+
+    #returns the batching state of a query operation, starting at batch_size items with the node cost of an item estimated from the query
+    def get_operation(self, operation, query, connection_path, batch_size, max_batch_size):
+        with self.lock:
+            state = self.operations.get(operation)
+            if state is None:
+                state = self.operations[operation] = {'batch_size': batch_size, 'max_batch_size': max_batch_size, 'item_cost': estimate_item_cost(query, connection_path), 'observed': False}
+            return state
+
+    #returns the size of the next batch of an operation: its batch size, capped so the node cost of the batch stays under the node limit
+    def get_batch_size(self, state, max_size):
+        with self.lock:
+            size = min(state['batch_size'], int(self.node_limit * NODE_LIMIT_HEADROOM / max(state['item_cost'], 1)), max_size)
+        return max(1, size)
+
+    #records a query which succeeded: learns the node cost of an item from its nodes and grows the batch size after a fast response of a full batch
+    #(shrinks it after a slow response)
+    def record_success(self, operation, state, size, nodes, seconds):
+        item_cost = count_nodes(nodes) / max(size, 1)
+        with self.lock:
+            state['item_cost'] = max(item_cost, (state['item_cost'] + item_cost) / 2) if state['observed'] else max(item_cost, 1)
+            state['observed'] = True
+            batch_size = state['batch_size']
+            if seconds > self.target_seconds:
+                state['batch_size'] = max(1, int(batch_size * BATCH_SLOWDOWN))
+            elif size >= batch_size and batch_size < state['max_batch_size']:
+                state['batch_size'] = min(state['max_batch_size'], math.ceil(batch_size * BATCH_GROWTH))
+            resized = state['batch_size'] != batch_size
+        metrics.record_batch(operation, size)
+        if resized:
+            metrics.record_batch_resize(operation, 'slow' if seconds > self.target_seconds else 'grow')
+
+    #records a query which exceeded the node limit or timed out and halves the batch size, raising if the batch was a single item
+    def record_retry(self, operation, state, size, reason, message):
+        if size <= 1:
+            raise Exception(message)
+        with self.lock:
+            state['batch_size'] = max(1, size // 2)
+            if reason == 'node_limit': #size items are more than the node limit, so the batch is not grown back to size
+                state['item_cost'] = max(state['item_cost'], self.node_limit / size)
+                state['max_batch_size'] = max(1, min(state['max_batch_size'], int(size * BATCH_SLOWDOWN)))
+        print('tableau metadata API ' + operation + ' ' + ('exceeded the node limit' if reason == 'node_limit' else 'timed out') + ' for ' + str(size) + ' items, retrying with ' + str(state['batch_size']) + '...')
+        metrics.record_batch_resize(operation, reason)
+
+    #sends a query and returns (data, retry reason, error message, seconds). raises on errors which a smaller batch would not avoid
+    def send(self, query, variables):
+        start = time.perf_counter()
+        try:
+            response_json = self.query_function(query, variables)
+        except Exception as e:
+            reason = get_retry_reason(str(e))
+            if reason is None:
+                raise
+            return None, reason, str(e), time.perf_counter() - start
+        seconds = time.perf_counter() - start
+        for error in response_json.get('errors') or []: #a query over the node limit returns partial data with an error
+            reason = get_retry_reason(error.get('message', '') + ' ' + str((error.get('extensions') or {}).get('code', '')))
+            if reason is not None:
+                return None, reason, error['message'], seconds
+        if response_json.get('errors'):
+            raise Exception(response_json['errors'][0]['message'])
+        return response_json['data'], None, None, seconds
+
+    #returns the data of a query, raising on errors
+    def query(self, query, variables=None):
+        data, reason, message, seconds = self.send(query, variables or {})
+        if reason is not None:
+            raise Exception(message)
+        return data
+
+    #yields the nodes of a paginated connection (found at connection_path in the response data), following endCursor until the last page
+    #pages hold up to page_size nodes. the query must declare $first: Int and $after: String variables (pass variables={'after': cursor} to resume from a cursor)
+    def paginate(self, query, connection_path, page_size, variables=None):
+        operation = get_operation_name(query)
+        state = self.get_operation(operation, query, connection_path, page_size, page_size)
+        after = (variables or {}).get('after')
+        while True:
+            first = self.get_batch_size(state, page_size)
+            data, reason, message, seconds = self.send(query, dict(variables or {}, first=first, after=after))
+            if reason is not None:
+                self.record_retry(operation, state, first, reason, message)
+                continue
+            connection = get_connection(data, connection_path)
+            self.record_success(operation, state, first, connection['nodes'], seconds)
+            yield from connection['nodes']
+            if not connection['pageInfo']['hasNextPage']:
+                return
+            after = connection['pageInfo']['endCursor']
+
+    #yields (batch of items, nodes) for consecutive batches of a list of items (e.g. table luids), each queried with make_query(batch) and the
+    #connection found at connection_path paginated in full. a batch which exceeds the node limit or times out is sent again as a smaller batch
+    def query_batches(self, items, make_query, connection_path):
+        if len(items) == 0:
+            return
+        query = make_query(items[:1])
+        operation = get_operation_name(query)
+        state = self.get_operation(operation, query, connection_path, self.batch_size, self.max_batch_size)
+        i = 0
+        while i < len(items):
+            size = self.get_batch_size(state, len(items) - i)
+            batch = items[i:i + size]
+            nodes, reason, message, seconds = self.send_batch(make_query(batch), connection_path, size)
+            if reason is not None:
+                self.record_retry(operation, state, size, reason, message)
+                continue
+            self.record_success(operation, state, size, nodes, seconds)
+            yield batch, nodes
+            i += size
+
+    #returns (nodes, retry reason, error message, seconds) of a batch query, following its connection pages. seconds is the slowest page
+    def send_batch(self, query, connection_path, page_size):
+        nodes = []
+        after = None
+        slowest = 0
+        while True:
+            data, reason, message, seconds = self.send(query, {'first': page_size, 'after': after})
+            slowest = max(slowest, seconds)
+            if reason is not None:
+                return None, reason, message, slowest
+            connection = get_connection(data, connection_path)
+            nodes.extend(connection['nodes'])
+            if not connection['pageInfo']['hasNextPage']:
+                return nodes, None, None, slowest
+            after = connection['pageInfo']['endCursor']
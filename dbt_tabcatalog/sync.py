@@ -0,0 +1,2207 @@
+from datetime import datetime
+import json
+import yaml
+from xml.etree import ElementTree
+from yaml.loader import SafeLoader
+try:
+    from yaml import CSafeDumper as YamlDumper #libyaml emitter
+except ImportError:
+    from yaml import SafeDumper as YamlDumper
+from operator import itemgetter
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import copy
+import hashlib
+import hmac
+import multiprocessing
+import os
+import posixpath
+import queue
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from urllib.parse import urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from .dbt_metadata_query import get_model_fields, build_models_query, decode_models_response
+from .sync_metrics import metrics, get_endpoint_name
+from .catalog_cache import catalog_cache, CACHE_TTL_MINUTES
+from .catalog_records import DbtModel, TableauTable, MergedTable, ColumnRef, normalize_name
+from .sync_journal import sync_journal, make_journal_write, load_journal, get_outstanding_keys
+from .graphql_executor import graphql_executor, NODE_LIMIT, MAX_BATCH_SIZE, TARGET_SECONDS
+CONFIG='settings.yml'
+tableau_API_VERSION='3.17'
+tableau_REQUESTS_PER_SECOND=10
+HTTP_CONNECT_TIMEOUT=10
+HTTP_READ_TIMEOUT=120
+HTTP_MAX_RETRIES=5
+HTTP_POOL_SIZE=16
+GITHUB_API='https://api.github.com'
+GITHUB_EXPOSURES_FILE='models/tab_exposures.yml'
+GITHUB_COMMIT_MESSAGE='auto generated by tableau dbt integration'
+SYNC_STATE_FILE='sync_state.json'
+SYNC_JOURNAL_FILE='sync_journal.jsonl'
+SYNC_CHECKPOINT_FILE='sync_checkpoint.json'
+tableau_METADATA_BATCH_SIZE=100
+tableau_METADATA_PAGE_SIZE=500
+tableau_TAG_BATCH_SIZE=100
+tableau_TAG_BATCH_RETRIES=3
+DBT_PAGE_SIZE=100
+DBT_MAX_WORKERS=4
+DBT_MODEL_CACHE_DIR='.dbt_model_cache'
+DBT_FINISHED_RUN_STATUSES=[10, 20] #success and error: the dbt Metadata API serves the models of the last finished run
+DBT_EXPOSURES_FILE_LOCATION='exposures'
+METRICS_REPORT_FILE='sync_report.json'
+tableau_SESSION_MINUTES=100
+DAEMON_SYNC_INTERVAL_MINUTES=60
+DAEMON_HTTP_HOST='127.0.0.1'
+DAEMON_HTTP_PORT=8585
+SYNC_PLAN_FILE='sync_plan.json'
+SYNC_PLAN_VERSION=1
+TABLE_DESCRIPTION_TIMESTAMP_PREFIX='table description last updated: '
+DQ_WARNING_MESSAGE_PREFIX='dbt model status: '
+CATALOG_CACHE_FILE='.catalog_cache.sqlite'
+SYNC_SITE_PROCESSES=4
+UNMATCHED_NAMES_PRINTED=20
+
+#helper function to create xml formatted strings
+def xmlesc(txt):
+    txt = txt.replace("&", "&amp;")
+    txt = txt.replace("<", "&lt;")
+    txt = txt.replace(">", "&gt;")
+    txt = txt.replace('"', "&quot;")
+    txt = txt.replace("'", "&apos;")
+    txt = txt.replace("\n", "&#xA;")
+    return txt
+
+#helper function to get full table name in the format [DATABASE].[SCHEMA].[TABLE]
+def get_full_table_name(merged_table):
+    full_table_name = '[' + merged_table.model.database.upper() + '].[' + merged_table.model.schema.upper() + '].[' + merged_table.model.name.upper() + ']'
+    return full_table_name
+
+#token bucket rate limiter shared by all threads sending requests to the same host
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    #blocks until a token is available (or a Retry-After pause has elapsed)
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    #stops handing out tokens for the given number of seconds (e.g. from a 429 Retry-After header)
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+tableau_rate_limiters = {}
+tableau_rate_limiters_lock = threading.Lock()
+
+#returns the rate limiter for the host of a given url
+def get_rate_limiter(url, requests_per_second=tableau_REQUESTS_PER_SECOND):
+    host = urlparse(url).netloc
+    with tableau_rate_limiters_lock:
+        if host not in tableau_rate_limiters:
+            tableau_rate_limiters[host] = TokenBucket(requests_per_second)
+        return tableau_rate_limiters[host]
+
+#retries of the api clients: server errors and read timeouts are only retried for idempotent methods (a POST the server already applied would be
+#applied twice e.g. a duplicate data quality warning or github commit), 429 Too Many Requests is retried for every method as the request was not processed
+class IdempotentRetry(Retry):
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429 and self.status_forcelist and 429 in self.status_forcelist:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+#base api client holding a pooled keep-alive http session with connect/read timeouts and exponential backoff retries
+#every request is recorded in the run metrics under the client's service name. requests sent with query=True are read only POSTs (graphql
+#queries) which are safe to retry: they are sent through query_session, whose retries include every method
+class ApiClient:
+    service = 'api'
+
+    def __init__(self, headers=None, pool_size=HTTP_POOL_SIZE, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT), max_retries=HTTP_MAX_RETRIES, retry_statuses=(429, 500, 502, 503, 504)):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        self.mount_retry(self.session, IdempotentRetry(total=max_retries, backoff_factor=0.5, status_forcelist=retry_statuses, respect_retry_after_header=True, raise_on_status=False), pool_size)
+        self.query_session = self.make_query_session(self.make_query_retry(retry_statuses), pool_size)
+
+    #mounts an http adapter with the given retry on a session
+    def mount_retry(self, session, retry, pool_size):
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+    #returns the retry of the query session
+    def make_query_retry(self, retry_statuses):
+        return Retry(total=self.max_retries, backoff_factor=0.5, status_forcelist=retry_statuses, allowed_methods=None, respect_retry_after_header=True, raise_on_status=False)
+
+    #returns a session sharing the headers of the client session (so credentials set later apply to both) with the given retry
+    def make_query_session(self, retry, pool_size):
+        query_session = requests.Session()
+        query_session.headers = self.session.headers
+        self.mount_retry(query_session, retry, pool_size)
+        return query_session
+
+    def request(self, method, url, query=False, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        try:
+            response = (self.query_session if query else self.session).request(method, url, **kwargs)
+        except Exception:
+            metrics.record_api_call(self.service, method, get_endpoint_name(url, kwargs.get('data') or json.dumps(kwargs.get('json'))), 'error', time.perf_counter() - start)
+            raise
+        #streamed responses are timed up to the response headers and their size is taken from the Content-Length header
+        bytes_received = int(response.headers.get('Content-Length') or 0) if kwargs.get('stream') else len(response.content)
+        retries = len(response.raw.retries.history) if getattr(response.raw, 'retries', None) is not None else 0
+        body = response.request.body or b''
+        metrics.record_api_call(self.service, method, get_endpoint_name(url, body), response.status_code, time.perf_counter() - start,
+                                len(body.encode('utf-8') if isinstance(body, str) else body), bytes_received, retries)
+        return response
+
+    def close(self):
+        self.session.close()
+        self.query_session.close()
+
+#dbt Cloud API (v2/v3) and Metadata API client
+class DbtCloudClient(ApiClient):
+    service = 'dbt'
+
+    def __init__(self, dbt_cloud_api, dbt_metadata_api, dbt_token, **kwargs):
+        super().__init__(headers={'Content-Type': 'application/json', 'Accept': 'application/json', 'Authorization': 'Token ' + dbt_token}, **kwargs)
+        self.dbt_cloud_api = dbt_cloud_api
+        self.dbt_cloud_api_v3 = dbt_cloud_api.replace('/api/v2/', '/api/v3/')
+        self.dbt_metadata_api = dbt_metadata_api
+        self.token_fingerprint = hashlib.sha256(dbt_token.encode('utf-8')).hexdigest()[:12] #tells apart the accounts of tokens sharing an api url
+
+    #returns the parsed json response of every page of a paginated dbt Cloud API list endpoint, with the data of all pages combined
+    def get_all_pages(self, url, page_size=DBT_PAGE_SIZE):
+        data = []
+        while True:
+            response_json = json.loads(self.request("GET", url, params={'offset': len(data), 'limit': page_size}).text)
+            if 'errors' in response_json.keys():
+                return response_json
+            page = response_json['data']
+            data.extend(page)
+            total_count = response_json.get('extra', {}).get('pagination', {}).get('total_count', len(data))
+            if len(page) < page_size or len(data) >= total_count:
+                response_json['data'] = data
+                return response_json
+
+    #yields the pages of a dbt Cloud API v2 list endpoint one at a time (so callers can stop early), raising on errors
+    def iter_pages(self, url, page_size=DBT_PAGE_SIZE, params=None):
+        offset = 0
+        while True:
+            response_json = json.loads(self.request("GET", url, params=dict(params or {}, offset=offset, limit=page_size)).text)
+            if 'errors' in response_json.keys():
+                raise Exception(response_json['errors'][0]['message'])
+            page = response_json['data']
+            yield page
+            offset += len(page)
+            total_count = response_json.get('extra', {}).get('pagination', {}).get('total_count', offset)
+            if len(page) < page_size or offset >= total_count:
+                return
+
+#tableau REST and Metadata API client. requests are rate limited per host and paused when tableau responds with 429 Too Many Requests
+class TableauClient(ApiClient):
+    service = 'tableau'
+
+    #metadata_batching holds the graphql_executor settings of the Metadata API queries (node_limit, batch_size, max_batch_size, target_seconds)
+    def __init__(self, tableau_server, requests_per_second=tableau_REQUESTS_PER_SECOND, api_version=tableau_API_VERSION, metadata_batching=None, **kwargs):
+        #429 responses are handled by the rate limiter so that every thread backs off, not just the one that was throttled
+        super().__init__(headers={'Accept': 'application/json'}, retry_statuses=(500, 502, 503, 504), **kwargs)
+        self.tableau_server = tableau_server
+        self.api_version = api_version
+        self.rate_limiter = get_rate_limiter(tableau_server, requests_per_second)
+        self.creds = None
+        self.metadata_executor = graphql_executor(self.metadata_query, **(metadata_batching or {}))
+
+    #stores the credentials returned by sign in and authenticates every subsequent request with the session token
+    def set_creds(self, tableau_creds):
+        self.creds = tableau_creds
+        self.signed_in_at = time.monotonic()
+        self.session.headers['X-Tableau-Auth'] = tableau_creds['token']
+
+    #returns the REST API url for a path relative to the signed in site
+    def site_url(self, path):
+        return self.tableau_server + "/api/" + self.api_version + "/sites/" + self.creds['site']['id'] + "/" + path
+
+    #returns the parsed json response for a Metadata API graphql query
+    def metadata_query(self, query, variables=None):
+        response = self.request("POST", self.tableau_server + '/api/metadata/graphql', query=True, json={"query": query, "variables": variables or {}})
+        if response.status_code == 504: #reported as a timeout so the metadata executor sends the query again as a smaller batch
+            raise Exception('tableau metadata API query timed out: HTTP 504 Gateway Timeout')
+        return json.loads(response.text)
+
+    #returns the retry of the metadata query session: read timeouts and 504 Gateway Timeout are not retried, the metadata executor re-sends a query
+    #which timed out as a smaller batch instead of repeating it at the same size
+    def make_query_retry(self, retry_statuses):
+        return Retry(total=self.max_retries, read=0, backoff_factor=0.5, status_forcelist=[status for status in retry_statuses if status != 504], allowed_methods=None, raise_on_status=False)
+
+    def request(self, method, url, query=False, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            response = super().request(method, url, query, **kwargs)
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+            try:
+                retry_after = float(response.headers.get('Retry-After', 2 ** attempt))
+            except ValueError: #Retry-After may also be an http date
+                retry_after = 2 ** attempt
+            print('tableau rate limit reached, retrying in ' + str(retry_after) + ' seconds...')
+            metrics.record_retry(self.service, method, get_endpoint_name(url, response.request.body))
+            self.rate_limiter.pause(retry_after)
+        return response
+
+#GitHub REST API client
+class GitHubClient(ApiClient):
+    service = 'github'
+
+    def __init__(self, github_token, github_api=GITHUB_API, **kwargs):
+        super().__init__(headers={'Content-Type': 'application/json', 'Accept': 'application/vnd.github+json', 'Authorization': 'Bearer ' + github_token}, **kwargs)
+        self.github_api = github_api
+
+#returns dbt Cloud account id (from the catalog cache while its snapshot is within the TTL, cached per api url and token)
+def dbt_get_account_id(dbt_client, catalog_cache=None):
+    if catalog_cache is not None:
+        return catalog_cache.get_or_fetch('dbt_account', dbt_client.dbt_cloud_api + '#' + dbt_client.token_fingerprint, lambda: {'account': {'id': dbt_get_account_id(dbt_client)}})['account']['id']
+    print('getting dbt Cloud account id from dbt Cloud API: ' + dbt_client.dbt_cloud_api + '...')
+    url = dbt_client.dbt_cloud_api
+    try:
+        response = dbt_client.request("GET", url)
+        response_json = json.loads(response.text)
+        if 'errors' in response_json.keys():
+            raise Exception(response_json['errors'][0]['message'])
+
+        dbt_account_id = response_json['data'][0]['id']
+        print('dbt Cloud account Id: ' + str(dbt_account_id))
+    except Exception as e:
+        print('Error getting account id from dbt Cloud: ' + str(e))
+    return dbt_account_id
+
+#helper function returns every item of a dbt Cloud API v2 list endpoint, raising on errors
+def dbt_list_all(dbt_client, url):
+    response_json = dbt_client.get_all_pages(url)
+    if 'errors' in response_json.keys():
+        raise Exception(response_json['errors'][0]['message'])
+    return response_json['data']
+
+#returns list of dbt projects for a given dbt Cloud account (from the catalog cache while its snapshot is within the TTL)
+def dbt_get_projects(dbt_client, dbt_account_id, dbt_project_filter, database_account_filter, catalog_cache=None):
+    print('getting dbt projects for account id ' + str(dbt_account_id) + '...')
+    url = dbt_client.dbt_cloud_api + str(dbt_account_id) +"/projects"
+    try:
+        if catalog_cache is None:
+            dbt_projects = dbt_list_all(dbt_client, url)
+        else:
+            dbt_projects = list(catalog_cache.get_or_fetch('dbt_projects', url, lambda: {dbt_project['id']: dbt_project for dbt_project in dbt_list_all(dbt_client, url)}).values())
+
+        if len(dbt_project_filter) > 0:
+            filtered_dbt_projects = []
+            for dbt_project in dbt_projects:
+                if dbt_project['name'] in dbt_project_filter and dbt_project['connection']['details']['account'] in database_account_filter:
+                    filtered_dbt_projects.append(dbt_project)
+            dbt_projects=filtered_dbt_projects
+        print('retrieved: ' + str(len(dbt_projects)) + ' dbt projects')
+    except Exception as e:
+        print('Error getting projects from dbt Cloud: ' + str(e))
+    return dbt_projects
+
+#helper function returns the latest updated_at of a list of dbt jobs (the watermark of the dbt jobs snapshot), or None for an empty list
+def get_dbt_jobs_watermark(dbt_jobs):
+    return max((dbt_job.get('updated_at') or '' for dbt_job in dbt_jobs), default=None) or None
+
+#returns list of dbt jobs for a given dbt Cloud account
+#with a catalog cache, a snapshot within its TTL is refreshed with the jobs updated since its watermark (the latest job updated_at),
+#listed newest first until a page reaches a job which is not newer. deleted jobs are dropped by the next full download once the TTL has expired
+def dbt_get_jobs(dbt_client, dbt_account_id, catalog_cache=None):
+    print('getting dbt jobs for account id ' + str(dbt_account_id) + '...')
+    url = dbt_client.dbt_cloud_api + str(dbt_account_id) +"/jobs"
+    try:
+        snapshot = catalog_cache.get_snapshot('dbt_jobs', url) if catalog_cache is not None else None
+        if snapshot is None or not snapshot['is_fresh'] or snapshot['watermark'] is None:
+            dbt_jobs = dbt_list_all(dbt_client, url)
+            if catalog_cache is not None:
+                catalog_cache.put_snapshot('dbt_jobs', url, {dbt_job['id']: dbt_job for dbt_job in dbt_jobs}, get_dbt_jobs_watermark(dbt_jobs))
+            print('retrieved: ' + str(len(dbt_jobs)) + ' dbt jobs')
+        else:
+            updated_jobs = {}
+            for page in dbt_client.iter_pages(url, params={'order_by': '-updated_at'}):
+                newer_jobs = [dbt_job for dbt_job in page if (dbt_job.get('updated_at') or '') > snapshot['watermark']]
+                updated_jobs.update((dbt_job['id'], dbt_job) for dbt_job in newer_jobs)
+                if len(newer_jobs) < len(page):
+                    break
+            catalog_cache.update_snapshot('dbt_jobs', url, updated_jobs, watermark=get_dbt_jobs_watermark(updated_jobs.values()))
+            dbt_jobs = sorted(catalog_cache.get_records('dbt_jobs', url).values(), key=itemgetter('id'))
+            print('retrieved: ' + str(len(dbt_jobs)) + ' dbt jobs from the catalog cache (' + str(len(updated_jobs)) + ' updated since ' + snapshot['watermark'] + ')')
+    except Exception as e:
+        print('Error getting jobs from dbt Cloud: ' + str(e))
+    return dbt_jobs
+
+#returns filtered list of dbt jobs for a given dbt Cloud account (filtered by dbt_project_filter and database_account_filter lists)
+def filter_dbt_jobs(dbt_jobs, dbt_projects):
+    print('filtering dbt jobs matching projects...')
+    try:
+        filtered_dbt_jobs = []
+        dbt_project_ids = list(map(lambda d: d['id'],dbt_projects))
+
+        for dbt_job in dbt_jobs:
+            if dbt_job['project_id'] in dbt_project_ids:
+                filtered_dbt_jobs.append(dbt_job)
+        print('retrieved: ' + str(len(filtered_dbt_jobs)) + ' dbt jobs')
+
+    except Exception as e:
+        print('Error filtering dbt jobs matching projects' + str(e))
+    return filtered_dbt_jobs
+
+#returns list of dbt jobs for a list of dbt job ids (one request per job, for scoped runs)
+def dbt_get_jobs_by_id(dbt_client, dbt_account_id, job_ids):
+    print('getting dbt jobs ' + ', '.join(str(job_id) for job_id in job_ids) + ' for account id ' + str(dbt_account_id) + '...')
+    dbt_jobs = []
+    for job_id in job_ids:
+        url = dbt_client.dbt_cloud_api + str(dbt_account_id) + "/jobs/" + str(job_id) + "/"
+        try:
+            response = dbt_client.request("GET", url)
+            response_json = json.loads(response.text)
+            if 'errors' in response_json.keys():
+                raise Exception(response_json['errors'][0]['message'])
+            dbt_jobs.append(response_json['data'])
+        except Exception as e:
+            print('Error getting dbt job id: ' + str(job_id) + ' ' + str(e))
+    print('retrieved: ' + str(len(dbt_jobs)) + ' dbt jobs')
+    return dbt_jobs
+
+#returns list of dbt models for a given job (with the given model fields, defaults to all fields, and optionally filtered by database, schema and identifier)
+@metrics.timed
+def dbt_get_models_for_job(dbt_client, job_id, model_fields=None, model_filter=None):
+    print('getting dbt models for jobId: ' + str(job_id) + '...')
+    url = dbt_client.dbt_metadata_api
+    dbt_models=[]
+    payload = build_models_query(job_id, model_fields or get_model_fields(), model_filter)
+    try:
+        response = dbt_client.request("POST", url, query=True, data=payload, stream=True)
+        dbt_models = decode_models_response(response, DbtModel.from_node)
+        print('retreived ' + str(len(dbt_models)) + ' dbt models for jobId: ' + str(job_id))
+    except Exception as e:
+        print('Error getting dbt models for job id: ' + str(job_id) + ' ' + str(e))
+    return dbt_models
+
+#returns the id of the latest finished run for a given dbt job (or None if the job has not run)
+#queued, running and cancelled runs are skipped: while a run is in progress the dbt Metadata API still serves the models of the previous run
+def dbt_get_latest_run_id(dbt_client, dbt_account_id, job_id):
+    url = dbt_client.dbt_cloud_api + str(dbt_account_id) + "/runs/"
+    dbt_run_id = None
+    try:
+        response = dbt_client.request("GET", url, params={'job_definition_id': job_id, 'status__in': json.dumps(DBT_FINISHED_RUN_STATUSES), 'order_by': '-id', 'limit': 1})
+        response_json = json.loads(response.text)
+        if 'errors' in response_json.keys():
+            raise Exception(response_json['errors'][0]['message'])
+        if len(response_json['data']) > 0:
+            dbt_run_id = response_json['data'][0]['id']
+    except Exception as e:
+        print('Error getting latest run for dbt job id: ' + str(job_id) + ' ' + str(e))
+    return dbt_run_id
+
+#returns list of dbt models for a given job, from the local model cache if the latest run of the job has already been downloaded
+def dbt_get_models_for_job_cached(dbt_client, dbt_account_id, job_id, dbt_model_cache_dir=DBT_MODEL_CACHE_DIR, model_fields=None):
+    model_fields = model_fields or get_model_fields()
+    dbt_run_id = dbt_get_latest_run_id(dbt_client, dbt_account_id, job_id)
+    #the cache file name includes a digest of the requested fields so that changing the enabled sync features downloads the models again
+    fields_digest = hashlib.sha1(json.dumps(model_fields).encode('utf-8')).hexdigest()[:8]
+    cache_file = os.path.join(dbt_model_cache_dir, str(job_id) + '_' + str(dbt_run_id) + '_' + fields_digest + '.json')
+    if dbt_run_id is not None and os.path.exists(cache_file):
+        try:
+            with open(cache_file) as f:
+                dbt_models = [DbtModel.from_node(model_node) for model_node in json.load(f)]
+            print('loaded ' + str(len(dbt_models)) + ' cached dbt models for jobId: ' + str(job_id) + ' runId: ' + str(dbt_run_id))
+            return dbt_models
+        except Exception as e:
+            print('Error reading cached dbt models for job id: ' + str(job_id) + ' ' + str(e))
+
+    dbt_models = dbt_get_models_for_job(dbt_client, job_id, model_fields)
+    if dbt_run_id is not None and len(dbt_models) > 0:
+        try:
+            os.makedirs(dbt_model_cache_dir, exist_ok=True)
+            for file in os.listdir(dbt_model_cache_dir): #only the latest run of each job is kept
+                if file.startswith(str(job_id) + '_'):
+                    os.remove(os.path.join(dbt_model_cache_dir, file))
+            with open(cache_file + '.tmp', 'w') as f:
+                json.dump([dbt_model.to_node() for dbt_model in dbt_models], f)
+            os.replace(cache_file + '.tmp', cache_file)
+        except Exception as e:
+            print('Error caching dbt models for job id: ' + str(job_id) + ' ' + str(e))
+    return dbt_models
+
+#returns a dictionary of job id to list of dbt models for a list of dbt jobs, fetched concurrently
+@metrics.timed
+def dbt_get_models_for_jobs(dbt_client, dbt_account_id, dbt_jobs, dbt_max_workers=DBT_MAX_WORKERS, dbt_model_cache_dir=DBT_MODEL_CACHE_DIR, model_fields=None):
+    print('getting dbt models for ' + str(len(dbt_jobs)) + ' dbt jobs...')
+    dbt_models_by_job = {}
+    with ThreadPoolExecutor(max_workers=dbt_max_workers) as executor:
+        futures = {executor.submit(dbt_get_models_for_job_cached, dbt_client, dbt_account_id, dbt_job['id'], dbt_model_cache_dir, model_fields): dbt_job['id'] for dbt_job in dbt_jobs}
+        for future in as_completed(futures):
+            try:
+                dbt_models_by_job[futures[future]] = future.result()
+            except Exception as e:
+                print('Error getting dbt models for job id: ' + str(futures[future]) + ' ' + str(e))
+                dbt_models_by_job[futures[future]] = []
+    return dbt_models_by_job
+
+#returns a dictionary of job id to list of dbt models for a list of dbt jobs, with only the models building the given (database, schema, identifier) tables
+#the models are filtered by the dbt Metadata API, so they are always downloaded (the model cache holds whole jobs)
+@metrics.timed
+def dbt_get_models_for_tables(dbt_client, dbt_jobs, table_names, dbt_max_workers=DBT_MAX_WORKERS, model_fields=None):
+    print('getting dbt models for ' + str(len(table_names)) + ' tables in ' + str(len(dbt_jobs)) + ' dbt jobs...')
+    dbt_models_by_job = {dbt_job['id']: [] for dbt_job in dbt_jobs}
+    with ThreadPoolExecutor(max_workers=dbt_max_workers) as executor:
+        futures = {executor.submit(dbt_get_models_for_job, dbt_client, dbt_job['id'], model_fields, dict(zip(('database', 'schema', 'identifier'), table_name))): dbt_job['id']
+                   for dbt_job in dbt_jobs for table_name in table_names}
+        for future in as_completed(futures):
+            try:
+                dbt_models_by_job[futures[future]].extend(future.result())
+            except Exception as e:
+                print('Error getting dbt models for job id: ' + str(futures[future]) + ' ' + str(e))
+    return dbt_models_by_job
+
+#authenticates with tableau server/cloud, stores the credentials on the client and returns credentials object
+@metrics.timed
+def authenticate_tableau(tableau_client, tableau_site_name, tableau_token_name, tableau_token):
+    url = tableau_client.tableau_server + "/api/" + tableau_client.api_version + "/auth/signin"
+    print('authenticating with tableau server url: ' + url + '...')
+    payload = json.dumps({
+        "credentials": {
+            "personalAccessTokenName": tableau_token_name,
+            "personalAccessTokenSecret": tableau_token,
+            "site": {
+                "contentUrl": tableau_site_name
+            }
+        }
+    })
+    headers = {
+        'Content-Type': 'application/json'
+    }
+    tableau_creds = None
+    try:
+        response = tableau_client.request("POST", url, headers=headers, data=payload)
+        response_json = json.loads(response.text)
+        if 'error' in response_json.keys():
+            raise Exception(response_json['error'])
+
+        tableau_creds = response_json['credentials']
+        tableau_client.set_creds(tableau_creds)
+        print('tableau user id: ' + str(tableau_creds['user']['id']))
+    except Exception as e:
+        print('Error authenticating with tableau. Servername: ' + tableau_client.tableau_server + ' Site: ' + tableau_site_name + ' ' +  str(e))
+    return tableau_creds
+
+#returns a list of tableau databases (filter using database_type_filter and database_name_filter)
+def tableau_get_databases(tableau_client, database_type_filter, database_name_filter):
+    print('getting tableau databases with database type: ' + database_type_filter + '...')
+    filter = 'connectionType: "' + database_type_filter + '"'
+    if len(database_name_filter)>0:
+        filter = filter + ', nameWithin: ' + json.dumps(database_name_filter)
+
+    mdapi_query = '''query get_databases {
+          databases(filter: {''' + filter + '''}) {
+            name
+            id
+            tables {
+              name
+              schema
+              id
+              luid
+            }
+          }
+        }'''
+    tableau_databases = []
+    try:
+        tableau_databases = tableau_client.metadata_executor.query(mdapi_query)['databases']
+    except Exception as e:
+        print('Error getting databases from tableau metadata API ' + str(e))
+    print('retrieved ' + str(len(tableau_databases)) + ' tableau databases')
+    return tableau_databases
+
+#returns a make_query function for graphql_executor.query_batches: the query of a batch of table luids, named operation, selecting the luid and
+#node_fields of each table
+def make_luid_batch_query(operation, node_fields):
+    def make_query(batch):
+        return '''query ''' + operation + '''($first: Int, $after: String) {
+  databaseTablesConnection(filter: {luidWithin: ''' + json.dumps(batch) + '''}, first: $first, after: $after) {
+    nodes {
+      luid
+      ''' + node_fields + '''
+    }
+    pageInfo {
+      hasNextPage
+      endCursor
+    }
+  }
+}'''
+    return make_query
+
+#collects the downstream workbooks of a list of merged tables into downstream_workbook_index, keyed on (workbook luid, dbt project id) so workbooks are deduplicated on insert
+#tables are queried in batches of luids from the Metadata API, sized by the graphql executor of the client
+@metrics.timed
+def tableau_get_downstream_workbooks(tableau_client, merged_tables, downstream_workbook_index):
+    print('getting downstream workbooks for ' + str(len(merged_tables)) + ' tableau tables...')
+    merged_tables_by_luid = {}
+    for merged_table in merged_tables:
+        merged_tables_by_luid.setdefault(merged_table.luid, []).append(merged_table)
+    table_luids = list(merged_tables_by_luid.keys())
+    workbook_count = len(downstream_workbook_index)
+
+    make_query = make_luid_batch_query('get_downstream_workbooks', '''downstreamWorkbooks {
+        id
+        luid
+        name
+        description
+        projectName
+        vizportalUrlId
+        tags {
+          id
+          name
+        }
+        owner {
+          id
+          name
+          username
+        }
+        upstreamTables
+        {
+          id
+          luid
+          name
+        }
+      }''')
+    try:
+        for batch, table_nodes in tableau_client.metadata_executor.query_batches(table_luids, make_query, ['databaseTablesConnection']):
+            for table_node in table_nodes:
+                for merged_table in merged_tables_by_luid.get(table_node['luid'], []):
+                    for workbook in table_node['downstreamWorkbooks']:
+                        key = (workbook['luid'], merged_table.model.project_id)
+                        if key not in downstream_workbook_index:
+                            downstream_workbook = dict(workbook)
+                            downstream_workbook['dbt_projectId'] = merged_table.model.project_id
+                            downstream_workbook['dbt_environmentId'] = merged_table.model.environment_id
+                            downstream_workbook_index[key] = downstream_workbook
+    except Exception as e:
+        print('Error getting downstream workbooks from tableau metadata API ' + str(e))
+    print('retrieved ' + str(len(downstream_workbook_index) - workbook_count) + ' new downstream tableau workbooks')
+    return downstream_workbook_index
+
+#fields of the Metadata API database tables holding their current tableau description, certification and tags, which the sync compares with
+#dbt to skip writes that would change nothing. they are never kept in the catalog cache, as the sync and tableau users change them
+tableau_TABLE_STATE_FIELDS = '''tableauDescription: description
+              isCertified
+              certificationNote
+              tableauTags: tags {
+                name
+              }'''
+tableau_TABLE_STATE_KEYS = ('tableauDescription', 'isCertified', 'certificationNote', 'tableauTags')
+
+#fields of the Metadata API database tables fetched for the tableau table index
+tableau_TABLE_NODE_FIELDS = '''id
+              luid
+              name
+              schema
+              ''' + tableau_TABLE_STATE_FIELDS
+
+tableau_TABLE_FIELDS = '''nodes {
+              ''' + tableau_TABLE_NODE_FIELDS + '''
+              database {
+                name
+              }
+            }
+            pageInfo {
+              hasNextPage
+              endCursor
+            }'''
+
+#returns the Metadata API filter of the database servers matching database_type_filter and database_name_filter
+def make_database_server_filter(database_type_filter, database_name_filter):
+    filter = 'connectionType: "' + database_type_filter + '"'
+    if len(database_name_filter)>0:
+        filter = filter + ', nameWithin: ' + json.dumps(database_name_filter)
+    return filter
+
+#yields the tables of a tableau database server from the Metadata API, starting after the cursor of a previous page
+def tableau_fetch_server_tables(tableau_client, database_server_id, page_size=tableau_METADATA_PAGE_SIZE, after=None):
+    tables_query = '''query get_databaseServer_tables($first: Int, $after: String) {
+          databaseServers(filter: {id: ''' + json.dumps(database_server_id) + '''}) {
+            tablesConnection(first: $first, after: $after) {
+              ''' + tableau_TABLE_FIELDS + '''
+            }
+          }
+        }'''
+    yield from tableau_metadata_paginate(tableau_client, tables_query, ['databaseServers', 0, 'tablesConnection'], page_size, {'after': after})
+
+#yields (database server, table) pairs for the tableau database servers matching database_type_filter and database_name_filter, raising on errors
+#database servers and their tables are fetched page by page from the Metadata API so that large sites are never held in memory at once
+#each database server records its tableCount (the total number of tables when it was fetched)
+def tableau_fetch_database_tables(tableau_client, database_type_filter, database_name_filter, page_size=tableau_METADATA_PAGE_SIZE):
+    mdapi_query = '''query get_databaseServers($first: Int, $after: String) {
+          databaseServersConnection(filter: {''' + make_database_server_filter(database_type_filter, database_name_filter) + '''}, first: $first, after: $after) {
+            nodes {
+              name
+              id
+              hostName
+              tablesConnection(first: ''' + str(page_size) + ''') {
+                totalCount
+                ''' + tableau_TABLE_FIELDS + '''
+              }
+            }
+            pageInfo {
+              hasNextPage
+              endCursor
+            }
+          }
+        }'''
+    for server_node in tableau_metadata_paginate(tableau_client, mdapi_query, ['databaseServersConnection'], page_size):
+        tables_connection = server_node.pop('tablesConnection')
+        server_node['tableCount'] = tables_connection.get('totalCount')
+        for table in tables_connection['nodes']:
+            yield server_node, table
+        if tables_connection['pageInfo']['hasNextPage']: #fetch the remaining tables for this database server
+            for table in tableau_fetch_server_tables(tableau_client, server_node['id'], page_size, tables_connection['pageInfo']['endCursor']):
+                yield server_node, table
+
+#yields (database server, table) pairs for the tableau database servers matching database_type_filter and database_name_filter
+def tableau_iter_database_tables(tableau_client, database_type_filter, database_name_filter, page_size=tableau_METADATA_PAGE_SIZE):
+    print('getting database servers and tables from tableau metadata API with database type: ' + database_type_filter + '...')
+    server_ids = set()
+    table_count = 0
+    try:
+        for server_node, table in tableau_fetch_database_tables(tableau_client, database_type_filter, database_name_filter, page_size):
+            server_ids.add(server_node['id'])
+            table_count += 1
+            yield server_node, table
+    except Exception as e:
+        print('Error getting databases from tableau metadata API: ' + str(e))
+    print('retrieved ' + str(table_count) + ' tables from ' + str(len(server_ids)) + ' tableau database servers')
+
+#yields (database server, table) pairs for the tableau tables named in table_names on the database servers matching database_type_filter and database_name_filter
+#used by scoped runs: the tables are queried by name in batches (nameWithin) with their database server, instead of listing every table of every database server
+def tableau_iter_named_database_tables(tableau_client, database_type_filter, database_name_filter, table_names):
+    print('getting ' + str(len(table_names)) + ' named tables from tableau metadata API with database type: ' + database_type_filter + '...')
+    server_ids = set()
+    table_count = 0
+
+    #returns the query of a batch of table names
+    def make_query(batch):
+        return '''query get_database_tables_by_name($first: Int, $after: String) {
+          databaseTablesConnection(filter: {nameWithin: ''' + json.dumps(batch) + '''}, first: $first, after: $after) {
+            nodes {
+              ''' + tableau_TABLE_NODE_FIELDS + '''
+              database {
+                name
+                ... on DatabaseServer {
+                  id
+                  hostName
+                  connectionType
+                }
+              }
+            }
+            pageInfo {
+              hasNextPage
+              endCursor
+            }
+          }
+        }'''
+    try:
+        for batch, tables in tableau_client.metadata_executor.query_batches(table_names, make_query, ['databaseTablesConnection']):
+            for table in tables:
+                database_server = table.get('database') or {}
+                if database_server.get('connectionType') != database_type_filter or (len(database_name_filter) > 0 and database_server.get('name') not in database_name_filter):
+                    continue
+                server_ids.add(database_server['id'])
+                table_count += 1
+                yield database_server, table
+    except Exception as e:
+        print('Error getting named tables from tableau metadata API: ' + str(e))
+    print('retrieved ' + str(table_count) + ' tables from ' + str(len(server_ids)) + ' tableau database servers')
+
+#returns a dictionary of database server id to database server (with its tableCount) for the tableau database servers matching the filters
+def tableau_get_database_server_table_counts(tableau_client, database_type_filter, database_name_filter, page_size=tableau_METADATA_PAGE_SIZE):
+    mdapi_query = '''query get_databaseServer_table_counts($first: Int, $after: String) {
+          databaseServersConnection(filter: {''' + make_database_server_filter(database_type_filter, database_name_filter) + '''}, first: $first, after: $after) {
+            nodes {
+              name
+              id
+              hostName
+              tablesConnection {
+                totalCount
+              }
+            }
+            pageInfo {
+              hasNextPage
+              endCursor
+            }
+          }
+        }'''
+    database_servers = {}
+    for server_node in tableau_metadata_paginate(tableau_client, mdapi_query, ['databaseServersConnection'], page_size):
+        server_node['tableCount'] = server_node.pop('tablesConnection')['totalCount']
+        database_servers[server_node['id']] = server_node
+    return database_servers
+
+#returns a table node without its state fields (the table inventory kept in the catalog cache)
+def get_table_inventory(table):
+    return {key: value for key, value in table.items() if key not in tableau_TABLE_STATE_KEYS}
+
+#yields (database server, table) pairs like tableau_iter_database_tables, from a snapshot in the catalog cache
+#the Metadata API has no updatedAt filter on database tables, so a snapshot within its TTL is refreshed by comparing the table count of every
+#database server with the snapshot and downloading only the tables of new servers and servers whose count changed. renamed tables on an
+#unchanged server are picked up by the next full download once the TTL has expired
+#the snapshot only holds the table inventory: tables yielded from it have no state fields, which are fetched for the tables to sync (tableau_get_table_states)
+def tableau_iter_cached_database_tables(tableau_client, database_type_filter, database_name_filter, catalog_cache, page_size=tableau_METADATA_PAGE_SIZE):
+    scope = tableau_client.tableau_server + '/' + tableau_client.creds['site']['id'] + '/' + database_type_filter + '/' + json.dumps(sorted(database_name_filter))
+    snapshot = catalog_cache.get_snapshot('tableau_tables', scope)
+    if snapshot is None or not snapshot['is_fresh']:
+        database_servers = {}
+        table_records = {}
+        try:
+            print('getting database servers and tables from tableau metadata API with database type: ' + database_type_filter + '...')
+            for server_node, table in tableau_fetch_database_tables(tableau_client, database_type_filter, database_name_filter, page_size):
+                database_servers[server_node['id']] = server_node
+                table_records[table['luid']] = {'databaseServerId': server_node['id'], 'table': get_table_inventory(table)}
+                yield server_node, table
+            catalog_cache.put_snapshot('tableau_database_servers', scope, database_servers)
+            catalog_cache.put_snapshot('tableau_tables', scope, table_records)
+            print('retrieved ' + str(len(table_records)) + ' tables from ' + str(len(database_servers)) + ' tableau database servers (saved to the catalog cache)')
+        except Exception as e:
+            print('Error getting databases from tableau metadata API: ' + str(e))
+        return
+
+    print('refreshing cached tableau database tables with database type: ' + database_type_filter + '...')
+    database_servers = catalog_cache.get_records('tableau_database_servers', scope)
+    table_records = catalog_cache.get_records('tableau_tables', scope)
+    try:
+        current_database_servers = tableau_get_database_server_table_counts(tableau_client, database_type_filter, database_name_filter, page_size)
+        changed_server_ids = {server_id for server_id, server_node in current_database_servers.items()
+                              if server_id not in database_servers or database_servers[server_id]['tableCount'] != server_node['tableCount']}
+        stale_server_ids = changed_server_ids | (database_servers.keys() - current_database_servers.keys())
+        removed_table_luids = [luid for luid, table_record in table_records.items() if table_record['databaseServerId'] in stale_server_ids]
+        changed_table_records = {}
+        for server_id in changed_server_ids:
+            for table in tableau_fetch_server_tables(tableau_client, server_id, page_size):
+                changed_table_records[table['luid']] = {'databaseServerId': server_id, 'table': get_table_inventory(table)}
+        for luid in removed_table_luids:
+            del table_records[luid]
+        table_records.update(changed_table_records)
+        catalog_cache.put_snapshot('tableau_database_servers', scope, current_database_servers)
+        catalog_cache.update_snapshot('tableau_tables', scope, changed_table_records, [luid for luid in removed_table_luids if luid not in changed_table_records])
+        database_servers = current_database_servers
+        print('refreshed ' + str(len(changed_server_ids)) + ' changed tableau database servers (' + str(len(changed_table_records)) + ' tables)')
+    except Exception as e:
+        print('Error refreshing databases from tableau metadata API, using the cached tables: ' + str(e))
+    for table_record in table_records.values():
+        server_node = database_servers.get(table_record['databaseServerId'])
+        if server_node is not None:
+            yield server_node, get_table_inventory(table_record['table'])
+    print('retrieved ' + str(len(table_records)) + ' tables from ' + str(len(database_servers)) + ' tableau database servers (catalog cache)')
+
+#helper function yields the nodes of a paginated Metadata API connection (found at connection_path in the response data), following endCursor until the last page
+#the query must declare $first: Int and $after: String variables for the paginated connection (pass variables={'after': cursor} to resume from a cursor)
+#pages hold up to page_size nodes, fewer when the graphql executor of the client sizes them down to stay under the node limit
+def tableau_metadata_paginate(tableau_client, mdapi_query, connection_path, page_size=tableau_METADATA_PAGE_SIZE, variables=None):
+    yield from tableau_client.metadata_executor.paginate(mdapi_query, connection_path, page_size, variables)
+
+#returns a dictionary of table luid to tableau columns for a list of tables, fetched in batches of table luids (sized by the graphql executor of the client) from the Metadata API
+#columns are cached in tableau_column_index so that each table's columns are only fetched once per run
+@metrics.timed
+def tableau_get_columns_for_tables(tableau_client, table_luids, tableau_column_index):
+    table_luids = [luid for luid in dict.fromkeys(table_luids) if luid not in tableau_column_index]
+    if len(table_luids) == 0:
+        return tableau_column_index
+    print('getting columns for ' + str(len(table_luids)) + ' tableau tables from tableau metadata API...')
+    column_fields = '''nodes {
+          luid
+          name
+          description
+          tags {
+            name
+          }
+        }
+        pageInfo {
+          hasNextPage
+          endCursor
+        }'''
+
+    make_query = make_luid_batch_query('get_table_columns', '''columnsConnection(first: ''' + str(tableau_METADATA_PAGE_SIZE) + ''') {
+        ''' + column_fields + '''
+      }''')
+    try:
+        retrieved_count = 0
+        for batch, table_nodes in tableau_client.metadata_executor.query_batches(table_luids, make_query, ['databaseTablesConnection']):
+            for table_node in table_nodes:
+                columns_connection = table_node['columnsConnection']
+                tableau_columns = [ColumnRef.from_tableau_node(column_node) for column_node in columns_connection['nodes']]
+                if columns_connection['pageInfo']['hasNextPage']: #wide table, fetch the rest of this table's columns page by page
+                    mdapi_query = '''query get_more_table_columns($first: Int, $after: String) {
+  databaseTables(filter: {luid: ''' + json.dumps(table_node['luid']) + '''}) {
+    columnsConnection(first: $first, after: $after) {
+      ''' + column_fields + '''
+    }
+  }
+}'''
+                    more_column_nodes = tableau_metadata_paginate(tableau_client, mdapi_query, ['databaseTables', 0, 'columnsConnection'], variables={'after': columns_connection['pageInfo']['endCursor']})
+                    tableau_columns.extend(ColumnRef.from_tableau_node(column_node) for column_node in more_column_nodes)
+                tableau_column_index[table_node['luid']] = tableau_columns
+            retrieved_count += len(batch)
+            print('retrieved columns for ' + str(retrieved_count) + ' of ' + str(len(table_luids)) + ' tableau tables')
+    except Exception as e:
+        print('Error getting columns from tableau metadata API ' + str(e))
+    return tableau_column_index
+
+#fetches the current tableau description, certification and tags of a list of tableau tables whose state is not known (tables from the catalog
+#cache, or tables planned again by the daemon), in batches of table luids (sized by the graphql executor of the client) from the Metadata API
+@metrics.timed
+def tableau_get_table_states(tableau_client, tableau_tables):
+    tables_by_luid = {table.luid: table for table in tableau_tables if table.description is None}
+    if len(tables_by_luid) == 0:
+        return
+    print('getting descriptions, certifications and tags for ' + str(len(tables_by_luid)) + ' tableau tables from tableau metadata API...')
+
+    try:
+        for batch, table_nodes in tableau_client.metadata_executor.query_batches(list(tables_by_luid), make_luid_batch_query('get_table_states', tableau_TABLE_STATE_FIELDS), ['databaseTablesConnection']):
+            for table_node in table_nodes:
+                tables_by_luid[table_node['luid']].set_state(table_node)
+    except Exception as e:
+        print('Error getting table descriptions from tableau metadata API ' + str(e))
+
+#returns a list of tableau columns for a given table (from the column index, fetching the table's columns if they have not been fetched yet)
+def get_tableau_columns(tableau_client, merged_table, tableau_column_index):
+    if merged_table.luid not in tableau_column_index:
+        tableau_get_columns_for_tables(tableau_client, [merged_table.luid], tableau_column_index)
+    return tableau_column_index.get(merged_table.luid, [])
+
+#returns a dictionary of table luid to the data quality warnings on the table for a list of tables, fetched in batches of table luids (sized by the graphql executor
+#of the client) from the Metadata API. warnings are cached in tableau_dq_warning_index so that each table's warnings are only fetched once per run
+def tableau_get_quality_warnings_for_tables(tableau_client, table_luids, tableau_dq_warning_index):
+    table_luids = [luid for luid in dict.fromkeys(table_luids) if luid not in tableau_dq_warning_index]
+    if len(table_luids) == 0:
+        return tableau_dq_warning_index
+    print('getting data quality warnings for ' + str(len(table_luids)) + ' tableau tables from tableau metadata API...')
+
+    make_query = make_luid_batch_query('get_table_quality_warnings', '''dataQualityWarnings {
+        luid
+        warningType
+        message
+        isActive
+        isSevere
+      }''')
+    try:
+        for batch, table_nodes in tableau_client.metadata_executor.query_batches(table_luids, make_query, ['databaseTablesConnection']):
+            for table_node in table_nodes:
+                tableau_dq_warning_index[table_node['luid']] = table_node['dataQualityWarnings'] or []
+    except Exception as e:
+        print('Error getting data quality warnings from tableau metadata API ' + str(e))
+    return tableau_dq_warning_index
+
+#returns the list of data quality warnings on a given table (from the warning index, fetching the table's warnings if they have not been fetched yet)
+#returns None if the table's warnings could not be fetched
+def get_tableau_quality_warnings(tableau_client, merged_table, tableau_dq_warning_index):
+    if merged_table.luid not in tableau_dq_warning_index:
+        tableau_get_quality_warnings_for_tables(tableau_client, [merged_table.luid], tableau_dq_warning_index)
+    return tableau_dq_warning_index.get(merged_table.luid)
+
+#returns the column description and tag writes needed to bring the tableau columns of a merged table in line with dbt, and the number of writes avoided
+#column descriptions are (tableau column, dbt column description) pairs. dbt columns without a matching tableau column (and vice versa) are skipped
+def reconcile_tableau_columns(merged_table, tableau_columns):
+    dbt_columns = {column.key: column for column in merged_table.model.columns or ()}
+    tag = merged_table.model.package_name
+    column_descriptions = []
+    column_tags = []
+    writes_avoided = 0
+    for tableau_column in tableau_columns:
+        dbt_column = dbt_columns.get(tableau_column.key)
+        if dbt_column is None:
+            continue
+        description = dbt_column.description
+        if description is not None:
+            if description.strip() != (tableau_column.description or '').strip():
+                column_descriptions.append((tableau_column, description))
+            else:
+                writes_avoided += 1
+        if tag not in tableau_column.tags:
+            column_tags.append(tableau_column)
+        else:
+            writes_avoided += 1
+    return column_descriptions, column_tags, writes_avoided
+
+#returns a planned tableau REST API write for a table (the path is relative to the signed in site)
+#the operation names the write in the change plan and the run metrics
+def make_tableau_operation(operation, merged_table, method, path, payload=None):
+    return {'operation': operation, 'table': get_full_table_name(merged_table), 'method': method, 'path': path, 'payload': payload}
+
+#executes a planned tableau REST API write and returns the response text (or None if the write failed)
+def execute_tableau_operation(tableau_client, tableau_operation):
+    url = tableau_client.site_url(tableau_operation['path'])
+    headers = {
+        'Content-Type': 'text/plain'
+    }
+    start = time.perf_counter()
+    response_text = None
+    try:
+        response = tableau_client.request(tableau_operation['method'], url, headers=headers, data=tableau_operation['payload'])
+        if response.status_code >= 400:
+            raise Exception('status ' + str(response.status_code) + ' ' + response.text)
+        response_text = response.text
+    except Exception as e:
+        print('Error executing ' + tableau_operation['operation'] + ' for tableau table ' + tableau_operation['table'] + ' ' + str(e))
+    metrics.record_stage(tableau_operation['operation'], time.perf_counter() - start, response_text is None)
+    return response_text
+
+#returns the journal write of a planned tableau REST API write of a table
+def get_operation_write(luid, tableau_operation):
+    return make_journal_write(luid, tableau_operation['operation'], [tableau_operation['method'], tableau_operation['path'], tableau_operation['payload']])
+
+#returns the journal write of a planned tag change of a table
+def get_tag_change_write(luid, tag_change):
+    return make_journal_write(luid, 'tableau_tags_' + tag_change['action'], tag_change)
+
+#executes the planned tableau REST API writes of a table in order, recording each write in the journal when one is given,
+#and returns the writes which failed
+def execute_table_operations(tableau_client, luid, tableau_operations, journal=None):
+    failed_operations = []
+    for tableau_operation in tableau_operations:
+        succeeded = execute_tableau_operation(tableau_client, tableau_operation) is not None
+        if not succeeded:
+            failed_operations.append(tableau_operation)
+        if journal is not None:
+            journal.record(get_operation_write(luid, tableau_operation), succeeded)
+    return failed_operations
+
+#returns the planned tableau column description writes for a given table and list of (tableau column, dbt column description) pairs
+def plan_tableau_column_descriptions(merged_table, column_descriptions):
+    tableau_operations = []
+    for column, description in column_descriptions:
+        payload = "<tsRequest>\n  <column description=\"" + xmlesc(description) + "\">\n  </column>\n</tsRequest>"
+        tableau_operations.append(make_tableau_operation('publish_tableau_column_descriptions', merged_table, 'PUT', "tables/" + merged_table.luid + "/columns/" + column.id, payload))
+    return tableau_operations
+
+#returns a planned tag change (action 'add' or 'delete') of a tableau table or column. the tag changes of every table are applied
+#together through the batch tag endpoints
+def make_tag_change(action, label, content_type, content_id):
+    return {'action': action, 'label': label, 'contentType': content_type, 'id': content_id}
+
+#returns the planned tag changes of a table and its columns: the dbt package name tag is added where it is missing (column_tags are the
+#columns without it) and the tag of the package the table was last synced from is removed when the package changed
+def plan_tableau_tags(merged_table, tableau_columns, column_tags, previous_package_name=None):
+    tag = merged_table.model.package_name
+    tag_changes = []
+    if tag not in merged_table.table.tags:
+        tag_changes.append(make_tag_change('add', tag, 'table', merged_table.luid))
+    tag_changes.extend(make_tag_change('add', tag, 'column', tableau_column.id) for tableau_column in column_tags)
+    if previous_package_name and previous_package_name != tag:
+        if previous_package_name in merged_table.table.tags:
+            tag_changes.append(make_tag_change('delete', previous_package_name, 'table', merged_table.luid))
+        tag_changes.extend(make_tag_change('delete', previous_package_name, 'column', tableau_column.id) for tableau_column in tableau_columns if previous_package_name in tableau_column.tags)
+    return tag_changes
+
+#returns the batch tag request body adding (or removing) a tag to a list of content items
+def make_tag_batch_payload(label, content_items):
+    ts_request = ElementTree.Element('tsRequest')
+    tag_batch = ElementTree.SubElement(ts_request, 'tagBatch')
+    content_list = ElementTree.SubElement(tag_batch, 'contentList')
+    for content_item in content_items:
+        ElementTree.SubElement(content_list, 'content', {'id': content_item['id'], 'contentType': content_item['contentType']})
+    tags = ElementTree.SubElement(tag_batch, 'tags')
+    ElementTree.SubElement(tags, 'tag', {'label': label})
+    return ElementTree.tostring(ts_request, encoding='unicode')
+
+#returns the tag batches for the tag changes of a list of table plans: one batch per action and tag of at most batch_size content items,
+#each with the (table luid, tag change) pairs it applies
+def make_tag_batches(table_plans, batch_size=tableau_TAG_BATCH_SIZE):
+    content_items_by_tag = {}
+    for table_plan in table_plans:
+        for tag_change in table_plan.get('tags', []):
+            content_items = content_items_by_tag.setdefault((tag_change['action'], tag_change['label']), {})
+            content_items.setdefault((tag_change['contentType'], tag_change['id']), []).append((table_plan['luid'], tag_change))
+    tag_batches = []
+    for (action, label), content_items in sorted(content_items_by_tag.items()):
+        content_keys = sorted(content_items)
+        for i in range(0, len(content_keys), batch_size):
+            chunk = content_keys[i:i + batch_size]
+            tag_batches.append({'action': action, 'label': label,
+                                'items': [{'contentType': content_type, 'id': content_id} for content_type, content_id in chunk],
+                                'tag_changes': [luid_tag_change for content_key in chunk for luid_tag_change in content_items[content_key]]})
+    return tag_batches
+
+#executes a tag batch with the tags:batchCreate or tags:batchDelete endpoint and returns true if it succeeded
+#a failed batch is sent again up to retries times (client errors other than timeouts, conflicts and throttling are not retried)
+def execute_tableau_tag_batch(tableau_client, tag_batch, retries=tableau_TAG_BATCH_RETRIES):
+    operation = 'batch_create_tableau_tags' if tag_batch['action'] == 'add' else 'batch_delete_tableau_tags'
+    url = tableau_client.site_url('tags:batchCreate' if tag_batch['action'] == 'add' else 'tags:batchDelete')
+    payload = make_tag_batch_payload(tag_batch['label'], tag_batch['items'])
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        retryable = True
+        try:
+            response = tableau_client.request('PUT', url, headers={'Content-Type': 'text/plain'}, data=payload)
+            if response.status_code < 400:
+                metrics.record_stage(operation, time.perf_counter() - start)
+                return True
+            retryable = response.status_code >= 500 or response.status_code in (408, 409, 429)
+            raise Exception('status ' + str(response.status_code) + ' ' + response.text)
+        except Exception as e:
+            metrics.record_stage(operation, time.perf_counter() - start, True)
+            print('Error executing ' + operation + ' for tag ' + tag_batch['label'] + ' on ' + str(len(tag_batch['items'])) + ' items (attempt ' + str(attempt + 1) + ' of ' + str(retries + 1) + ') ' + str(e))
+        if not retryable or attempt == retries:
+            return False
+        time.sleep(min(2 ** attempt, 30))
+    return False
+
+#executes tag batches concurrently and returns the failed tag batches. the result of every tag change is recorded in the journal when one is given
+def execute_tableau_tag_batches(tableau_client, tag_batches, max_workers=1, journal=None):
+    failed_tag_batches = []
+    if len(tag_batches) == 0:
+        return failed_tag_batches
+    print('applying ' + str(sum(len(tag_batch['items']) for tag_batch in tag_batches)) + ' tableau tag changes in ' + str(len(tag_batches)) + ' batches...')
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(execute_tableau_tag_batch, tableau_client, tag_batch): tag_batch for tag_batch in tag_batches}
+        for future in as_completed(futures):
+            tag_batch = futures[future]
+            succeeded = future.result()
+            if not succeeded:
+                failed_tag_batches.append(tag_batch)
+            if journal is not None:
+                for luid, tag_change in tag_batch['tag_changes']:
+                    journal.record(get_tag_change_write(luid, tag_change), succeeded)
+    return failed_tag_batches
+
+#returns an index of tableau tables keyed on normalized (hostname, database, schema, table name) built from an iterable of (database server, table node) pairs
+@metrics.timed
+def build_tableau_table_index(tableau_database_tables):
+    print('building tableau table index...')
+    tableau_table_index = {'hosts': set(), 'tables': {}}
+    for tableau_databaseServer, table_node in tableau_database_tables:
+        table = TableauTable.from_node(table_node, tableau_databaseServer)
+        tableau_table_index['hosts'].add(table.key[0])
+        tableau_table_index['tables'][table.key] = table
+    print('indexed ' + str(len(tableau_table_index['tables'])) + ' tableau tables across ' + str(len(tableau_table_index['hosts'])) + ' database hosts')
+    return tableau_table_index
+
+#returns a dictionary of dbt project id to database account (from the dbt project connection details)
+def get_dbt_project_accounts(dbt_projects):
+    dbt_project_accounts = {}
+    for dbt_project in dbt_projects:
+        try:
+            dbt_project_accounts[dbt_project['id']] = dbt_project['connection']['details']['account']
+        except (KeyError, TypeError):
+            print('dbt project ' + str(dbt_project.get('name')) + ' has no database account in its connection details')
+    return dbt_project_accounts
+
+#returns a list of merged (i.e. matched host/database/schema/table name) tableau database tables and dbt models, and a list of unmatched dbt models
+@metrics.timed
+def merge_dbt_tableau_tables(tableau_table_index, dbt_models, dbt_project_accounts):
+    print('merging ' + str(len(dbt_models)) + ' dbt models with tableau tables...')
+    merged_tables = []
+    unmatched_models = []
+    hosts_by_account = {}
+    for model in dbt_models:
+        model_database_account = normalize_name(dbt_project_accounts.get(model.project_id))
+        if model_database_account not in hosts_by_account: #tableau hostnames are prefixed with the database account name
+            hosts_by_account[model_database_account] = [host for host in tableau_table_index['hosts'] if model_database_account and host.startswith(model_database_account)]
+        matched = False
+        for host_name in hosts_by_account[model_database_account]:
+            table = tableau_table_index['tables'].get((host_name,) + model.key)
+            if table is not None:
+                merged_tables.append(MergedTable(table, model))
+                matched = True
+        if not matched:
+            unmatched_models.append(model)
+    merged_tables = sorted(merged_tables, key=lambda merged_table: merged_table.model.name)
+    print('merged ' + str(len(merged_tables)) + ' dbt models and tableau tables, ' + str(len(unmatched_models)) + ' dbt models unmatched')
+    return merged_tables, unmatched_models
+
+#returns the database.schema.name of a dbt model or tableau table
+def get_full_name(record):
+    return str(record.database) + '.' + str(record.schema) + '.' + str(record.name)
+
+#returns a list of indexed tableau tables which were not matched to any dbt model
+def get_unmatched_tableau_tables(tableau_table_index, matched_table_luids):
+    return [table for table in tableau_table_index['tables'].values() if table.luid not in matched_table_luids]
+
+
+#returns the data quality warning message for a given table (None if dbt model status was a success and no warning is wanted)
+def make_quality_warning_message(merged_table):
+    dbt_model_status = merged_table.model.status
+    if dbt_model_status == 'success':
+        return None
+    dbt_cloud_base_url = 'https://cloud.getdbt.com/next/deploy/' + str(merged_table.model.account_id) + '/projects/' + str(merged_table.model.project_id)
+    return DQ_WARNING_MESSAGE_PREFIX + '*' + str(dbt_model_status) + "*\n" \
+           + '"dbt job":' + dbt_cloud_base_url + "/jobs/" + str(merged_table.model.job_id) \
+           + ' | "dbt run":' + dbt_cloud_base_url + "/runs/" + str(merged_table.model.run_id)
+
+#returns the tsRequest xml for a tableau data quality warning (serialized with ElementTree, which escapes the message)
+def make_quality_warning_payload(message, isSevere):
+    ts_request = ElementTree.Element('tsRequest')
+    ElementTree.SubElement(ts_request, 'dataQualityWarning', {'type': 'WARNING', 'isActive': 'true', 'message': message, 'isSevere': str(isSevere).lower()})
+    return ElementTree.tostring(ts_request, encoding='unicode')
+
+#returns the planned data quality warning writes which reconcile the existing warnings on a table with its dbt model status:
+#a warning is created if dbt model status was not a success and the table has none, updated only if its message or severity changed,
+#and deleted once the dbt model succeeds. only warnings created by this integration (type WARNING with a dbt model status message) are managed
+def plan_tableau_table_quality_warnings(merged_table, tableau_dq_warnings, isSevere):
+    message = make_quality_warning_message(merged_table)
+    dbt_dq_warnings = [dq_warning for dq_warning in tableau_dq_warnings
+                       if dq_warning.get('warningType') == 'WARNING' and (dq_warning.get('message') or '').startswith(DQ_WARNING_MESSAGE_PREFIX)]
+    tableau_operations = []
+    if message is not None:
+        if len(dbt_dq_warnings) == 0: #create new dq warning
+            tableau_operations.append(make_tableau_operation('set_tableau_table_quality_warning', merged_table, 'POST', "dataQualityWarnings/table/" + merged_table.luid, make_quality_warning_payload(message, isSevere)))
+        else:
+            dq_warning = dbt_dq_warnings.pop(0)
+            if (dq_warning.get('message') or '').replace('\r\n', '\n') != message or bool(dq_warning.get('isSevere')) != bool(isSevere) or not dq_warning.get('isActive'): #update existing dq warning
+                tableau_operations.append(make_tableau_operation('set_tableau_table_quality_warning', merged_table, 'PUT', "dataQualityWarnings/" + dq_warning['luid'], make_quality_warning_payload(message, isSevere)))
+    for dq_warning in dbt_dq_warnings: #delete existing dq warnings once the dbt model succeeds (and any duplicates)
+        tableau_operations.append(make_tableau_operation('set_tableau_table_quality_warning', merged_table, 'DELETE', "dataQualityWarnings/" + dq_warning['luid']))
+    return tableau_operations
+
+#returns the tableau certification (isCertified, certification note) of a table based on dbt meta config for the dbt model
+def get_table_certification(merged_table, dbt_meta_certification_flag, certification_note):
+    if dbt_meta_certification_flag=='':
+        return True, certification_note
+    if dbt_meta_certification_flag in (merged_table.model.meta or {}):
+        return bool(merged_table.model.meta[dbt_meta_certification_flag]), certification_note
+        #+ '\nmodel: *' + merged_table.model.unique_id + '*' )
+    return False, ""
+
+#helper function returns a table description without the last updated timestamp line (used to compare descriptions)
+def strip_description_timestamp(description):
+    lines = (description or '').replace('\r\n', '\n').split('\n')
+    return '\n'.join(line for line in lines if not line.startswith(TABLE_DESCRIPTION_TIMESTAMP_PREFIX)).strip()
+
+#returns the tsRequest xml for a tableau table update with the given table attributes (serialized with ElementTree, which escapes every value)
+def make_table_update_payload(table_attributes):
+    ts_request = ElementTree.Element('tsRequest')
+    ElementTree.SubElement(ts_request, 'table', {key: str(value).lower() if isinstance(value, bool) else value for key, value in table_attributes.items()})
+    return ElementTree.tostring(ts_request, encoding='unicode')
+
+#returns the planned tableau table update for a given table: the description, isCertified and certificationNote are sent in one request
+#attributes which already match the current tableau table (ignoring the description timestamp line) are left out, and no update is planned if nothing changed
+def plan_tableau_table_update(merged_table, description_text, dbt_meta_certification_flag, certification_note):
+    isCertified, certification_note = get_table_certification(merged_table, dbt_meta_certification_flag, certification_note)
+    known_state = merged_table.table.description is not None #the current table state is fetched with the tableau tables
+    table_attributes = {}
+    if not known_state or strip_description_timestamp(description_text) != strip_description_timestamp(merged_table.table.description):
+        table_attributes['description'] = description_text
+    if not known_state or isCertified != merged_table.table.is_certified or (isCertified and certification_note != (merged_table.table.certification_note or '')):
+        table_attributes['isCertified'] = isCertified
+        table_attributes['certificationNote'] = certification_note
+    if len(table_attributes) == 0:
+        return None
+    return make_tableau_operation('update_tableau_table', merged_table, 'PUT', "tables/" + merged_table.luid, make_table_update_payload(table_attributes))
+
+#helper function makes tableau table description as plain text (the last updated timestamp line can be left out e.g. when hashing the description)
+def make_table_description(dbt_model, include_timestamp=True):
+    dbt_cloud_base_url = 'https://cloud.getdbt.com/accounts/'+ str(dbt_model.account_id) +'/jobs/' + str(dbt_model.job_id) + '/docs/#!/model/' + dbt_model.unique_id
+    has_stats=False
+    for stat_id, value in dbt_model.stats:
+        if stat_id == "has_stats":
+            has_stats=value
+        if stat_id == "row_count":
+            row_count=value
+        if stat_id == "last_modified":
+            last_modified = value
+    line1 = dbt_model.description or ''
+    line3 = TABLE_DESCRIPTION_TIMESTAMP_PREFIX + '*' + str(datetime.utcnow().strftime("%Y-%m-%d %H:%MUTC")) + '*'
+    line4 = '"dbt lineage":' + dbt_cloud_base_url + "?g_v=1" + ' | "dbt docs":' + dbt_cloud_base_url + '#details'
+    lines = [line1]
+    if has_stats:
+        line2 = "dbt approx row count: *" + str(row_count) + "* |  dbt model last modified date: *" + str(last_modified) + "*"
+        lines.append(line2)
+    if include_timestamp:
+        lines.append(line3)
+    lines.append(line4)
+    table_description = "\n".join(lines)
+    return table_description
+
+#returns a hash of the dbt metadata published to a tableau table, used to skip tables which have not changed since the last sync
+def get_table_content_hash(merged_table, dbt_meta_certification_flag):
+    content = {
+        'description': make_table_description(merged_table.model, include_timestamp=False),
+        'columns': sorted([column.name, column.description] for column in merged_table.model.columns or ()),
+        'certified': (merged_table.model.meta or {}).get(dbt_meta_certification_flag) if dbt_meta_certification_flag else True,
+        'status': merged_table.model.status,
+        'packageName': merged_table.model.package_name
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+#returns the sync state (tableau table luid -> content hash, dbt runId and executeCompletedAt) recorded by the last sync
+def load_sync_state(sync_state_file):
+    if not os.path.exists(sync_state_file):
+        return {}
+    try:
+        with open(sync_state_file) as f:
+            sync_state = json.load(f)
+        print('loaded sync state for ' + str(len(sync_state)) + ' tableau tables from ' + sync_state_file)
+    except Exception as e:
+        print('Error reading sync state file ' + sync_state_file + ', all tables will be synced ' + str(e))
+        sync_state = {}
+    return sync_state
+
+#writes the sync state to disk (via a temporary file so that an interrupted write never corrupts the previous state)
+def save_sync_state(sync_state_file, sync_state):
+    try:
+        with open(sync_state_file + '.tmp', 'w') as f:
+            json.dump(sync_state, f)
+        os.replace(sync_state_file + '.tmp', sync_state_file)
+    except Exception as e:
+        print('Error writing sync state file ' + sync_state_file + ' ' + str(e))
+    return
+
+#returns true if the merged table content or the dbt run that produced it changed since the last sync
+def table_has_changed(sync_state, merged_table, content_hash):
+    previous_state = sync_state.get(merged_table.luid)
+    if previous_state is None:
+        return True
+    return previous_state['hash'] != content_hash or previous_state['runId'] != merged_table.model.run_id or previous_state['executeCompletedAt'] != merged_table.model.execute_completed_at
+
+#returns the sync state recorded for a merged table once it has been published
+def make_table_sync_state(merged_table, content_hash):
+    return {'hash': content_hash, 'runId': merged_table.model.run_id, 'executeCompletedAt': merged_table.model.execute_completed_at, 'packageName': merged_table.model.package_name}
+
+#returns the tableau url of a workbook
+def get_workbook_url(tableau_server, tableau_site, workbook):
+    return tableau_server + '/#/site/' + tableau_site + '/workbooks/'+ workbook['vizportalUrlId']
+
+#returns a dictionary of dbt project id to the downstream workbooks of that project
+def group_workbooks_by_project(downstream_workbooks):
+    workbooks_by_project = {}
+    for workbook in downstream_workbooks:
+        workbooks_by_project.setdefault(workbook['dbt_projectId'], []).append(workbook)
+    return workbooks_by_project
+
+#returns the exposure name of each downstream workbook of a dbt project (a list in workbook order). workbooks sharing a name (e.g. the same workbook
+#on several tableau sites of a multi site run) are suffixed with their tableau site, then with their workbook url id, as dbt rejects duplicate exposure names
+def get_exposure_names(workbooks):
+    exposure_names = [workbook['name'] for workbook in workbooks]
+    for suffix in (lambda workbook: workbook.get('tableau_site') or 'default', lambda workbook: workbook['vizportalUrlId']):
+        name_counts = {}
+        for exposure_name in exposure_names:
+            name_counts[exposure_name] = name_counts.get(exposure_name, 0) + 1
+        exposure_names = [exposure_name + ' (' + suffix(workbook) + ')' if name_counts[exposure_name] > 1 else exposure_name for workbook, exposure_name in zip(workbooks, exposure_names)]
+    return exposure_names
+
+#returns the dbt exposure of a downstream workbook (keys in dbt's usual order, depends_on sorted so that rebuilds give identical files)
+def make_dbt_exposure(workbook, exposure_name, tableau_server, tableau_site, dbt_exposure_maturity):
+    return {
+        'name': exposure_name,
+        'type': 'dashboard',
+        'maturity': dbt_exposure_maturity,
+        'url': workbook['url'] if 'url' in workbook else get_workbook_url(tableau_server, tableau_site, workbook),
+        'description': workbook['description'],
+        'depends_on': sorted({"ref('" + upstreamTable['name'].lower() + "')" for upstreamTable in workbook['upstreamTables']}),
+        'owner': {'name': workbook['owner']['name'], 'email': workbook['owner']['username']}
+    }
+
+#yields the dbt exposures yaml of a dbt project in chunks: the header, then each exposure (sorted by name and url) dumped on its own with the
+#libyaml emitter, so the whole exposures document is never built as one nested dictionary
+def iter_dbt_exposures_yaml(workbooks, tableau_server, tableau_site, dbt_exposure_maturity):
+    yield 'version: 2\nexposures:\n'
+    workbooks = sorted(workbooks, key=lambda workbook: (workbook['name'], workbook.get('url') or workbook['vizportalUrlId']))
+    for workbook, exposure_name in zip(workbooks, get_exposure_names(workbooks)):
+        yield yaml.dump([make_dbt_exposure(workbook, exposure_name, tableau_server, tableau_site, dbt_exposure_maturity)], Dumper=YamlDumper, sort_keys=False, allow_unicode=True)
+
+#yields (dbt project id, dbt exposures yaml) for the downstream workbooks of each dbt project, in dbt project id order
+def build_dbt_exposures(downstream_workbooks, tableau_server, tableau_site, dbt_exposure_maturity):
+    workbooks_by_project = group_workbooks_by_project(downstream_workbooks)
+    for project_id in sorted(workbooks_by_project, key=str):
+        yield str(project_id), ''.join(iter_dbt_exposures_yaml(workbooks_by_project[project_id], tableau_server, tableau_site, dbt_exposure_maturity))
+
+#returns the git blob sha of a file content (the sha github reports for a file, so unchanged files are detected without writing them)
+def get_git_blob_sha(content_bytes):
+    return hashlib.sha1(b'blob ' + str(len(content_bytes)).encode('utf-8') + b'\0' + content_bytes).hexdigest()
+
+#returns a dictionary of dbt project id to github repository (full_name and dbt project subdirectory) for a list of dbt project ids
+#repositories are looked up with the dbt Cloud v3 API and kept in the catalog cache across runs
+def dbt_get_project_repositories(dbt_client, dbt_account_id, project_ids, catalog_cache=None):
+    scope = dbt_client.dbt_cloud_api_v3 + str(dbt_account_id)
+    repositories = {}
+    if catalog_cache is not None:
+        snapshot = catalog_cache.get_snapshot('dbt_project_repositories', scope)
+        if snapshot is None or not snapshot['is_fresh']:
+            catalog_cache.put_snapshot('dbt_project_repositories', scope, {})
+        else:
+            repositories = catalog_cache.get_records('dbt_project_repositories', scope)
+    fetched_repositories = {}
+    for project_id in dict.fromkeys(str(project_id) for project_id in project_ids):
+        if project_id in repositories:
+            continue
+        url = dbt_client.dbt_cloud_api_v3 + str(dbt_account_id) + '/projects/' + project_id
+        try:
+            response_json = json.loads(dbt_client.request("get", url).text)
+            dbt_project = response_json['data']
+            fetched_repositories[project_id] = {'full_name': dbt_project['repository']['full_name'], 'subdirectory': dbt_project.get('dbt_project_subdirectory') or ''}
+        except Exception as e:
+            print('Error getting github repository of dbt project ' + project_id + ': ' + str(e))
+    if catalog_cache is not None and len(fetched_repositories) > 0:
+        catalog_cache.update_snapshot('dbt_project_repositories', scope, fetched_repositories)
+    repositories.update(fetched_repositories)
+    return repositories
+
+#returns the path of the exposures file of a dbt project in its github repository (GITHUB_EXPOSURES_FILE in the dbt project subdirectory)
+def get_github_exposures_path(repository, github_exposures_file):
+    return posixpath.join(repository['subdirectory'].strip('/'), github_exposures_file)
+
+#helper function sends a github api request and returns the response json, raising on errors
+def github_request_json(github_client, method, url, payload=None):
+    response = github_client.request(method, url, data=json.dumps(payload) if payload is not None else None)
+    if response.status_code >= 400:
+        raise Exception(method + ' ' + url + ' returned ' + str(response.status_code) + ' ' + response.text)
+    return json.loads(response.text)
+
+#commits files (a dictionary of path to content) to the default branch of a github repository in one commit with the Git Data API
+#files whose blob sha matches the file on the branch are skipped. returns the new commit sha, or None when no file changed
+@metrics.timed
+def github_commit_files(github_client, repository_name, files, message=GITHUB_COMMIT_MESSAGE):
+    repository_url = github_client.github_api + '/repos/' + repository_name
+    branch = github_request_json(github_client, 'GET', repository_url)['default_branch']
+    head_sha = github_request_json(github_client, 'GET', repository_url + '/git/ref/heads/' + branch)['object']['sha']
+    changed_files = {}
+    for path, content in files.items():
+        response = github_client.request('GET', repository_url + '/contents/' + path, params={'ref': head_sha})
+        if response.status_code == 200 and json.loads(response.text)['sha'] == get_git_blob_sha(content.encode('utf-8')):
+            continue
+        if response.status_code not in (200, 404):
+            raise Exception('GET ' + path + ' returned ' + str(response.status_code) + ' ' + response.text)
+        changed_files[path] = content
+    if len(changed_files) == 0:
+        print('dbt exposures files unchanged in github repo ' + repository_name)
+        return None
+
+    base_tree_sha = github_request_json(github_client, 'GET', repository_url + '/git/commits/' + head_sha)['tree']['sha']
+    tree_entries = [{'path': path, 'mode': '100644', 'type': 'blob', 'content': content} for path, content in changed_files.items()]
+    tree_sha = github_request_json(github_client, 'POST', repository_url + '/git/trees', {'base_tree': base_tree_sha, 'tree': tree_entries})['sha']
+    commit_sha = github_request_json(github_client, 'POST', repository_url + '/git/commits', {'message': message, 'tree': tree_sha, 'parents': [head_sha]})['sha']
+    #not forced: fails rather than overwriting commits pushed to the branch since head_sha was read
+    github_request_json(github_client, 'PATCH', repository_url + '/git/refs/heads/' + branch, {'sha': commit_sha})
+    print('committed ' + str(len(changed_files)) + ' dbt exposures files to github repo ' + repository_name + ' (' + commit_sha[:7] + ')')
+    return commit_sha
+
+#writes the exposures yaml of every planned dbt project to its github repository, with one commit per repository for the changed files
+#returns true if every commit succeeded
+@metrics.timed
+def write_github_exposures_files(settings, dbt_client, github_client, dbt_account_id, exposure_plans):
+    repositories = dbt_get_project_repositories(dbt_client, dbt_account_id, [exposure_plan['project_id'] for exposure_plan in exposure_plans], get_catalog_cache(settings))
+    files_by_repository = {}
+    for exposure_plan in exposure_plans:
+        repository = repositories.get(str(exposure_plan['project_id']))
+        if repository is not None:
+            files_by_repository.setdefault(repository['full_name'], {})[get_github_exposures_path(repository, settings.github_exposures_file)] = exposure_plan['yaml']
+    succeeded = True
+    for repository_name, files in files_by_repository.items():
+        try:
+            github_commit_files(github_client, repository_name, files)
+        except Exception as e:
+            print('Error writing dbt exposures to github repo ' + repository_name + ': ' + str(e))
+            succeeded = False
+    return succeeded
+
+#writes the exposures yaml of a dbt project to the local exposures folder, returns true if the file was written
+@metrics.timed
+def write_dbt_project_exposures_file(exposures_yaml, project_name, exposures_file_location=DBT_EXPOSURES_FILE_LOCATION):
+    print('writing dbt exposures to file for project: ' + project_name + '...')
+    try:
+        exposures_folder = os.path.normpath(exposures_file_location.replace('\\', '/')) #accepts windows style locations on every platform
+        os.makedirs(exposures_folder, exist_ok=True)
+        filename = os.path.join(exposures_folder, project_name + '_tab_exposures.yml')
+        #via a temporary file so an interrupted run never leaves a truncated exposures file
+        with open(filename + '.tmp', 'w', encoding='utf-8', newline='\n') as file:
+            file.write(exposures_yaml)
+        os.replace(filename + '.tmp', filename)
+    except Exception as e:
+        print('Error writing dbt exposures ' + str(e))
+        return False
+    return True
+
+#returns the planned tableau writes which sync dbt metadata to a single tableau table, in the order they are sent
+#(the only requests sent are reads of the table's columns and data quality warnings, when they were not prefetched)
+def plan_tableau_table(settings, tableau_client, merged_table, tableau_column_index, tableau_dq_warning_index, previous_package_name=None):
+    tableau_operations = []
+    table_description=make_table_description(merged_table.model)
+    table_update_operation = plan_tableau_table_update(merged_table, table_description, settings.dbt_meta_certification_flag, settings.tableau_certification_note)
+    if table_update_operation is not None:
+        tableau_operations.append(table_update_operation)
+    tableau_dq_warnings = get_tableau_quality_warnings(tableau_client, merged_table, tableau_dq_warning_index)
+    if tableau_dq_warnings is None: #never create a warning without knowing the existing ones, it would be a duplicate
+        print('skipping data quality warning for tableau table ' + get_full_table_name(merged_table) + ', existing warnings could not be fetched')
+    else:
+        tableau_operations.extend(plan_tableau_table_quality_warnings(merged_table, tableau_dq_warnings, settings.tableau_dq_warning_isSevere))
+    tableau_columns, column_tags = [], []
+    if settings.tableau_publish_columns:
+        tableau_columns = get_tableau_columns(tableau_client, merged_table, tableau_column_index)
+        column_descriptions, column_tags, writes_avoided = reconcile_tableau_columns(merged_table, tableau_columns)
+        print('skipping ' + str(writes_avoided) + ' unchanged tableau column descriptions and tags for table: ' + get_full_table_name(merged_table))
+        tableau_operations.extend(plan_tableau_column_descriptions(merged_table, column_descriptions))
+    return tableau_operations, plan_tableau_tags(merged_table, tableau_columns, column_tags, previous_package_name)
+
+#project settings read from the yaml config file (settings.yml in the working directory by default) when the settings are created
+class app_settings:
+    def __init__(self, config_file=CONFIG):
+        self.config_file = config_file
+        self.sync_scope = None #the jobs, projects and tables of a scoped run (see make_sync_scope), None syncs everything
+        try:
+            with open(config_file) as f:
+                data = yaml.load(f, Loader=SafeLoader)
+
+                self.dbt_token = data['DBT']['DBT_TOKEN']
+                self.dbt_cloud_api = data['DBT']['DBT_CLOUD_API']
+                self.dbt_metadata_api = data['DBT']['DBT_METADATA_API']
+                self.dbt_meta_certification_flag = data['DBT']['DBT_META_CERTIFICATION_FLAG']
+                self.dbt_project_filter = data['DBT']['DBT_PROJECT_FILTER']
+                self.dbt_generate_exposures = data['DBT']['DBT_GENERATE_EXPOSURES']
+                self.dbt_exposures_maturity = data['DBT']['DBT_EXPOSURES_MATURITY']
+                self.dbt_exposures_file_location = data['DBT'].get('DBT_EXPOSURES_FILE_LOCATION') or DBT_EXPOSURES_FILE_LOCATION
+                self.dbt_max_workers = data['DBT'].get('DBT_MAX_WORKERS', DBT_MAX_WORKERS)
+                self.dbt_account_id = data['DBT'].get('DBT_ACCOUNT_ID', '')
+                self.dbt_accounts = data['DBT'].get('DBT_ACCOUNTS') or []
+                self.dbt_model_cache_dir = data['DBT'].get('DBT_MODEL_CACHE_DIR', DBT_MODEL_CACHE_DIR)
+
+                self.tableau_token = data['TABLEAU']['TABLEAU_TOKEN']
+                self.tableau_token_name = data['TABLEAU']['TABLEAU_TOKEN_NAME']
+                self.tableau_token = data['TABLEAU']['TABLEAU_TOKEN']
+                self.tableau_site = data['TABLEAU']['TABLEAU_SITE']
+                self.tableau_server = data['TABLEAU']['TABLEAU_SERVER']
+                self.tableau_certification_note = data['TABLEAU']['TABLEAU_CERTIFICATION_NOTE']
+                self.tableau_dq_warning_isSevere = data['TABLEAU']['TABLEAU_DQ_WARNING_IS_SEVERE']
+                self.tableau_max_workers = data['TABLEAU'].get('TABLEAU_MAX_WORKERS', 1)
+                self.tableau_requests_per_second = data['TABLEAU'].get('TABLEAU_REQUESTS_PER_SECOND', tableau_REQUESTS_PER_SECOND)
+                self.tableau_metadata_batch_size = data['TABLEAU'].get('TABLEAU_METADATA_BATCH_SIZE', tableau_METADATA_BATCH_SIZE)
+                self.tableau_metadata_max_batch_size = data['TABLEAU'].get('TABLEAU_METADATA_MAX_BATCH_SIZE', MAX_BATCH_SIZE)
+                self.tableau_metadata_node_limit = data['TABLEAU'].get('TABLEAU_METADATA_NODE_LIMIT', NODE_LIMIT)
+                self.tableau_metadata_target_seconds = data['TABLEAU'].get('TABLEAU_METADATA_TARGET_SECONDS', TARGET_SECONDS)
+                self.tableau_tag_batch_size = data['TABLEAU'].get('TABLEAU_TAG_BATCH_SIZE', tableau_TAG_BATCH_SIZE)
+                self.tableau_publish_columns = data['TABLEAU'].get('TABLEAU_PUBLISH_COLUMNS', True)
+                self.tableau_session_minutes = data['TABLEAU'].get('TABLEAU_SESSION_MINUTES', tableau_SESSION_MINUTES)
+                self.tableau_sites = data['TABLEAU'].get('TABLEAU_SITES') or []
+
+                self.database_type_filter = data['DATABASE']['DATABASE_TYPE_FILTER']
+                self.database_name_filter = data['DATABASE']['DATABASE_NAME_FILTER']
+                self.database_account_filter = data['DATABASE']['DATABASE_ACCOUNT_FILTER']
+
+                self.github_token = data['GITHUB']['GITHUB_TOKEN']
+                self.github_api = data['GITHUB'].get('GITHUB_API', GITHUB_API)
+                self.github_write_exposures = data['GITHUB'].get('GITHUB_WRITE_EXPOSURES', True)
+                self.github_exposures_file = data['GITHUB'].get('GITHUB_EXPOSURES_FILE', GITHUB_EXPOSURES_FILE)
+
+                self.incremental_sync = data.get('SYNC', {}).get('INCREMENTAL_SYNC', False)
+                self.sync_state_file = data.get('SYNC', {}).get('SYNC_STATE_FILE', SYNC_STATE_FILE)
+                self.sync_site_processes = data.get('SYNC', {}).get('SYNC_SITE_PROCESSES', SYNC_SITE_PROCESSES)
+                self.sync_journal_file = data.get('SYNC', {}).get('SYNC_JOURNAL_FILE', SYNC_JOURNAL_FILE)
+                self.sync_checkpoint_file = data.get('SYNC', {}).get('SYNC_CHECKPOINT_FILE', SYNC_CHECKPOINT_FILE)
+
+                self.http_connect_timeout = data.get('HTTP', {}).get('HTTP_CONNECT_TIMEOUT', HTTP_CONNECT_TIMEOUT)
+                self.http_read_timeout = data.get('HTTP', {}).get('HTTP_READ_TIMEOUT', HTTP_READ_TIMEOUT)
+                self.http_max_retries = data.get('HTTP', {}).get('HTTP_MAX_RETRIES', HTTP_MAX_RETRIES)
+                self.http_pool_size = data.get('HTTP', {}).get('HTTP_POOL_SIZE', HTTP_POOL_SIZE)
+
+                self.metrics_report_file = data.get('METRICS', {}).get('METRICS_REPORT_FILE', METRICS_REPORT_FILE)
+
+                self.daemon_sync_interval_minutes = data.get('DAEMON', {}).get('DAEMON_SYNC_INTERVAL_MINUTES', DAEMON_SYNC_INTERVAL_MINUTES)
+                self.daemon_http_host = data.get('DAEMON', {}).get('DAEMON_HTTP_HOST', DAEMON_HTTP_HOST)
+                self.daemon_http_port = data.get('DAEMON', {}).get('DAEMON_HTTP_PORT', DAEMON_HTTP_PORT)
+                self.daemon_webhook_secret = data.get('DAEMON', {}).get('DAEMON_WEBHOOK_SECRET', '')
+
+                self.catalog_cache_file = data.get('CACHE', {}).get('CATALOG_CACHE_FILE', CATALOG_CACHE_FILE)
+                self.catalog_cache_ttl_minutes = dict(CACHE_TTL_MINUTES, **(data.get('CACHE', {}).get('CATALOG_CACHE_TTL_MINUTES') or {}))
+
+        except Exception as e:
+            print("failed to read yaml file " + config_file + " " + str(e))
+
+#returns the catalog snapshot cache for app_settings, or None when CATALOG_CACHE_FILE is empty
+def get_catalog_cache(settings):
+    if not settings.catalog_cache_file:
+        return None
+    try:
+        return catalog_cache(settings.catalog_cache_file, settings.catalog_cache_ttl_minutes)
+    except Exception as e:
+        print('Error opening catalog cache ' + settings.catalog_cache_file + ', fetching the whole catalog: ' + str(e))
+        return None
+
+#returns the dbt Cloud, tableau and github api clients for the endpoints in app_settings
+def make_api_clients(settings):
+    http_settings = {'timeout': (settings.http_connect_timeout, settings.http_read_timeout), 'max_retries': settings.http_max_retries}
+    dbt_client = DbtCloudClient(settings.dbt_cloud_api, settings.dbt_metadata_api, settings.dbt_token, pool_size=max(settings.http_pool_size, settings.dbt_max_workers), **http_settings)
+    metadata_batching = {'node_limit': settings.tableau_metadata_node_limit, 'batch_size': settings.tableau_metadata_batch_size, 'max_batch_size': settings.tableau_metadata_max_batch_size, 'target_seconds': settings.tableau_metadata_target_seconds}
+    tableau_client = TableauClient(settings.tableau_server, settings.tableau_requests_per_second, metadata_batching=metadata_batching, pool_size=max(settings.http_pool_size, settings.tableau_max_workers), **http_settings)
+    github_client = GitHubClient(settings.github_token, settings.github_api, pool_size=settings.http_pool_size, **http_settings)
+    return dbt_client, tableau_client, github_client
+
+#returns the tableau table names to query for the dbt models of a scoped run (None when the run is not scoped, to fetch every table)
+#tableau names tables as the database reports them (upper case on snowflake) while dbt may not, so every name is queried as is, upper and lower case
+def get_scope_table_names(settings, dbt_catalogs):
+    if settings.sync_scope is None:
+        return None
+    table_names = set()
+    for dbt_catalog in dbt_catalogs:
+        for dbt_models in (dbt_catalog or {}).get('dbt_models_by_job', {}).values():
+            table_names.update(name for dbt_model in dbt_models for name in (dbt_model.name, dbt_model.name.upper(), dbt_model.name.lower()))
+    return sorted(table_names)
+
+#fetch stage: signs in to tableau and returns the dbt account id, filtered dbt jobs, dbt models per job, dbt project accounts and the tableau table index
+#a scoped run only fetches the tableau tables named like the dbt models in scope
+@metrics.timed
+def fetch_catalog(settings, dbt_client, tableau_client):
+    dbt_catalog = fetch_dbt_catalog(settings, dbt_client)
+    return dict(dbt_catalog, **fetch_tableau_catalog(settings, tableau_client, get_scope_table_names(settings, [dbt_catalog])))
+
+#returns the dbt part of the catalog: the dbt account id (DBT_ACCOUNT_ID or the first account of the token), filtered dbt jobs, dbt models per job and dbt project accounts
+#a scoped run fetches only the projects, jobs and models of its scope (the scope projects replace DBT_PROJECT_FILTER)
+@metrics.timed
+def fetch_dbt_catalog(settings, dbt_client):
+    cache = get_catalog_cache(settings)
+    scope = settings.sync_scope or {}
+    dbt_account_id = settings.dbt_account_id or dbt_get_account_id(dbt_client, cache)
+    dbt_projects = dbt_get_projects(dbt_client, dbt_account_id, scope.get('projects') or settings.dbt_project_filter, settings.database_account_filter, cache)
+    if scope.get('jobs'):
+        dbt_jobs = filter_dbt_jobs(dbt_get_jobs_by_id(dbt_client, dbt_account_id, scope['jobs']), dbt_projects)
+    else:
+        dbt_jobs = filter_dbt_jobs(dbt_get_jobs(dbt_client, dbt_account_id, cache), dbt_projects)
+    model_fields = get_model_fields(settings.tableau_publish_columns, settings.dbt_meta_certification_flag, settings.dbt_generate_exposures)
+    if scope.get('tables'):
+        dbt_models_by_job = dbt_get_models_for_tables(dbt_client, dbt_jobs, scope['tables'], settings.dbt_max_workers, model_fields)
+    else:
+        dbt_models_by_job = dbt_get_models_for_jobs(dbt_client, dbt_account_id, dbt_jobs, settings.dbt_max_workers, settings.dbt_model_cache_dir, model_fields)
+    return {
+        'dbt_account_id': dbt_account_id,
+        'dbt_jobs': dbt_jobs,
+        'dbt_models_by_job': dbt_models_by_job,
+        'model_fields': model_fields,
+        'dbt_project_accounts': get_dbt_project_accounts(dbt_projects)
+    }
+
+#returns the tableau part of the catalog: signs in to the tableau site and returns the tableau table index
+#with table_names (a scoped run) only the tables with those names are fetched, bypassing the catalog cache
+@metrics.timed
+def fetch_tableau_catalog(settings, tableau_client, table_names=None):
+    cache = get_catalog_cache(settings)
+    if tableau_client.creds is None: #the daemon keeps its tableau session signed in
+        authenticate_tableau(tableau_client, settings.tableau_site, settings.tableau_token_name, settings.tableau_token)
+    if table_names is not None:
+        tableau_database_tables = tableau_iter_named_database_tables(tableau_client, settings.database_type_filter, settings.database_name_filter, table_names)
+    elif cache is not None:
+        tableau_database_tables = tableau_iter_cached_database_tables(tableau_client, settings.database_type_filter, settings.database_name_filter, cache)
+    else:
+        tableau_database_tables = tableau_iter_database_tables(tableau_client, settings.database_type_filter, settings.database_name_filter)
+    tableau_table_index = build_tableau_table_index(tableau_database_tables)
+    return {'tableau_table_index': tableau_table_index}
+
+#merge stage: returns a list of (dbt job, merged tables) pairs and reports the unmatched dbt models and tableau tables
+@metrics.timed
+def merge_catalog(catalog):
+    merged_tables_by_job = []
+    all_unmatched_models = []
+    matched_table_luids = set()
+    for dbt_job in catalog['dbt_jobs']:
+        dbt_models = catalog['dbt_models_by_job'][dbt_job['id']]
+        if len(dbt_models)>0:
+            merged_tables, unmatched_models = merge_dbt_tableau_tables(catalog['tableau_table_index'], dbt_models, catalog['dbt_project_accounts'])
+            all_unmatched_models.extend(unmatched_models)
+            matched_table_luids.update(merged_table.luid for merged_table in merged_tables)
+            merged_tables_by_job.append((dbt_job, merged_tables))
+
+    unmatched_tables = get_unmatched_tableau_tables(catalog['tableau_table_index'], matched_table_luids)
+    print('unmatched: ' + str(len(all_unmatched_models)) + ' dbt models and ' + str(len(unmatched_tables)) + ' tableau tables')
+    for kind, records in (('dbt_models', all_unmatched_models), ('tableau_tables', unmatched_tables)):
+        names = sorted(get_full_name(record) for record in records)
+        metrics.record_unmatched(kind, names)
+        if len(names) > 0:
+            print('unmatched ' + kind.replace('_', ' ') + ': ' + ', '.join(names[:UNMATCHED_NAMES_PRINTED]) + (' and ' + str(len(names) - UNMATCHED_NAMES_PRINTED) + ' more (see the metrics report)' if len(names) > UNMATCHED_NAMES_PRINTED else ''))
+    return merged_tables_by_job
+
+#plan stage: returns the planned tableau writes for the merged tableau tables of each job (only changed tables when incremental sync is enabled)
+#each table plan holds the table's writes in order and the sync state recorded once they have all succeeded
+@metrics.timed
+def plan_catalog(settings, tableau_client, merged_tables_by_job):
+    sync_state = load_sync_state(settings.sync_state_file) if settings.incremental_sync else {}
+    tableau_column_index = {}
+    tableau_dq_warning_index = {}
+    table_plans = []
+    for dbt_job, merged_tables in merged_tables_by_job:
+        content_hashes = {}
+        publish_luids = set()
+        for merged_table in merged_tables:
+            content_hashes[merged_table.luid] = get_table_content_hash(merged_table, settings.dbt_meta_certification_flag)
+            if not settings.incremental_sync or table_has_changed(sync_state, merged_table, content_hashes[merged_table.luid]):
+                publish_luids.add(merged_table.luid)
+        print('skipping ' + str(len(merged_tables) - len(publish_luids)) + ' unchanged tableau tables for jobId: ' + str(dbt_job['id']))
+        publish_tables = [merged_table.table for merged_table in merged_tables if merged_table.luid in publish_luids]
+        for table in publish_tables:
+            table.description = None #the daemon reuses the table records across syncs, their state is re-fetched before every plan
+        tableau_get_table_states(tableau_client, publish_tables)
+        if settings.tableau_publish_columns:
+            tableau_get_columns_for_tables(tableau_client, [merged_table.luid for merged_table in merged_tables if merged_table.luid in publish_luids], tableau_column_index)
+        tableau_get_quality_warnings_for_tables(tableau_client, [merged_table.luid for merged_table in merged_tables if merged_table.luid in publish_luids], tableau_dq_warning_index)
+
+        with ThreadPoolExecutor(max_workers=settings.tableau_max_workers) as executor:
+            futures = {}
+            for merged_table in merged_tables:
+                if merged_table.luid in publish_luids:
+                    previous_package_name = sync_state.get(merged_table.luid, {}).get('packageName')
+                    futures[executor.submit(plan_tableau_table, settings, tableau_client, merged_table, tableau_column_index, tableau_dq_warning_index, previous_package_name)] = (merged_table, content_hashes[merged_table.luid])
+            for future in as_completed(futures):
+                merged_table, content_hash = futures[future]
+                try:
+                    tableau_operations, tag_changes = future.result()
+                    table_plans.append({'luid': merged_table.luid, 'table': get_full_table_name(merged_table), 'jobId': dbt_job['id'],
+                                        'operations': tableau_operations, 'tags': tag_changes, 'sync_state': make_table_sync_state(merged_table, content_hash)})
+                except Exception as e:
+                    print('Error planning tableau table ' + get_full_table_name(merged_table) + ' ' + str(e))
+    print('planned ' + str(sum(len(table_plan['operations']) for table_plan in table_plans)) + ' tableau writes and ' + str(sum(len(table_plan['tags']) for table_plan in table_plans)) + ' tag changes for ' + str(len(table_plans)) + ' tableau tables')
+    return table_plans
+
+#executes the writes of a list of table plans: the tableau REST API writes concurrently across tables (writes to the same table are sent in plan
+#order), then the tag changes of every table in batches. returns the retry queue: a table plan with the failed writes of each table with a failed write
+def execute_table_plans(settings, tableau_client, table_plans, journal=None):
+    table_plans_by_luid = {}
+    for table_plan in table_plans:
+        table_plans_by_luid.setdefault(table_plan['luid'], []).append(table_plan)
+    print('applying ' + str(sum(len(table_plan['operations']) for table_plan in table_plans)) + ' tableau writes to ' + str(len(table_plans_by_luid)) + ' tableau tables...')
+    failed_operations = {}
+    with ThreadPoolExecutor(max_workers=settings.tableau_max_workers) as executor:
+        futures = {executor.submit(execute_table_operations, tableau_client, luid, [tableau_operation for table_plan in luid_table_plans for tableau_operation in table_plan['operations']], journal): luid
+                   for luid, luid_table_plans in table_plans_by_luid.items()}
+        for future in as_completed(futures):
+            luid = futures[future]
+            try:
+                luid_failed_operations = future.result()
+            except Exception as e:
+                print('Error syncing tableau table ' + table_plans_by_luid[luid][-1]['table'] + ' ' + str(e))
+                luid_failed_operations = [tableau_operation for table_plan in table_plans_by_luid[luid] for tableau_operation in table_plan['operations']]
+            if len(luid_failed_operations) > 0:
+                failed_operations[luid] = luid_failed_operations
+    failed_tag_changes = {}
+    for tag_batch in execute_tableau_tag_batches(tableau_client, make_tag_batches(table_plans, settings.tableau_tag_batch_size), settings.tableau_max_workers, journal):
+        for luid, tag_change in tag_batch['tag_changes']:
+            failed_tag_changes.setdefault(luid, []).append(tag_change)
+    return [dict(luid_table_plans[-1], operations=failed_operations.get(luid, []), tags=failed_tag_changes.get(luid, []))
+            for luid, luid_table_plans in table_plans_by_luid.items() if luid in failed_operations or luid in failed_tag_changes]
+
+#returns the number of writes (tableau REST API writes and tag changes) of a list of table plans
+def count_table_plan_writes(table_plans):
+    return sum(len(table_plan['operations']) + len(table_plan.get('tags', [])) for table_plan in table_plans)
+
+#apply stage: executes the planned tableau writes and records the sync state of every table whose writes all succeeded
+#failed writes are collected into a retry queue which is sent once more after signing in to tableau again (e.g. when the session expired
+#during a long run). returns the writes which still failed (they stay outstanding in the journal, so --resume retries them)
+@metrics.timed
+def apply_tableau_plan(settings, tableau_client, table_plans, journal=None):
+    sync_state = load_sync_state(settings.sync_state_file) if settings.incremental_sync else {}
+    retry_queue = list(table_plans)
+    try:
+        retry_queue = execute_table_plans(settings, tableau_client, table_plans, journal)
+        if len(retry_queue) > 0:
+            print('retrying ' + str(count_table_plan_writes(retry_queue)) + ' failed tableau writes for ' + str(len(retry_queue)) + ' tableau tables...')
+            if authenticate_tableau(tableau_client, settings.tableau_site, settings.tableau_token_name, settings.tableau_token) is None:
+                print('could not sign in to tableau again, the failed tableau writes are not retried')
+                record_failed_table_plans(retry_queue, journal)
+            else:
+                retry_queue = execute_table_plans(settings, tableau_client, retry_queue, journal)
+    finally: #the sync state of the tables already synced is kept even if the run is interrupted
+        failed_luids = {table_plan['luid'] for table_plan in retry_queue}
+        for table_plan in table_plans:
+            if table_plan['luid'] not in failed_luids:
+                sync_state[table_plan['luid']] = table_plan['sync_state']
+        if settings.incremental_sync:
+            save_sync_state(settings.sync_state_file, sync_state)
+    if len(retry_queue) > 0:
+        print(str(count_table_plan_writes(retry_queue)) + ' tableau writes failed for tables: ' + ', '.join(sorted(table_plan['table'] for table_plan in retry_queue)) + ('. run with --resume to retry them' if journal is not None else ''))
+    return count_table_plan_writes(retry_queue)
+
+#records every write of a list of table plans as failed in the journal (when one is given)
+def record_failed_table_plans(table_plans, journal=None):
+    if journal is None:
+        return
+    for table_plan in table_plans:
+        for tableau_operation in table_plan['operations']:
+            journal.failed(get_operation_write(table_plan['luid'], tableau_operation))
+        for tag_change in table_plan.get('tags', []):
+            journal.failed(get_tag_change_write(table_plan['luid'], tag_change))
+
+#publish stage: publishes dbt metadata to the merged tableau tables of each job (only changed tables when incremental sync is enabled)
+@metrics.timed
+def publish_catalog(settings, tableau_client, merged_tables_by_job):
+    apply_tableau_plan(settings, tableau_client, plan_catalog(settings, tableau_client, merged_tables_by_job))
+    return
+
+#returns the planned dbt exposures (the exposures yaml of each dbt project) for the downstream workbooks of every merged table
+#(including unchanged tables, so the exposures files are complete)
+@metrics.timed
+def plan_exposures(settings, tableau_client, merged_tables_by_job):
+    if not settings.dbt_generate_exposures:
+        return []
+    return make_exposure_plans(settings, get_exposure_workbooks(settings, tableau_client, merged_tables_by_job))
+
+#returns the downstream workbooks of every merged table, each with its tableau url and site
+def get_exposure_workbooks(settings, tableau_client, merged_tables_by_job):
+    downstream_workbook_index = {}
+    for dbt_job, merged_tables in merged_tables_by_job:
+        tableau_get_downstream_workbooks(tableau_client, merged_tables, downstream_workbook_index)
+    downstream_workbooks = list(downstream_workbook_index.values())
+    for workbook in downstream_workbooks:
+        workbook['url'] = get_workbook_url(settings.tableau_server, settings.tableau_site, workbook)
+        workbook['tableau_site'] = settings.tableau_site
+    return downstream_workbooks
+
+#returns the planned dbt exposures (the exposures yaml of each dbt project) for a list of downstream workbooks
+def make_exposure_plans(settings, downstream_workbooks):
+    dbt_exposures = build_dbt_exposures(downstream_workbooks, settings.tableau_server, settings.tableau_site, settings.dbt_exposures_maturity)
+    return [{'project_id': project_id, 'yaml': exposures_yaml} for project_id, exposures_yaml in dbt_exposures]
+
+#writes the planned dbt exposures to the local exposures folder and the github repo of each dbt project, returns true if every write succeeded
+@metrics.timed
+def apply_exposures(settings, dbt_client, github_client, dbt_account_id, exposure_plans):
+    succeeded = True
+    for exposure_plan in exposure_plans:
+        succeeded = write_dbt_project_exposures_file(exposure_plan['yaml'], exposure_plan['project_id'], settings.dbt_exposures_file_location) and succeeded
+    if settings.github_write_exposures:
+        succeeded = write_github_exposures_files(settings, dbt_client, github_client, dbt_account_id, exposure_plans) and succeeded
+    return succeeded
+
+#exposures stage: generates dbt exposures for the downstream workbooks of every merged table
+@metrics.timed
+def publish_exposures(settings, dbt_client, github_client, tableau_client, dbt_account_id, merged_tables_by_job):
+    exposure_plans = plan_exposures(settings, tableau_client, merged_tables_by_job)
+    if len(exposure_plans)>0:
+        print('generating dbt exposures for downstream workbooks...')
+        apply_exposures(settings, dbt_client, github_client, dbt_account_id, exposure_plans)
+    return
+
+#returns the change plan of a sync without sending any write to tableau or github: the planned tableau writes of each table and the dbt exposures of each dbt project
+@metrics.timed
+def make_sync_plan(settings, dbt_client, tableau_client):
+    catalog = fetch_catalog(settings, dbt_client, tableau_client)
+    merged_tables_by_job = merge_catalog(catalog)
+    sync_plan = {
+        'version': SYNC_PLAN_VERSION,
+        'created_at': datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+        'tableau_server': settings.tableau_server,
+        'tableau_site': settings.tableau_site,
+        'dbt_account_id': catalog['dbt_account_id'],
+        'tables': plan_catalog(settings, tableau_client, merged_tables_by_job),
+        'exposures': plan_exposures(settings, tableau_client, merged_tables_by_job)
+    }
+    sync_plan['summary'] = get_sync_plan_summary(sync_plan)
+    return sync_plan
+
+#returns the number of planned writes by operation and method, and the number of planned exposures files
+def get_sync_plan_summary(sync_plan):
+    summary = {}
+    for table_plan in sync_plan['tables']:
+        for tableau_operation in table_plan['operations']:
+            key = tableau_operation['operation'] + ' ' + tableau_operation['method']
+            summary[key] = summary.get(key, 0) + 1
+        for tag_change in table_plan.get('tags', []):
+            key = 'tableau_tags ' + tag_change['action']
+            summary[key] = summary.get(key, 0) + 1
+    summary['dbt_exposures_files'] = len(sync_plan['exposures'])
+    return dict(sorted(summary.items()))
+
+#writes a change plan to a json file (via a temporary file so that an interrupted write never leaves a partial plan)
+def write_sync_plan(sync_plan_file, sync_plan):
+    with open(sync_plan_file + '.tmp', 'w') as f:
+        json.dump(sync_plan, f, indent=2)
+    os.replace(sync_plan_file + '.tmp', sync_plan_file)
+    print('wrote change plan to ' + sync_plan_file + ': ' + json.dumps(sync_plan['summary']))
+    return
+
+#returns a change plan read from a json file
+def load_sync_plan(sync_plan_file):
+    with open(sync_plan_file) as f:
+        sync_plan = json.load(f)
+    if sync_plan.get('version') != SYNC_PLAN_VERSION:
+        raise Exception('unsupported change plan version ' + str(sync_plan.get('version')) + ' in ' + sync_plan_file)
+    return sync_plan
+
+#executes exactly the writes of a change plan: the tableau writes of each table (in bulk, concurrently across tables) and the dbt exposures files,
+#recording every write in the journal when one is given. returns the number of writes which failed (the exposures count as one write)
+@metrics.timed
+def apply_sync_plan(settings, dbt_client, github_client, tableau_client, sync_plan, journal=None):
+    if sync_plan['tableau_server'] != settings.tableau_server or sync_plan['tableau_site'] != settings.tableau_site:
+        raise Exception('change plan was made for tableau server ' + sync_plan['tableau_server'] + ' site ' + sync_plan['tableau_site'] + ', not ' + settings.tableau_server + ' site ' + settings.tableau_site)
+    print('applying change plan created at ' + sync_plan['created_at'] + ': ' + json.dumps(sync_plan['summary']))
+    if tableau_client.creds is None: #already signed in when the plan was made by this run
+        authenticate_tableau(tableau_client, settings.tableau_site, settings.tableau_token_name, settings.tableau_token)
+    failed_writes = apply_tableau_plan(settings, tableau_client, sync_plan['tables'], journal)
+    if len(sync_plan['exposures']) > 0:
+        exposures_succeeded = apply_exposures(settings, dbt_client, github_client, sync_plan['dbt_account_id'], sync_plan['exposures'])
+        if journal is not None:
+            journal.record(get_exposures_write(sync_plan['exposures']), exposures_succeeded)
+        if not exposures_succeeded:
+            failed_writes += 1
+    return failed_writes
+
+#returns the journal write of the planned dbt exposures (the exposures files are written together)
+def get_exposures_write(exposure_plans):
+    return make_journal_write('exposures', 'apply_exposures', exposure_plans)
+
+#returns the journal writes of a change plan: every tableau write and tag change of each table, and the dbt exposures
+def get_sync_plan_writes(sync_plan):
+    writes = []
+    for table_plan in sync_plan['tables']:
+        writes.extend(get_operation_write(table_plan['luid'], tableau_operation) for tableau_operation in table_plan['operations'])
+        writes.extend(get_tag_change_write(table_plan['luid'], tag_change) for tag_change in table_plan.get('tags', []))
+    if len(sync_plan['exposures']) > 0:
+        writes.append(get_exposures_write(sync_plan['exposures']))
+    return writes
+
+#returns a change plan with only the writes which did not complete in a journaled run (every table plan is kept, so the sync state of tables
+#whose writes all completed before the run was interrupted is recorded too)
+def get_outstanding_sync_plan(sync_plan, completed_keys):
+    table_plans = []
+    for table_plan in sync_plan['tables']:
+        table_plans.append(dict(table_plan,
+                                operations=[tableau_operation for tableau_operation in table_plan['operations'] if get_operation_write(table_plan['luid'], tableau_operation)['key'] not in completed_keys],
+                                tags=[tag_change for tag_change in table_plan.get('tags', []) if get_tag_change_write(table_plan['luid'], tag_change)['key'] not in completed_keys]))
+    exposure_plans = sync_plan['exposures']
+    if len(exposure_plans) > 0 and get_exposures_write(exposure_plans)['key'] in completed_keys:
+        exposure_plans = []
+    outstanding_sync_plan = dict(sync_plan, tables=table_plans, exposures=exposure_plans)
+    outstanding_sync_plan['summary'] = get_sync_plan_summary(outstanding_sync_plan)
+    return outstanding_sync_plan
+
+#applies a change plan as a resumable run: the plan is written to the checkpoint file and its writes to the journal before the first write is sent
+#(without a journal file the plan is applied as is)
+@metrics.timed
+def apply_journaled_sync_plan(settings, dbt_client, github_client, tableau_client, sync_plan):
+    if not settings.sync_journal_file:
+        return apply_sync_plan(settings, dbt_client, github_client, tableau_client, sync_plan)
+    previous_run = load_journal(settings.sync_journal_file)
+    if previous_run is not None and len(get_outstanding_keys(previous_run)) > 0:
+        print('replacing the journal of run ' + previous_run['run']['run_id'] + ' with ' + str(len(get_outstanding_keys(previous_run))) + ' outstanding writes, they are planned again by this run')
+    run_id = uuid.uuid4().hex
+    write_sync_plan(settings.sync_checkpoint_file, dict(sync_plan, run_id=run_id))
+    journal = sync_journal(settings.sync_journal_file)
+    journal.begin(run_id, settings.sync_checkpoint_file)
+    try:
+        journal.planned(get_sync_plan_writes(sync_plan))
+        journal.end(apply_sync_plan(settings, dbt_client, github_client, tableau_client, sync_plan, journal))
+    finally:
+        journal.close()
+    return
+
+#resumes the last journaled run: applies only the writes of its checkpointed change plan which did not complete (including the failed writes of
+#its retry queue), without fetching the catalog again
+@metrics.timed
+def resume_sync(settings, dbt_client, github_client, tableau_client):
+    journaled_run = load_journal(settings.sync_journal_file) if settings.sync_journal_file else None
+    if journaled_run is None:
+        print('no sync journal ' + str(settings.sync_journal_file) + ' to resume')
+        return
+    run_id = journaled_run['run']['run_id']
+    outstanding_keys = get_outstanding_keys(journaled_run)
+    if len(outstanding_keys) == 0:
+        print('run ' + run_id + ' completed every write, nothing to resume')
+        return
+    sync_plan = load_sync_plan(journaled_run['run']['checkpoint_file'])
+    if sync_plan.get('run_id') != run_id:
+        raise Exception('checkpoint ' + journaled_run['run']['checkpoint_file'] + ' is not the change plan of journaled run ' + run_id)
+    print('resuming run ' + run_id + ' (' + ('ended' if journaled_run['ended'] else 'interrupted') + '): ' + str(len(outstanding_keys)) + ' of ' + str(len(journaled_run['planned'])) + ' writes outstanding, ' + str(len(journaled_run['failed'])) + ' of them failed')
+    journal = sync_journal(settings.sync_journal_file)
+    journal.resume(run_id)
+    try:
+        journal.end(apply_sync_plan(settings, dbt_client, github_client, tableau_client, get_outstanding_sync_plan(sync_plan, journaled_run['completed']), journal))
+    finally:
+        journal.close()
+    return
+
+#writes the metrics of the run (stage durations, api call latencies, bytes, status codes and retries) to the metrics report file
+def write_metrics_report(metrics_report_file):
+    if not metrics_report_file:
+        return
+    try:
+        metrics.write_report(metrics_report_file)
+        print('wrote sync metrics report to ' + metrics_report_file)
+    except Exception as e:
+        print('Error writing sync metrics report ' + metrics_report_file + ' ' + str(e))
+    return
+
+#daemon mode: keeps the api sessions and the catalog index warm, runs a full sync on a schedule and re-syncs single dbt jobs when triggered over http
+#syncs are run one at a time by the daemon loop, triggers received while a sync is running are queued
+class sync_daemon:
+    def __init__(self, settings):
+        self.settings = settings
+        self.dbt_client, self.tableau_client, self.github_client = make_api_clients(settings)
+        self.catalog = None
+        self.triggers = queue.Queue()
+        self.status = {'started_at': datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"), 'last_full_sync': None, 'last_job_syncs': {}}
+
+    #signs in to tableau again before the session expires
+    def ensure_tableau_session(self):
+        if self.tableau_client.creds is None or time.monotonic() - self.tableau_client.signed_in_at > self.settings.tableau_session_minutes * 60:
+            authenticate_tableau(self.tableau_client, self.settings.tableau_site, self.settings.tableau_token_name, self.settings.tableau_token)
+
+    #refreshes the catalog index (dbt jobs and models, tableau tables) and syncs every job
+    def full_sync(self):
+        self.ensure_tableau_session()
+        self.catalog = fetch_catalog(self.settings, self.dbt_client, self.tableau_client)
+        merged_tables_by_job = merge_catalog(self.catalog)
+        publish_catalog(self.settings, self.tableau_client, merged_tables_by_job)
+        publish_exposures(self.settings, self.dbt_client, self.github_client, self.tableau_client, self.catalog['dbt_account_id'], merged_tables_by_job)
+        self.status['last_full_sync'] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    #re-syncs the models of a single dbt job against the cached catalog index (a full sync is run instead if the job is not in the index)
+    #the exposures of the job's dbt project are regenerated from the cached models of every job in the project, so the exposures file stays complete
+    def sync_job(self, job_id):
+        dbt_job = None
+        if self.catalog is not None:
+            dbt_job = next((dbt_job for dbt_job in self.catalog['dbt_jobs'] if str(dbt_job['id']) == str(job_id)), None)
+        if dbt_job is None:
+            print('dbt job ' + str(job_id) + ' is not in the catalog index, running a full sync...')
+            self.full_sync()
+            return
+        print('syncing dbt job ' + str(job_id) + '...')
+        self.ensure_tableau_session()
+        self.catalog['dbt_models_by_job'].update(dbt_get_models_for_jobs(self.dbt_client, self.catalog['dbt_account_id'], [dbt_job], 1, self.settings.dbt_model_cache_dir, self.catalog['model_fields']))
+        project_catalog = dict(self.catalog, dbt_jobs=[project_job for project_job in self.catalog['dbt_jobs'] if project_job['project_id'] == dbt_job['project_id']])
+        merged_tables_by_job = merge_catalog(project_catalog)
+        publish_catalog(self.settings, self.tableau_client, [(merged_job, merged_tables) for merged_job, merged_tables in merged_tables_by_job if merged_job['id'] == dbt_job['id']])
+        publish_exposures(self.settings, self.dbt_client, self.github_client, self.tableau_client, self.catalog['dbt_account_id'], merged_tables_by_job)
+        self.status['last_job_syncs'][str(job_id)] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    #queues a sync of a single dbt job
+    def trigger(self, job_id):
+        print('received sync trigger for dbt job ' + str(job_id))
+        self.triggers.put(job_id)
+
+    #runs the daemon until interrupted: a full sync at start up and every DAEMON_SYNC_INTERVAL_MINUTES, and a job sync for every trigger
+    def run(self):
+        server = sync_trigger_server((self.settings.daemon_http_host, self.settings.daemon_http_port), self)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print('listening for sync triggers on http://' + self.settings.daemon_http_host + ':' + str(self.settings.daemon_http_port))
+        next_full_sync = time.monotonic()
+        try:
+            while True:
+                try:
+                    job_id = self.triggers.get(timeout=max(0, next_full_sync - time.monotonic()))
+                except queue.Empty:
+                    job_id = None
+                try:
+                    if job_id is None:
+                        next_full_sync = time.monotonic() + self.settings.daemon_sync_interval_minutes * 60
+                        self.full_sync()
+                    else:
+                        self.sync_job(job_id)
+                except Exception as e:
+                    print('Error running ' + ('full sync' if job_id is None else 'sync for dbt job ' + str(job_id)) + ' ' + str(e))
+                write_metrics_report(self.settings.metrics_report_file) #metrics accumulate over the life of the daemon
+        except KeyboardInterrupt:
+            print('stopping sync daemon...')
+        finally:
+            server.shutdown()
+            for client in (self.dbt_client, self.tableau_client, self.github_client):
+                client.close()
+
+#http endpoint of the sync daemon:
+#  POST /jobs/<job id>/sync  queues a sync of a single dbt job
+#  POST /webhooks/dbt        queues a sync of the job of a dbt Cloud job.run.completed webhook (signed with DAEMON_WEBHOOK_SECRET when set)
+#  GET  /health              returns the daemon status
+class sync_trigger_handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        return
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/health':
+            return self.send_json(200, dict(self.server.sync_daemon.status, pending_triggers=self.server.sync_daemon.triggers.qsize()))
+        return self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        job_sync = re.fullmatch(r'/jobs/(\d+)/sync', self.path)
+        if job_sync:
+            self.server.sync_daemon.trigger(int(job_sync.group(1)))
+            return self.send_json(202, {'queued': int(job_sync.group(1))})
+        if self.path == '/webhooks/dbt':
+            webhook_secret = self.server.sync_daemon.settings.daemon_webhook_secret
+            if webhook_secret and not hmac.compare_digest(hmac.new(webhook_secret.encode('utf-8'), body, hashlib.sha256).hexdigest(), self.headers.get('Authorization') or ''):
+                return self.send_json(401, {'error': 'invalid webhook signature'})
+            try:
+                webhook = json.loads(body)
+                if webhook.get('eventType') != 'job.run.completed':
+                    return self.send_json(200, {'ignored': webhook.get('eventType')})
+                job_id = int(webhook['data']['jobId'])
+            except (ValueError, KeyError, TypeError) as e:
+                return self.send_json(400, {'error': 'invalid dbt Cloud webhook ' + str(e)})
+            self.server.sync_daemon.trigger(job_id)
+            return self.send_json(202, {'queued': job_id})
+        return self.send_json(404, {'error': 'not found'})
+
+class sync_trigger_server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, sync_daemon):
+        super().__init__(address, sync_trigger_handler)
+        self.sync_daemon = sync_daemon
+
+#runs a full sync (fetch, merge, publish and exposures), or only writes the change plan to sync_plan_file, or only applies the change plan in apply_plan_file,
+#or resumes the last journaled run. with a journal file the change plan of a full sync is made first and applied as a resumable run
+def run_sync(settings, sync_plan_file=None, apply_plan_file=None, resume=False):
+    metrics.reset()
+    dbt_client, tableau_client, github_client = make_api_clients(settings)
+    try:
+        if resume:
+            resume_sync(settings, dbt_client, github_client, tableau_client)
+        elif apply_plan_file:
+            apply_journaled_sync_plan(settings, dbt_client, github_client, tableau_client, load_sync_plan(apply_plan_file))
+        elif sync_plan_file:
+            write_sync_plan(sync_plan_file, make_sync_plan(settings, dbt_client, tableau_client))
+        elif settings.sync_journal_file:
+            apply_journaled_sync_plan(settings, dbt_client, github_client, tableau_client, make_sync_plan(settings, dbt_client, tableau_client))
+        else:
+            catalog = fetch_catalog(settings, dbt_client, tableau_client)
+            merged_tables_by_job = merge_catalog(catalog)
+            publish_catalog(settings, tableau_client, merged_tables_by_job)
+            publish_exposures(settings, dbt_client, github_client, tableau_client, catalog['dbt_account_id'], merged_tables_by_job)
+    finally:
+        for client in (dbt_client, tableau_client, github_client):
+            client.close()
+        write_metrics_report(settings.metrics_report_file)
+    return
+
+#returns a copy of app_settings with the settings named in overrides replaced, e.g. {'TABLEAU_SITE': 'finance', 'TABLEAU_TOKEN': '...'}
+def make_target_settings(settings, overrides):
+    target_settings = copy.copy(settings)
+    for key, value in overrides.items():
+        if not hasattr(settings, key.lower()):
+            raise Exception('unknown setting ' + key)
+        setattr(target_settings, key.lower(), value)
+    return target_settings
+
+#returns the settings of a TABLEAU_SITES entry. every site keeps its own sync state file (e.g. sync_state.finance.json) unless the entry sets SYNC_STATE_FILE
+def make_site_settings(settings, site):
+    site_settings = make_target_settings(settings, site)
+    if len(settings.tableau_sites) > 0 and 'SYNC_STATE_FILE' not in site:
+        sync_state_root, sync_state_ext = os.path.splitext(settings.sync_state_file)
+        site_settings.sync_state_file = sync_state_root + '.' + (site_settings.tableau_site or 'default') + sync_state_ext
+    return site_settings
+
+#dbt catalogs of the DBT_ACCOUNTS accounts in a site worker process (inherited read only on fork, sent once to each worker elsewhere)
+site_worker_dbt_catalogs = []
+
+#initializes a site worker process. the rate limiters inherited on fork from the parent (at the full TABLEAU_REQUESTS_PER_SECOND) are dropped,
+#so that each worker creates its own at the share of the rate it is given
+def init_site_worker(dbt_catalogs):
+    global site_worker_dbt_catalogs, tableau_rate_limiters, tableau_rate_limiters_lock
+    site_worker_dbt_catalogs = dbt_catalogs
+    tableau_rate_limiters = {}
+    tableau_rate_limiters_lock = threading.Lock()
+
+#site worker process: syncs a tableau site with the dbt catalog of every account. returns the site result (with the downstream workbooks
+#of each account, for the exposures) and the metrics recorded by the worker
+def sync_site(settings, site, accounts, tableau_requests_per_second):
+    metrics.reset()
+    start = time.perf_counter()
+    site_settings = make_site_settings(settings, site)
+    site_settings.tableau_requests_per_second = tableau_requests_per_second
+    site_result = {'tableau_site': site_settings.tableau_site, 'failed': False, 'workbooks_by_account': [[] for account in accounts]}
+    dbt_client, tableau_client, github_client = make_api_clients(site_settings)
+    try:
+        tableau_catalog = fetch_tableau_catalog(site_settings, tableau_client, get_scope_table_names(site_settings, site_worker_dbt_catalogs))
+        if tableau_client.creds is None:
+            raise Exception('could not sign in to tableau site ' + site_settings.tableau_site)
+        for i, account in enumerate(accounts):
+            if site_worker_dbt_catalogs[i] is None: #the dbt catalog of this account could not be fetched
+                continue
+            target_settings = make_target_settings(site_settings, account)
+            merged_tables_by_job = merge_catalog(dict(site_worker_dbt_catalogs[i], **tableau_catalog))
+            publish_catalog(target_settings, tableau_client, merged_tables_by_job)
+            if target_settings.dbt_generate_exposures:
+                site_result['workbooks_by_account'][i] = get_exposure_workbooks(target_settings, tableau_client, merged_tables_by_job)
+    except Exception as e:
+        print('Error syncing tableau site ' + str(site_settings.tableau_site) + ': ' + str(e))
+        site_result['failed'] = True
+    finally:
+        for client in (dbt_client, tableau_client, github_client):
+            client.close()
+    metrics.record_target('tableau site ' + str(site_settings.tableau_site), time.perf_counter() - start, site_result['failed'])
+    return site_result, metrics.snapshot()
+
+#multi target sync: fetches the dbt catalog of every DBT_ACCOUNTS account once, syncs the TABLEAU_SITES sites in parallel worker processes
+#and writes the dbt exposures of each account for the downstream workbooks of every site. the metrics of all workers are aggregated into one report
+def run_multi_sync(settings):
+    metrics.reset()
+    accounts = settings.dbt_accounts or [{}]
+    sites = settings.tableau_sites or [{}]
+    account_clients = []
+    dbt_catalogs = []
+    try:
+        for account in accounts:
+            start = time.perf_counter()
+            account_settings = make_target_settings(settings, account)
+            clients = make_api_clients(account_settings)
+            account_clients.append((account_settings, clients))
+            try:
+                dbt_catalogs.append(fetch_dbt_catalog(account_settings, clients[0]))
+            except Exception as e:
+                print('Error fetching dbt catalog for dbt account ' + str(account_settings.dbt_account_id) + ': ' + str(e))
+                dbt_catalogs.append(None)
+            metrics.record_target('dbt account ' + str(dbt_catalogs[-1]['dbt_account_id'] if dbt_catalogs[-1] else account_settings.dbt_account_id), time.perf_counter() - start, dbt_catalogs[-1] is None)
+
+        #sites on the same tableau server share its rate limit
+        processes = max(1, min(settings.sync_site_processes, len(sites)))
+        site_servers = [make_target_settings(settings, site).tableau_server for site in sites]
+        mp_context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        print('syncing ' + str(len(sites)) + ' tableau sites with ' + str(len(accounts)) + ' dbt accounts in ' + str(processes) + ' worker processes...')
+        site_results = []
+        with ProcessPoolExecutor(max_workers=processes, mp_context=mp_context, initializer=init_site_worker, initargs=(dbt_catalogs,)) as executor:
+            futures = []
+            for site, tableau_server in zip(sites, site_servers):
+                site_settings = make_target_settings(settings, site)
+                tableau_requests_per_second = max(1, site_settings.tableau_requests_per_second // min(processes, site_servers.count(tableau_server)))
+                futures.append(executor.submit(sync_site, settings, site, accounts, tableau_requests_per_second))
+            for future in futures: #in site order, so the exposures files do not depend on which site finished first
+                try:
+                    site_result, site_metrics = future.result()
+                    metrics.merge(site_metrics)
+                    site_results.append(site_result)
+                except Exception as e:
+                    print('Error in tableau site worker process: ' + str(e))
+                    site_results.append({'tableau_site': None, 'failed': True, 'workbooks_by_account': []})
+
+        failed_sites = [str(site_result['tableau_site']) for site_result in site_results if site_result['failed']]
+        for i, (account_settings, (dbt_client, tableau_client, github_client)) in enumerate(account_clients):
+            if dbt_catalogs[i] is None or not account_settings.dbt_generate_exposures:
+                continue
+            if len(failed_sites) > 0: #partial exposures would drop the workbooks of the failed sites from the exposures files
+                print('skipping dbt exposures for dbt account ' + str(dbt_catalogs[i]['dbt_account_id']) + ', tableau sites failed: ' + ', '.join(failed_sites))
+                continue
+            downstream_workbooks = [workbook for site_result in site_results for workbook in site_result['workbooks_by_account'][i]]
+            exposure_plans = make_exposure_plans(account_settings, downstream_workbooks)
+            if len(exposure_plans) > 0:
+                print('generating dbt exposures for dbt account ' + str(dbt_catalogs[i]['dbt_account_id']) + '...')
+                apply_exposures(account_settings, dbt_client, github_client, dbt_catalogs[i]['dbt_account_id'], exposure_plans)
+        print('synced ' + str(len(site_results) - len(failed_sites)) + ' of ' + str(len(sites)) + ' tableau sites')
+    finally:
+        for account_settings, clients in account_clients:
+            for client in clients:
+                client.close()
+        write_metrics_report(settings.metrics_report_file)
+    return
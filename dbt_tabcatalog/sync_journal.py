@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+#write-ahead journal of a sync run: an append-only file with one json record per line. the planned writes of a run are recorded before the
+#first write is sent and every write is recorded as completed or failed right after it is sent, so a run that dies partway (an expired token,
+#a network failure, out of memory) can be resumed with only its outstanding writes. the records of a run are:
+#  begin      a new run, with the checkpoint file holding its change plan
+#  planned    a planned write: table luid (or 'exposures'), operation and payload hash
+#  completed  a write which succeeded
+#  failed     a write which failed, it stays outstanding (in the retry queue) until a resumed run completes it
+#  resume     the run was resumed
+#  end        the run finished, with the number of writes still failed
+class sync_journal:
+    def __init__(self, journal_file):
+        self.journal_file = journal_file
+        self.lock = threading.Lock()
+        self.file = None
+
+    #starts the journal of a new run (the journal of the previous run is replaced)
+    def begin(self, run_id, checkpoint_file):
+        directory = os.path.dirname(self.journal_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.journal_file, 'w', encoding='utf-8')
+        self.append([{'event': 'begin', 'run_id': run_id, 'checkpoint_file': checkpoint_file}], True)
+
+    #reopens the journal of an interrupted run to record the writes of the resumed run
+    def resume(self, run_id):
+        self.file = open(self.journal_file, 'a', encoding='utf-8')
+        self.append([{'event': 'resume', 'run_id': run_id}], True)
+
+    #appends records to the journal. records are flushed as they are written so they survive the process being killed, and synced to disk
+    #when sync is true (the planned writes and the start and end of a run)
+    def append(self, records, sync=False):
+        at = round(time.time(), 3)
+        lines = ''.join(json.dumps(dict(record, at=at)) + '\n' for record in records)
+        with self.lock:
+            self.file.write(lines)
+            self.file.flush()
+            if sync:
+                os.fsync(self.file.fileno())
+
+    def planned(self, writes):
+        self.append([dict(write, event='planned') for write in writes], True)
+
+    def completed(self, write):
+        self.append([{'event': 'completed', 'key': write['key']}])
+
+    def failed(self, write):
+        self.append([{'event': 'failed', 'key': write['key']}])
+
+    #records the result of a write
+    def record(self, write, succeeded):
+        if succeeded:
+            self.completed(write)
+        else:
+            self.failed(write)
+
+    #records the end of the run and closes the journal
+    def end(self, failed_writes):
+        self.append([{'event': 'end', 'failed': failed_writes}], True)
+        self.close()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+#returns a journaled write: the table luid (or another target such as 'exposures'), the operation and the hash of its payload, with a key
+#identifying the write in the journal (the same write planned again has the same key)
+def make_journal_write(luid, operation, payload):
+    payload_hash = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return {'key': luid + ':' + operation + ':' + payload_hash[:16], 'luid': luid, 'operation': operation, 'hash': payload_hash}
+
+#returns the state of the last run recorded in a journal file (None if there is no journal): its begin record, planned writes by key,
+#completed and failed keys and whether the run ended. a partly written last line (the process was killed while appending) is ignored
+def load_journal(journal_file):
+    if not os.path.exists(journal_file):
+        return None
+    state = None
+    with open(journal_file, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record['event'] == 'begin':
+                state = {'run': record, 'planned': {}, 'completed': set(), 'failed': set(), 'ended': False}
+            elif state is None:
+                continue
+            elif record['event'] == 'planned':
+                state['planned'][record['key']] = record
+            elif record['event'] == 'completed':
+                state['completed'].add(record['key'])
+                state['failed'].discard(record['key'])
+            elif record['event'] == 'failed':
+                state['failed'].add(record['key'])
+            elif record['event'] == 'resume':
+                state['ended'] = False
+            elif record['event'] == 'end':
+                state['ended'] = True
+    return state
+
+#returns the keys of the outstanding writes of a journaled run: planned writes which did not complete, including the failed writes
+def get_outstanding_keys(state):
+    return [key for key in state['planned'] if key not in state['completed']]
@@ -0,0 +1,297 @@
+import copy
+import functools
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+#latency histogram bucket upper bounds in seconds (prometheus style, cumulative when reported)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+METRIC_PREFIX = 'dbt_tabcatalog_'
+#number of unmatched dbt model and tableau table names kept in the run report for each kind
+UNMATCHED_NAMES_LIMIT = 100
+
+#returns a low cardinality endpoint name for a request: numeric ids, uuids and git shas in the path are replaced by {id}, repositories by {repo}
+#and graphql requests are suffixed with the query operation name
+def get_endpoint_name(url, body=None):
+    path = urlparse(url).path
+    path = re.sub(r'/repos/[^/]+/[^/]+(/|$)', r'/repos/{repo}\1', path)
+    path = re.sub(r'/contents/.*', '/contents/{path}', path)
+    segments = ['{id}' if re.fullmatch(r'\d+|[0-9a-fA-F]{8}(-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}|[0-9a-f]{40}', segment) else segment for segment in path.split('/')]
+    endpoint = '/'.join(segments)
+    if path.endswith('/graphql') and body:
+        if isinstance(body, bytes):
+            body = body.decode('utf-8', 'replace')
+        match = re.search(r'query\s+(\w+)', body)
+        endpoint = endpoint + ' ' + (match.group(1) if match else 'anonymous')
+    return endpoint
+
+#latency histogram with a count and sum
+class histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) #the last count is the +Inf bucket
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+
+    #returns (upper bound, cumulative count) pairs ending with the +Inf bucket
+    def cumulative(self):
+        total = 0
+        result = []
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    #adds the observations of another histogram with the same buckets
+    def merge(self, other):
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+
+    def to_dict(self):
+        return {'count': self.count, 'sum_s': round(self.sum, 6), 'buckets': {str(bound): count for bound, count in self.cumulative()}}
+
+#thread safe collector of api call and stage metrics for a sync run
+class sync_metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started_at = time.time()
+            self.api_calls = {}
+            self.stages = {}
+            self.targets = []
+            self.batches = {}
+            self.unmatched = {}
+
+    #records an api call. status is the http status code (or 'error' when no response was received)
+    def record_api_call(self, service, method, endpoint, status, seconds, bytes_sent=0, bytes_received=0, retries=0):
+        key = (service, method.upper(), endpoint)
+        with self.lock:
+            api_call = self.api_calls.get(key)
+            if api_call is None:
+                api_call = self.api_calls[key] = {'latency': histogram(), 'status_codes': {}, 'bytes_sent': 0, 'bytes_received': 0, 'retries': 0}
+            api_call['latency'].observe(seconds)
+            api_call['status_codes'][str(status)] = api_call['status_codes'].get(str(status), 0) + 1
+            api_call['bytes_sent'] += bytes_sent
+            api_call['bytes_received'] += bytes_received
+            api_call['retries'] += retries
+
+    #records a retry which happened after the api call was recorded (e.g. a 429 retried by the tableau client)
+    def record_retry(self, service, method, endpoint):
+        with self.lock:
+            api_call = self.api_calls.get((service, method.upper(), endpoint))
+            if api_call is not None:
+                api_call['retries'] += 1
+
+    def record_stage(self, stage, seconds, failed=False):
+        with self.lock:
+            stage_metrics = self.stages.get(stage)
+            if stage_metrics is None:
+                stage_metrics = self.stages[stage] = {'latency': histogram(), 'errors': 0}
+            stage_metrics['latency'].observe(seconds)
+            if failed:
+                stage_metrics['errors'] += 1
+
+    #returns the batch metrics of a Metadata API query operation (the lock must be held)
+    def get_batch_metrics(self, operation):
+        batch_metrics = self.batches.get(operation)
+        if batch_metrics is None:
+            batch_metrics = self.batches[operation] = {'batches': 0, 'items': 0, 'min_size': None, 'max_size': None, 'last_size': None, 'resizes': {}}
+        return batch_metrics
+
+    #records the size of a Metadata API query batch (the number of filtered items or the page size chosen by the graphql executor)
+    def record_batch(self, operation, batch_size):
+        with self.lock:
+            batch_metrics = self.get_batch_metrics(operation)
+            batch_metrics['batches'] += 1
+            batch_metrics['items'] += batch_size
+            batch_metrics['min_size'] = batch_size if batch_metrics['min_size'] is None else min(batch_metrics['min_size'], batch_size)
+            batch_metrics['max_size'] = batch_size if batch_metrics['max_size'] is None else max(batch_metrics['max_size'], batch_size)
+            batch_metrics['last_size'] = batch_size
+
+    #records a change of the batch size of a Metadata API query operation and its reason (grow, slow, node_limit or timeout)
+    def record_batch_resize(self, operation, reason):
+        with self.lock:
+            batch_metrics = self.get_batch_metrics(operation)
+            batch_metrics['resizes'][reason] = batch_metrics['resizes'].get(reason, 0) + 1
+
+    #records the dbt models or tableau tables (kind) which were not matched, by database.schema.name. only the first UNMATCHED_NAMES_LIMIT names are kept
+    def record_unmatched(self, kind, names):
+        with self.lock:
+            unmatched = self.unmatched.get(kind)
+            if unmatched is None:
+                unmatched = self.unmatched[kind] = {'count': 0, 'names': []}
+            unmatched['count'] += len(names)
+            unmatched['names'].extend(names[:UNMATCHED_NAMES_LIMIT - len(unmatched['names'])])
+
+    #records the outcome of a sync target (a dbt account or tableau site of a multi target sync)
+    def record_target(self, target, seconds, failed=False):
+        with self.lock:
+            self.targets.append({'target': target, 'duration_s': round(seconds, 3), 'failed': failed})
+
+    #returns a copy of the recorded metrics which can be sent to another process and merged there
+    def snapshot(self):
+        with self.lock:
+            return copy.deepcopy({'api_calls': self.api_calls, 'stages': self.stages, 'targets': self.targets, 'batches': self.batches, 'unmatched': self.unmatched})
+
+    #adds the metrics of a snapshot (e.g. recorded by a worker process) to the metrics of this run
+    def merge(self, snapshot):
+        with self.lock:
+            for key, api_call in snapshot['api_calls'].items():
+                if key not in self.api_calls:
+                    self.api_calls[key] = api_call
+                    continue
+                merged_api_call = self.api_calls[key]
+                merged_api_call['latency'].merge(api_call['latency'])
+                for status, count in api_call['status_codes'].items():
+                    merged_api_call['status_codes'][status] = merged_api_call['status_codes'].get(status, 0) + count
+                for field in ('bytes_sent', 'bytes_received', 'retries'):
+                    merged_api_call[field] += api_call[field]
+            for stage, stage_metrics in snapshot['stages'].items():
+                if stage not in self.stages:
+                    self.stages[stage] = stage_metrics
+                    continue
+                self.stages[stage]['latency'].merge(stage_metrics['latency'])
+                self.stages[stage]['errors'] += stage_metrics['errors']
+            self.targets.extend(snapshot['targets'])
+            for operation, batch_metrics in snapshot.get('batches', {}).items():
+                if operation not in self.batches:
+                    self.batches[operation] = batch_metrics
+                    continue
+                merged_batch_metrics = self.batches[operation]
+                merged_batch_metrics['batches'] += batch_metrics['batches']
+                merged_batch_metrics['items'] += batch_metrics['items']
+                for field, merge in (('min_size', min), ('max_size', max)):
+                    sizes = [size for size in (merged_batch_metrics[field], batch_metrics[field]) if size is not None]
+                    merged_batch_metrics[field] = merge(sizes) if sizes else None
+                merged_batch_metrics['last_size'] = batch_metrics['last_size'] if batch_metrics['last_size'] is not None else merged_batch_metrics['last_size']
+                for reason, count in batch_metrics['resizes'].items():
+                    merged_batch_metrics['resizes'][reason] = merged_batch_metrics['resizes'].get(reason, 0) + count
+            for kind, unmatched in snapshot.get('unmatched', {}).items():
+                merged_unmatched = self.unmatched.setdefault(kind, {'count': 0, 'names': []})
+                merged_unmatched['count'] += unmatched['count']
+                merged_unmatched['names'].extend(unmatched['names'][:UNMATCHED_NAMES_LIMIT - len(merged_unmatched['names'])])
+
+    #decorator recording the duration of every call to a function as a stage (named after the function)
+    def timed(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = function(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                self.record_stage(function.__name__, time.perf_counter() - start, failed)
+        return wrapper
+
+    #returns the run report as a dictionary
+    def to_dict(self):
+        with self.lock:
+            api_calls = [dict({'service': service, 'method': method, 'endpoint': endpoint}, **{key: (value.to_dict() if isinstance(value, histogram) else value) for key, value in api_call.items()})
+                         for (service, method, endpoint), api_call in sorted(self.api_calls.items())]
+            stages = {stage: {'latency': stage_metrics['latency'].to_dict(), 'errors': stage_metrics['errors']} for stage, stage_metrics in sorted(self.stages.items())}
+            report = {
+                'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.started_at)),
+                'duration_s': round(time.time() - self.started_at, 3),
+                'requests': sum(api_call['latency']['count'] for api_call in api_calls),
+                'bytes_received': sum(api_call['bytes_received'] for api_call in api_calls),
+                'retries': sum(api_call['retries'] for api_call in api_calls),
+                'stages': stages,
+                'api_calls': api_calls
+            }
+            if len(self.targets) > 0:
+                report['targets'] = list(self.targets)
+            if len(self.unmatched) > 0:
+                report['unmatched'] = {kind: dict(unmatched, names=list(unmatched['names']), truncated=unmatched['count'] > len(unmatched['names'])) for kind, unmatched in sorted(self.unmatched.items())}
+            if len(self.batches) > 0:
+                report['metadata_batches'] = {operation: dict(batch_metrics, resizes=dict(batch_metrics['resizes'])) for operation, batch_metrics in sorted(self.batches.items())}
+            return report
+
+    #returns the run report in the prometheus text exposition format (for the node exporter textfile collector)
+    def to_prometheus(self):
+        report = self.to_dict()
+        lines = []
+
+        def add_histogram(name, labels, latency):
+            for bound, count in latency['buckets'].items():
+                lines.append(name + '_bucket{' + labels + ',le="' + bound + '"} ' + str(count))
+            lines.append(name + '_sum{' + labels + '} ' + str(latency['sum_s']))
+            lines.append(name + '_count{' + labels + '} ' + str(latency['count']))
+
+        def add_header(name, help_text, metric_type):
+            lines.append('# HELP ' + name + ' ' + help_text)
+            lines.append('# TYPE ' + name + ' ' + metric_type)
+
+        add_header(METRIC_PREFIX + 'run_duration_seconds', 'duration of the sync run', 'gauge')
+        lines.append(METRIC_PREFIX + 'run_duration_seconds ' + str(report['duration_s']))
+        add_header(METRIC_PREFIX + 'stage_duration_seconds', 'duration of each sync stage', 'histogram')
+        for stage, stage_metrics in report['stages'].items():
+            add_histogram(METRIC_PREFIX + 'stage_duration_seconds', 'stage="' + stage + '"', stage_metrics['latency'])
+        add_header(METRIC_PREFIX + 'stage_errors_total', 'number of sync stage calls which raised an exception', 'counter')
+        for stage, stage_metrics in report['stages'].items():
+            lines.append(METRIC_PREFIX + 'stage_errors_total{stage="' + stage + '"} ' + str(stage_metrics['errors']))
+
+        if 'targets' in report:
+            add_header(METRIC_PREFIX + 'target_duration_seconds', 'duration of the sync of each dbt account and tableau site', 'gauge')
+            for target in report['targets']:
+                lines.append(METRIC_PREFIX + 'target_duration_seconds{target="' + target['target'].replace('"', '\\"') + '"} ' + str(target['duration_s']))
+            add_header(METRIC_PREFIX + 'target_failed', '1 if the sync of the dbt account or tableau site failed', 'gauge')
+            for target in report['targets']:
+                lines.append(METRIC_PREFIX + 'target_failed{target="' + target['target'].replace('"', '\\"') + '"} ' + str(int(target['failed'])))
+
+        if 'unmatched' in report:
+            add_header(METRIC_PREFIX + 'unmatched', 'number of dbt models and tableau tables which were not matched', 'gauge')
+            for kind, unmatched in report['unmatched'].items():
+                lines.append(METRIC_PREFIX + 'unmatched{kind="' + kind + '"} ' + str(unmatched['count']))
+
+        if 'metadata_batches' in report:
+            add_header(METRIC_PREFIX + 'metadata_batch_size', 'last batch size (items or page size) of each tableau metadata API query operation', 'gauge')
+            for operation, batch_metrics in report['metadata_batches'].items():
+                if batch_metrics['last_size'] is not None:
+                    lines.append(METRIC_PREFIX + 'metadata_batch_size{operation="' + operation + '"} ' + str(batch_metrics['last_size']))
+            add_header(METRIC_PREFIX + 'metadata_batch_resizes_total', 'number of batch size changes of each tableau metadata API query operation by reason', 'counter')
+            for operation, batch_metrics in report['metadata_batches'].items():
+                for reason, count in sorted(batch_metrics['resizes'].items()):
+                    lines.append(METRIC_PREFIX + 'metadata_batch_resizes_total{operation="' + operation + '",reason="' + reason + '"} ' + str(count))
+
+        api_call_labels = [('service="' + api_call['service'] + '",method="' + api_call['method'] + '",endpoint="' + api_call['endpoint'].replace('"', '\\"') + '"', api_call) for api_call in report['api_calls']]
+        add_header(METRIC_PREFIX + 'api_request_duration_seconds', 'latency of each api call', 'histogram')
+        for labels, api_call in api_call_labels:
+            add_histogram(METRIC_PREFIX + 'api_request_duration_seconds', labels, api_call['latency'])
+        add_header(METRIC_PREFIX + 'api_responses_total', 'number of api responses by status code', 'counter')
+        for labels, api_call in api_call_labels:
+            for status, count in sorted(api_call['status_codes'].items()):
+                lines.append(METRIC_PREFIX + 'api_responses_total{' + labels + ',status="' + status + '"} ' + str(count))
+        for name, key, help_text in (('api_bytes_sent_total', 'bytes_sent', 'request body bytes sent'), ('api_bytes_received_total', 'bytes_received', 'response body bytes received'), ('api_retries_total', 'retries', 'number of retried api requests')):
+            add_header(METRIC_PREFIX + name, help_text, 'counter')
+            for labels, api_call in api_call_labels:
+                lines.append(METRIC_PREFIX + name + '{' + labels + '} ' + str(api_call[key]))
+        return '\n'.join(lines) + '\n'
+
+    #writes the run report to a json file, or a prometheus textfile when the file name ends with .prom (via a temporary file so collectors never read a partial report)
+    def write_report(self, report_file):
+        content = self.to_prometheus() if report_file.endswith('.prom') else json.dumps(self.to_dict(), indent=2)
+        with open(report_file + '.tmp', 'w') as f:
+            f.write(content)
+        os.replace(report_file + '.tmp', report_file)
+
+#metrics of the current run, shared by every api client and stage
+metrics = sync_metrics()
@@ -0,0 +1,149 @@
+import json
+import re
+
+import pytest
+
+from dbt_tabcatalog import graphql_executor
+from dbt_tabcatalog.graphql_executor import graphql_executor as executor_class, parse_selection, estimate_node_cost, estimate_item_cost, count_nodes, get_retry_reason
+from dbt_tabcatalog.sync_metrics import metrics
+
+NODE_LIMIT_ERROR = {'message': 'Showing partial results. The request exceeded the 20000 node limit.', 'extensions': {'code': 'NODE_LIMIT_EXCEEDED'}}
+
+TABLES_QUERY = '''query get_tables($first: Int, $after: String) {
+  databaseTablesConnection(filter: {luidWithin: ["a"]}, first: $first, after: $after) {
+    nodes {
+      luid
+      columnsConnection(first: 500) {
+        nodes {
+          name
+          tags {
+            name
+          }
+        }
+        pageInfo {
+          hasNextPage
+          endCursor
+        }
+      }
+    }
+    pageInfo {
+      hasNextPage
+      endCursor
+    }
+  }
+}'''
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+#returns a Metadata API response with the given nodes in a connection, or a node limit error when more than max_items luids are queried
+def make_luid_response(query, max_items):
+    luids = json.loads(re.search(r'luidWithin: (\[.*?\])', query).group(1))
+    if len(luids) > max_items:
+        return {'data': None, 'errors': [NODE_LIMIT_ERROR]}
+    return {'data': {'databaseTablesConnection': {'nodes': [{'luid': luid} for luid in luids], 'pageInfo': {'hasNextPage': False, 'endCursor': None}}}}
+
+#returns the query of a batch of luids
+def make_luid_query(batch):
+    return 'query get_luids($first: Int, $after: String) { databaseTablesConnection(filter: {luidWithin: ' + json.dumps(batch) + '}, first: $first, after: $after) { nodes { luid } pageInfo { hasNextPage endCursor } } }'
+
+def test_parse_selection_keys_aliased_fields_on_the_field_name():
+    selection = parse_selection('query q { tables { tableauDescription: description tableauTags: tags { name } } }')
+    tables = selection['q'][1]['tables'][1]
+    assert set(tables) == {'description', 'tags'}
+    assert tables['description'] == ('', None)
+    assert tables['tags'][1] == {'name': ('', None)}
+
+def test_parse_selection_keys_inline_fragments_on_the_type():
+    selection = parse_selection('query q { table { database { name ... on DatabaseServer { id hostName } } } }')
+    database = selection['q'][1]['table'][1]['database'][1]
+    assert set(database) == {'name', '... on DatabaseServer'}
+    assert set(database['... on DatabaseServer'][1]) == {'id', 'hostName'}
+
+def test_parse_selection_skips_string_arguments_with_escaped_quotes_and_braces():
+    selection = parse_selection('query q { tables(filter: {name: "a \\"quoted\\" {name}) ("}) { luid } other { id } }')
+    operation = selection['q'][1]
+    assert set(operation) == {'tables', 'other'}
+    assert operation['tables'][0] == 'filter: {name: "a \\"quoted\\" {name}) ("}'
+    assert set(operation['tables'][1]) == {'luid'}
+
+def test_parse_selection_nests_connections():
+    selection = parse_selection(TABLES_QUERY)
+    tables = selection['get_tables'][1]['databaseTablesConnection']
+    assert 'first: $first' in tables[0]
+    columns = tables[1]['nodes'][1]['columnsConnection']
+    assert columns[0] == 'first: 500'
+    assert set(columns[1]['nodes'][1]) == {'name', 'tags'}
+
+def test_estimate_node_cost_uses_the_explicit_page_size():
+    assert estimate_node_cost(parse_selection('query q { tablesConnection(first: 500) { nodes { name } } }')) == 1 + 1 + 1 + 500
+    assert estimate_node_cost(parse_selection('query q { tablesConnection(first: $first) { nodes { name } } }')) == 1 + 1 + 1 + graphql_executor.DEFAULT_LIST_SIZE
+
+def test_estimate_item_cost_of_nested_connections():
+    #a table: itself, its columns connection and 500 columns each with a list of tags
+    assert estimate_item_cost(TABLES_QUERY, ['databaseTablesConnection']) == 1 + 1 + 500 * (1 + graphql_executor.DEFAULT_LIST_SIZE)
+
+def test_count_nodes_skips_page_info():
+    assert count_nodes([{'luid': 'a', 'tags': [{'name': 'x'}], 'pageInfo': {'hasNextPage': False}}]) == 2
+
+def test_get_retry_reason():
+    assert get_retry_reason(NODE_LIMIT_ERROR['message']) == 'node_limit'
+    assert get_retry_reason("HTTPSConnectionPool(host='x'): Read timed out. (read timeout=120)") == 'timeout'
+    assert get_retry_reason('Validation error') is None
+
+def test_query_batches_halves_the_batch_on_node_limit_errors():
+    queried_sizes = []
+    def query_function(query, variables):
+        queried_sizes.append(len(json.loads(re.search(r'luidWithin: (\[.*?\])', query).group(1))))
+        return make_luid_response(query, 30)
+    executor = executor_class(query_function, batch_size=100, max_batch_size=100)
+    items = ['luid-' + str(i) for i in range(120)]
+    batches = list(executor.query_batches(items, make_luid_query, ['databaseTablesConnection']))
+    assert [luid for batch, nodes in batches for luid in batch] == items
+    assert [node['luid'] for batch, nodes in batches for node in nodes] == items
+    assert queried_sizes[:3] == [100, 50, 25]
+    assert max(len(batch) for batch, nodes in batches) <= 30
+    state = executor.operations['get_luids']
+    assert state['max_batch_size'] <= 37 #not grown back to a size which exceeded the node limit
+    assert metrics.to_dict()['metadata_batches']['get_luids']['resizes']['node_limit'] >= 2
+
+def test_query_batches_halves_the_batch_on_timeouts():
+    def query_function(query, variables):
+        if 'luid-0' in query and 'luid-1"' in query:
+            raise Exception("HTTPSConnectionPool(host='x'): Read timed out. (read timeout=120)")
+        return make_luid_response(query, 100)
+    executor = executor_class(query_function, batch_size=4)
+    batches = list(executor.query_batches(['luid-0', 'luid-1', 'luid-2', 'luid-3'], make_luid_query, ['databaseTablesConnection']))
+    assert [batch for batch, nodes in batches][0] == ['luid-0']
+    assert metrics.to_dict()['metadata_batches']['get_luids']['resizes']['timeout'] == 2
+
+def test_query_batches_raises_when_a_single_item_exceeds_the_node_limit():
+    executor = executor_class(lambda query, variables: make_luid_response(query, 0), batch_size=4)
+    with pytest.raises(Exception, match='node limit'):
+        list(executor.query_batches(['luid-0', 'luid-1'], make_luid_query, ['databaseTablesConnection']))
+
+def test_query_raises_on_other_errors():
+    executor = executor_class(lambda query, variables: {'errors': [{'message': 'Validation error'}]})
+    with pytest.raises(Exception, match='Validation error'):
+        executor.query('query q { a { b } }')
+
+def test_paginate_shrinks_pages_over_the_node_limit():
+    def query_function(query, variables):
+        first, after = variables['first'], int(variables.get('after') or 0)
+        if first > 40:
+            return {'data': None, 'errors': [NODE_LIMIT_ERROR]}
+        nodes = [{'id': i} for i in range(after, min(after + first, 100))]
+        return {'data': {'things': {'nodes': nodes, 'pageInfo': {'hasNextPage': after + first < 100, 'endCursor': str(after + first)}}}}
+    executor = executor_class(query_function)
+    nodes = list(executor.paginate('query get_things($first: Int, $after: String) { things(first: $first, after: $after) { nodes { id } pageInfo { hasNextPage endCursor } } }', ['things'], 500))
+    assert [node['id'] for node in nodes] == list(range(100))
+    assert metrics.to_dict()['metadata_batches']['get_things']['max_size'] <= 40
+
+def test_batches_grow_after_fast_full_batches():
+    executor = executor_class(lambda query, variables: make_luid_response(query, 1000), batch_size=10, max_batch_size=40)
+    batches = list(executor.query_batches(['luid-' + str(i) for i in range(100)], make_luid_query, ['databaseTablesConnection']))
+    assert [len(batch) for batch, nodes in batches][:4] == [10, 15, 23, 35]
+    assert executor.operations['get_luids']['batch_size'] == 40